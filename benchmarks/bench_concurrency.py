@@ -0,0 +1,128 @@
+# coding: utf-8
+"""
+2024 - ShareLink - benchmark of concurrent requests - 셰어 링크
+
+cd sharelink && ALLOWED_HOST=test PYTHONPATH=.. python ../benchmarks/bench_concurrency.py
+
+the latency of the pages requested while a slow query runs, as another
+request would run it: once with the query run synchronously in the event
+loop, as the sqlmodel session did, once with the query of the async driver,
+run by its thread on its own connection as a connection of the pool does.
+A blocked event loop makes every page wait for the slow query; otherwise the
+pages do not queue behind it. SQLite runs the query in this process: on a
+single CPU it shares the CPU with the pages, with more CPUs it does not
+"""
+
+import asyncio
+import sqlite3
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, List
+
+import aiosqlite
+import httpx
+from tortoise import Tortoise
+
+from sharelink.config import TORTOISE_ORM, settings
+from sharelink.main import app
+from sharelink.models import Links
+
+LINKS = 20_000
+REQUESTS = 50
+URLS = ("/", "/public", "/private", "/links_by_tag/python", "/daily")
+
+# about a second of work for SQLite, reading nothing of the links
+SLOW_QUERY = (
+    "WITH RECURSIVE c(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM c WHERE x < 3000000) "
+    "SELECT count(*) FROM c"
+)
+
+
+async def fill() -> None:
+    now = datetime.now(tz=timezone.utc)
+    await Links.bulk_create(
+        [
+            Links(
+                url=f"https://example.com/{i}",
+                url_hashed=f"h{i}",
+                title=f"link {i}",
+                text=f"text of the link {i}",
+                tags="python,blog" if i % 2 else "fastapi",
+                private=bool(i % 3),
+                date_created=now - timedelta(minutes=i),
+            )
+            for i in range(LINKS)
+        ],
+        batch_size=5000,
+    )
+
+
+async def pages_latency(
+    client: httpx.AsyncClient, slow_query: Callable[[], Awaitable[None]]
+) -> List[float]:
+    """
+    the latency of each page requested while the slow query runs, all the pages
+    being requested at once, just after the slow query
+    """
+    start = time.perf_counter()
+
+    async def get(url: str) -> float:
+        (await client.get(url)).raise_for_status()
+        return time.perf_counter() - start
+
+    slow = asyncio.create_task(slow_query())
+    latencies = await asyncio.gather(*(get(URLS[i % len(URLS)]) for i in range(REQUESTS)))
+    await slow
+    return latencies
+
+
+def summary(name: str, latencies: List[float]) -> str:
+    p95 = statistics.quantiles(latencies, n=20)[-1]
+    return (
+        f"  {name}: p50 {statistics.median(latencies) * 1000:.0f}ms, "
+        f"p95 {p95 * 1000:.0f}ms, max {max(latencies) * 1000:.0f}ms"
+    )
+
+
+async def main() -> None:
+    # the pages are rendered each time
+    settings.RESPONSE_CACHE_SIZE = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        path = f"{tmp}/bench.sqlite3"
+        config = {**TORTOISE_ORM, "connections": {"default": f"sqlite://{path}"}}
+        await Tortoise.init(config=config)
+        await Tortoise.generate_schemas()
+        await fill()
+
+        async def blocking() -> None:
+            # a synchronous driver, in the event loop
+            with sqlite3.connect(path) as connection:
+                connection.execute(SLOW_QUERY).fetchall()
+
+        async def non_blocking() -> None:
+            # the async driver, its own connection
+            async with aiosqlite.connect(path) as connection:
+                await (await connection.execute(SLOW_QUERY)).fetchall()
+
+        start = time.perf_counter()
+        await non_blocking()
+        alone = time.perf_counter() - start
+
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            idle = await pages_latency(client, lambda: asyncio.sleep(0))
+            blocked = await pages_latency(client, blocking)
+            concurrent = await pages_latency(client, non_blocking)
+
+        await Tortoise.close_connections()
+
+    print(f"{REQUESTS} pages on {LINKS} links, a slow query of {alone:.2f}s")
+    print(summary("no slow query", idle))
+    print(summary("slow query blocking the loop", blocked))
+    print(summary("slow query of the async driver", concurrent))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,24 @@
+# coding: utf-8
+"""
+2024 - ShareLink - benchmark of the small hashes - 셰어 링크
+
+PYTHONPATH=. python benchmarks/bench_hashed_urls.py
+"""
+
+import timeit
+from datetime import datetime, timedelta
+
+from sharelink.core.hashed_urls import crc, crc_bitwise, small_hashes
+
+NUMBER = 100_000
+
+start = datetime(2011, 10, 6, 13, 19, 24)
+timestamps = [(start + timedelta(seconds=i)).strftime("%Y%m%d_%H%M%S") for i in range(NUMBER)]
+
+for name, stmt in (
+    ("crc_bitwise", lambda: [crc_bitwise(t) for t in timestamps]),
+    ("crc", lambda: [crc(t) for t in timestamps]),
+    ("small_hashes", lambda: small_hashes(timestamps)),
+):
+    duration = min(timeit.repeat(stmt, number=1, repeat=3))
+    print(f"{name:>12}: {NUMBER} timestamps in {duration:.3f}s ({NUMBER / duration:,.0f}/s)")
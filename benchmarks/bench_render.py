@@ -0,0 +1,31 @@
+# coding: utf-8
+"""
+2024 - ShareLink - benchmark of the Markdown renderer - 셰어 링크
+
+PYTHONPATH=. python benchmarks/bench_render.py
+"""
+
+import timeit
+
+import markdown
+
+from sharelink.core.render import EXTENSIONS, convert
+
+NUMBER = 2_000
+
+texts = [
+    f"note {i} with *some* **Markdown**[^{i}]\n\n"
+    f"| a | b |\n|---|---|\n| {i} | {i * 2} |\n\n"
+    f"```python\nprint({i})\n```\n\n[^{i}]: a footnote"
+    for i in range(NUMBER)
+]
+
+# the same HTML both ways
+assert all(convert(text) == markdown.markdown(text, extensions=EXTENSIONS) for text in texts[:50])
+
+for name, stmt in (
+    ("per call", lambda: [markdown.markdown(text, extensions=EXTENSIONS) for text in texts]),
+    ("reused", lambda: [convert(text) for text in texts]),
+):
+    duration = min(timeit.repeat(stmt, number=1, repeat=3))
+    print(f"{name:>8}: {NUMBER} texts in {duration:.3f}s ({NUMBER / duration:,.0f}/s)")
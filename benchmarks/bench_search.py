@@ -0,0 +1,72 @@
+# coding: utf-8
+"""
+2024 - ShareLink - benchmark of the full-text search - 셰어 링크
+
+cd sharelink && ALLOWED_HOST=test PYTHONPATH=.. python ../benchmarks/bench_search.py
+
+time of the first page of results of a few searches, with the FTS5 table
+of SQLite, on a database of LINKS links
+"""
+
+import asyncio
+import random
+import tempfile
+import time
+
+from tortoise import Tortoise, connections
+
+from sharelink.config import TORTOISE_ORM
+from sharelink.core.migrations import migrate
+from sharelink.core.search import search_links
+from sharelink.models import Links
+
+LINKS = 200_000
+SEARCHES = ("python", "fastapi tortoise", "rare42", "link", "nothing")
+REPEAT = 20
+
+VOCABULARY = ["python", "fastapi", "tortoise", "sqlite", "markdown", "fox", "note", "link"]
+
+
+async def fill() -> None:
+    rng = random.Random(42)
+    for start in range(0, LINKS, 10_000):
+        await Links.bulk_create(
+            [
+                Links(
+                    url=f"https://example.com/{i}",
+                    url_hashed=f"h{i}",
+                    title=" ".join(rng.choices(VOCABULARY, k=3)) + f" rare{i}",
+                    text=" ".join(rng.choices(VOCABULARY, k=30)),
+                    tags=",".join(rng.choices(VOCABULARY, k=2)),
+                )
+                for i in range(start, start + 10_000)
+            ]
+        )
+
+
+async def main() -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        config = {**TORTOISE_ORM, "connections": {"default": f"sqlite://{tmp}/bench.sqlite3"}}
+        await Tortoise.init(config=config)
+        try:
+            await Tortoise.generate_schemas()
+            await migrate()
+            start = time.perf_counter()
+            await fill()
+            print(f"{LINKS} links indexed in {time.perf_counter() - start:.1f}s")
+            await connections.get("default").execute_script("ANALYZE")
+            for q in SEARCHES:
+                durations = []
+                for _ in range(REPEAT):
+                    start = time.perf_counter()
+                    links, count = await search_links(q, limit=5)
+                    durations.append(time.perf_counter() - start)
+                    if links.next_cursor:
+                        await search_links(q, limit=5, after=links.next_cursor)
+                print(f"{q!r:>20}: {count:>7} results, first page in {min(durations) * 1000:.1f}ms")
+        finally:
+            await Tortoise.close_connections()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
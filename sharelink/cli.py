@@ -0,0 +1,205 @@
+# coding: utf-8
+"""
+2024 - ShareLink - command line - 셰어 링크
+
+sharelink import bookmarks.html
+sharelink export --format netscape --output bookmarks.html
+sharelink migrate
+sharelink backfill-tags
+sharelink count-tags
+sharelink count-days
+sharelink reset-counters
+sharelink render
+"""
+
+import argparse
+import sys
+
+from tortoise import Tortoise, run_async
+
+from sharelink.config import TORTOISE_ORM
+from sharelink.core.counters import reset_counters
+from sharelink.core.days import count_days
+from sharelink.core.export import CHUNK_SIZE, FORMATS, NETSCAPE, export_links
+from sharelink.core.migrations import migrate
+from sharelink.core.render import BATCH_SIZE as RENDER_BATCH_SIZE, render_all
+from sharelink.core.shaarli import BATCH_SIZE, import_shaarli, import_shaarli_files
+from sharelink.core.tags import backfill_tags, count_tags
+
+
+async def init_db() -> None:
+    """
+    connect to the database outside of the app
+    """
+    await Tortoise.init(config=TORTOISE_ORM)
+    await Tortoise.generate_schemas(safe=True)
+    await migrate()
+
+
+def print_progress(read: int, added: int) -> None:
+    """
+    display the progress of an import
+    """
+    print(f"\r{read} links read, {added} added", end="", file=sys.stderr, flush=True)
+
+
+def print_skipped(link: dict) -> None:
+    """
+    display a link not imported
+    """
+    print(f"\nnot imported, URL or tags too long: {link['url']}", file=sys.stderr)
+
+
+async def do_import(args: argparse.Namespace) -> None:
+    """
+    import Shaarli/Netscape bookmark files
+    """
+    await init_db()
+    if len(args.files) > 1 or args.workers:
+        added = await import_shaarli_files(
+            args.files,
+            workers=args.workers,
+            batch_size=args.batch_size,
+            progress=print_progress,
+            skipped=print_skipped,
+        )
+    else:
+        added = await import_shaarli(
+            args.files[0],
+            batch_size=args.batch_size,
+            progress=print_progress,
+            skipped=print_skipped,
+        )
+    print(f"\n{added} links imported", file=sys.stderr)
+
+
+async def do_export(args: argparse.Namespace) -> None:
+    """
+    export all the links
+    """
+    await init_db()
+    output = open(args.output, "w", encoding="utf-8", newline="") if args.output else sys.stdout
+    try:
+        async for chunk in export_links(args.format, chunk_size=args.chunk_size):
+            output.write(chunk)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+
+async def do_migrate(args: argparse.Namespace) -> None:
+    """
+    bring the database up to date
+    """
+    await init_db()
+    print("database up to date", file=sys.stderr)
+
+
+async def do_backfill_tags(args: argparse.Namespace) -> None:
+    """
+    rebuild the tags of all the links
+    """
+    await init_db()
+    count = await backfill_tags()
+    print(f"tags of {count} links rebuilt", file=sys.stderr)
+
+
+async def do_count_tags(args: argparse.Namespace) -> None:
+    """
+    count again the links of each tag
+    """
+    await init_db()
+    await count_tags()
+    print("tags counted", file=sys.stderr)
+
+
+async def do_count_days(args: argparse.Namespace) -> None:
+    """
+    index again the days having links
+    """
+    await init_db()
+    count = await count_days()
+    print(f"{count} days having links", file=sys.stderr)
+
+
+async def do_reset_counters(args: argparse.Namespace) -> None:
+    """
+    count again the links of the lists
+    """
+    await init_db()
+    await reset_counters()
+    print("the links of the lists will be counted again", file=sys.stderr)
+
+
+async def do_render(args: argparse.Namespace) -> None:
+    """
+    render the text of the links again
+    """
+    await init_db()
+    rendered = await render_all(
+        workers=args.workers,
+        batch_size=args.batch_size,
+        everything=args.all,
+        progress=lambda rendered: print(
+            f"\r{rendered} links rendered", end="", file=sys.stderr, flush=True
+        ),
+    )
+    print(f"\n{rendered} links rendered", file=sys.stderr)
+
+
+def main(argv: list[str] | None = None) -> None:
+    """
+    entry point of the command line
+    """
+    parser = argparse.ArgumentParser(prog="sharelink")
+    subparsers = parser.add_subparsers(required=True)
+
+    parser_import = subparsers.add_parser("import", help="import Shaarli/Netscape bookmark files")
+    parser_import.add_argument("files", nargs="+")
+    parser_import.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser_import.add_argument(
+        "--workers", type=int, help="number of processes parsing the files, one per CPU by default"
+    )
+    parser_import.set_defaults(func=do_import)
+
+    parser_export = subparsers.add_parser("export", help="export all the links")
+    parser_export.add_argument("--format", choices=FORMATS, default=NETSCAPE)
+    parser_export.add_argument("--output", help="name of the file, the standard output by default")
+    parser_export.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser_export.set_defaults(func=do_export)
+
+    parser_migrate = subparsers.add_parser("migrate", help="bring the database up to date")
+    parser_migrate.set_defaults(func=do_migrate)
+
+    parser_tags = subparsers.add_parser("backfill-tags", help="rebuild the tags of all the links")
+    parser_tags.set_defaults(func=do_backfill_tags)
+
+    parser_count = subparsers.add_parser("count-tags", help="count again the links of each tag")
+    parser_count.set_defaults(func=do_count_tags)
+
+    parser_days = subparsers.add_parser("count-days", help="index again the days having links")
+    parser_days.set_defaults(func=do_count_days)
+
+    parser_counters = subparsers.add_parser(
+        "reset-counters", help="count again the links of the lists"
+    )
+    parser_counters.set_defaults(func=do_reset_counters)
+
+    parser_render = subparsers.add_parser(
+        "render", help="render the text of the links not rendered by the current renderer"
+    )
+    parser_render.add_argument("--batch-size", type=int, default=RENDER_BATCH_SIZE)
+    parser_render.add_argument(
+        "--workers",
+        type=int,
+        help="number of processes rendering the links, one per CPU by default",
+    )
+    parser_render.add_argument("--all", action="store_true", help="render all the links again")
+    parser_render.set_defaults(func=do_render)
+
+    args = parser.parse_args(argv)
+    run_async(args.func(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -3,8 +3,12 @@
 2024 - ShareLink - config - 셰어 링크
 """
 
+from functools import partial
+
 from pydantic import BaseModel
 from pydantic_settings import BaseSettings, SettingsConfigDict
+from tortoise.backends.base.config_generator import expand_db_url
+from tortoise.contrib.fastapi import RegisterTortoise
 
 
 class Settings(BaseSettings):
@@ -13,6 +17,13 @@ class Settings(BaseSettings):
     """
 
     DATABASE_URL: str = "sqlite://db.sqlite3"
+    # connections pool of PostgreSQL/MySQL
+    DB_POOL_MIN_SIZE: int = 1
+    DB_POOL_MAX_SIZE: int = 10
+    # SQLite pragmas
+    DB_SQLITE_JOURNAL_MODE: str = "WAL"
+    DB_SQLITE_SYNCHRONOUS: str = "NORMAL"
+    DB_SQLITE_BUSY_TIMEOUT: int = 5000  # milliseconds
     LANGUAGE_CODE: str = "fr-fr"
     SHARELINK_NAME: str = "ShareLink - 셰어 링크"
     SHARELINK_AUTHOR: str = "FoxMaSk"
@@ -34,6 +45,49 @@ class Settings(BaseSettings):
 
     LINKS_PER_PAGE: int = 5
     DAILY_PER_PAGE: int = 10
+    # number of links of the feeds
+    FEED_SIZE: int = 50
+    # when the number of links of a list is not known yet, count at most
+    # COUNTS_ESTIMATE_LIMIT links and count them all in the background
+    COUNTS_ESTIMATED: bool = False
+    COUNTS_ESTIMATE_LIMIT: int = 10000
+    # beyond this number of results, the search gives the newest links first
+    # instead of the most relevant ones
+    SEARCH_RANKED_LIMIT: int = 10000
+    # seconds the browsers and the proxies keep the public pages without
+    # asking if they changed, 0 to ask each time
+    CACHE_MAX_AGE: int = 0
+    # number of pages kept once rendered, 0 to disable, for RESPONSE_CACHE_TTL
+    # seconds; in memory, or in the Redis of RESPONSE_CACHE_URL shared by the workers
+    RESPONSE_CACHE_SIZE: int = 1000
+    RESPONSE_CACHE_TTL: int = 60
+    RESPONSE_CACHE_URL: str = ""
+    # number of links written at most by a request of the JSON API, and the
+    # token its clients give as "Authorization: Bearer <token>", disabled if empty
+    API_BATCH_SIZE: int = 1000
+    API_TOKEN: str = ""
+    # fill the title, the text and the image left empty by the ones of the page of
+    # the link, fetched in the background: METADATA_CONNECTIONS connections at most,
+    # METADATA_PER_HOST at once for a site, kept METADATA_CACHE_TTL seconds. The
+    # sites of the local network are not fetched but with METADATA_PRIVATE_HOSTS,
+    # the links imported without title only with METADATA_IMPORT
+    METADATA_FETCH: bool = True
+    METADATA_PRIVATE_HOSTS: bool = False
+    METADATA_IMPORT: bool = False
+    METADATA_TIMEOUT: float = 10.0
+    METADATA_CONNECTIONS: int = 20
+    METADATA_PER_HOST: int = 2
+    METADATA_CACHE_SIZE: int = 1000
+    METADATA_CACHE_TTL: int = 3600
+    # workers running the jobs following the writes, in each process; the
+    # database is read each JOBS_POLL_INTERVAL seconds for the jobs stored by
+    # the other processes. A job failing runs again JOBS_BACKOFF seconds later,
+    # then twice as late each time; a job running for JOBS_LEASE seconds is
+    # taken again, its worker is considered stopped
+    JOBS_WORKERS: int = 4
+    JOBS_POLL_INTERVAL: float = 5.0
+    JOBS_BACKOFF: float = 10.0
+    JOBS_LEASE: int = 300
 
     model_config = SettingsConfigDict(
         env_file=".env",
@@ -58,15 +112,41 @@ class CsrfSettings(BaseModel):
     origins: str = settings.CSRF_TRUSTED_ORIGINS
 
 
-import os
-from functools import partial
+# ORM
 
-from tortoise.contrib.fastapi import RegisterTortoise
+
+def db_connection(db_url: str) -> dict:
+    """
+    connection to the database, shared by the app and the command line,
+    with the pool size or the SQLite pragmas from the settings
+    """
+    connection = expand_db_url(db_url)
+    if connection["engine"] == "tortoise.backends.sqlite":
+        connection["credentials"].update(
+            journal_mode=settings.DB_SQLITE_JOURNAL_MODE,
+            synchronous=settings.DB_SQLITE_SYNCHRONOUS,
+            busy_timeout=settings.DB_SQLITE_BUSY_TIMEOUT,
+        )
+    else:
+        connection["credentials"].update(
+            minsize=settings.DB_POOL_MIN_SIZE,
+            maxsize=settings.DB_POOL_MAX_SIZE,
+        )
+    return connection
+
+
+TORTOISE_ORM = {
+    "connections": {"default": db_connection(settings.DATABASE_URL)},
+    "apps": {"models": {"models": ["sharelink.models"], "default_connection": "default"}},
+    # dates are stored and read in UTC: SQLite compares them as strings, so they
+    # all need the same offset; they are displayed in the timezone of the app
+    "use_tz": True,
+    "timezone": "UTC",
+}
 
 register_orm = partial(
     RegisterTortoise,
-    db_url=os.getenv("DB_URL", "sqlite://db.sqlite3"),
-    modules={"models": ["models"]},
+    config=TORTOISE_ORM,
     generate_schemas=True,
     add_exception_handlers=True,
 )
@@ -0,0 +1,304 @@
+# coding: utf-8
+"""
+2024 - ShareLink - bulk - 셰어 링크
+
+the links created, updated or deleted by batch, as the JSON API does: the
+existing URLs are found in one query, the links are written in one transaction
+with their tags, their changes, the counters, the days and the version of the
+data, then the pages displaying them are invalidated, once for the batch
+"""
+
+from datetime import datetime, timezone
+from typing import Dict, List, NamedTuple, Sequence, Set, Tuple
+
+import pytz
+from tortoise.backends.base.client import BaseDBAsyncClient
+from tortoise.exceptions import IntegrityError
+from tortoise.transactions import in_transaction
+
+from sharelink.config import settings
+from sharelink.core.changes import CREATED, DELETED, UPDATED, record_changes
+from sharelink.core.counters import links_counters, update_counters
+from sharelink.core.days import links_days, update_days
+from sharelink.core.feeds import render_feed
+from sharelink.core.hashed_urls import allocator
+from sharelink.core.metadata import enrich_later
+from sharelink.core.render import render_link
+from sharelink.core.response_cache import DAYS, invalidate, link_keys
+from sharelink.core.tags import add_links_tags, remove_links_tags
+from sharelink.forms import LinksForm
+from sharelink.models import Links
+
+EXISTING = "existing"
+NOT_FOUND = "not_found"
+
+# number of links inserted at once
+BATCH_SIZE = 1000
+
+# times a batch is inserted at most, when other processes take its small hashes
+HASH_ATTEMPTS = 5
+
+# the fields of a link changed by its form, and by the rendering of its text
+UPDATED_FIELDS = [
+    "url",
+    "title",
+    "text",
+    "sticky",
+    "private",
+    "image",
+    "video",
+    "tags",
+    "date_modified",
+    "text_excerpt",
+    "text_html",
+    "text_html_version",
+    "feed_rss",
+    "feed_atom",
+    "feed_version",
+]
+
+
+class BulkResult(NamedTuple):
+    """
+    what became of a link of the batch
+    """
+
+    status: str
+    id: int | None = None
+    url_hashed: str | None = None
+
+
+def new_link(link_form: LinksForm, url_hashed: str, date_created: datetime) -> Links:
+    """
+    the link of the form, rendered, not saved yet
+    """
+    link = Links(
+        url=str(link_form.url) if link_form.url else None,
+        url_hashed=url_hashed,
+        title=link_form.title.strip() or str(link_form.url or url_hashed),
+        text=link_form.text.strip(),
+        sticky=link_form.sticky,
+        private=link_form.private,
+        image=str(link_form.image) if link_form.image else None,
+        video=str(link_form.video) if link_form.video else None,
+        tags=link_form.tags.strip() if link_form.tags else "",
+        # dates are compared as they are stored, always in UTC
+        date_created=date_created.astimezone(timezone.utc),
+    )
+    render_link(link)
+    render_feed(link)
+    return link
+
+
+def apply_form(link: Links, link_form: LinksForm) -> None:
+    """
+    change a link by the form, rendered, not saved yet
+    """
+    link.url = str(link_form.url) if link_form.url else None
+    link.title = link_form.title.strip() if link_form.title else ""
+    link.text = link_form.text.strip() if link_form.text else ""
+    link.sticky = link_form.sticky
+    link.private = link_form.private
+    link.image = str(link_form.image) if link_form.image else None
+    link.video = str(link_form.video) if link_form.video else None
+    link.tags = link_form.tags.strip() if link_form.tags else ""
+    # the date of the change in the feeds, set again by save()
+    link.date_modified = datetime.now(tz=timezone.utc)
+    render_link(link)
+    render_feed(link)
+
+
+async def free_hashes(
+    texts: Sequence[str], hashes: List[str], using_db: BaseDBAsyncClient | None = None
+) -> List[str]:
+    """
+    the small hashes allocated for texts, the ones stored meanwhile by another
+    process replaced by the next free ones
+    """
+    while taken := set(
+        await Links.filter(url_hashed__in=hashes)
+        .using_db(using_db)
+        .values_list("url_hashed", flat=True)
+    ):
+        # kept by the allocator, the next suffixes are tried
+        hashes = [
+            allocator.allocate(text) if url_hashed in taken else url_hashed
+            for text, url_hashed in zip(texts, hashes)
+        ]
+    return hashes
+
+
+async def allocate_hashes(count: int) -> Tuple[List[str], datetime]:
+    """
+    the small hashes of new links, and their date of creation
+    """
+    date_created = datetime.now(tz=pytz.timezone(settings.SHARELINK_TZ))
+    if not allocator.loaded:
+        allocator.load(await Links.all().values_list("url_hashed", flat=True))
+    texts = [date_created.strftime("%Y%m%d_%H%M%S")] * count
+    return await free_hashes(texts, allocator.allocate_many(texts)), date_created
+
+
+async def insert_links(links: List[Links], using_db: BaseDBAsyncClient) -> None:
+    """
+    save the new links, with their tags, their changes, the counters, the days
+    and the version of the data
+    using_db: the transaction writing them
+    """
+    await Links.bulk_create(links, batch_size=BATCH_SIZE, using_db=using_db)
+    ids = dict(
+        await Links.filter(url_hashed__in=[link.url_hashed for link in links])
+        .using_db(using_db)
+        .values_list("url_hashed", "id")
+    )
+    for link in links:
+        link.id = ids[link.url_hashed]
+    await add_links_tags([(link.id, link.tags) for link in links], using_db)
+    await record_changes(CREATED, [(link.id, link.url_hashed) for link in links], using_db)
+    dates = [(link.private, link.date_created) for link in links]
+    await update_counters(links_counters(dates), using_db)
+    await update_days(links_days(dates), using_db)
+
+
+async def add_links(forms: Sequence[LinksForm]) -> List[BulkResult]:
+    """
+    create the links of the forms whose URL does not exist yet
+    returns the result of each form, in their order
+    """
+    urls = [str(form.url) for form in forms if form.url]
+    existing: Dict[str | None, BulkResult] = {
+        url: BulkResult(EXISTING, link_id, url_hashed)
+        for url, link_id, url_hashed in await Links.filter(url__in=urls).values_list(
+            "url", "id", "url_hashed"
+        )
+    }
+    # the first form of an URL given twice creates the link
+    new_forms = {}
+    for index, form in enumerate(forms):
+        url = str(form.url) if form.url else None
+        if url not in existing and (url is None or url not in new_forms):
+            new_forms[url if url else index] = (index, form)
+    if not new_forms:
+        # nothing written, the version of the data and the cached pages are kept
+        return [existing[str(form.url)] for form in forms]
+
+    for attempt in range(1, HASH_ATTEMPTS + 1):
+        hashes, date_created = await allocate_hashes(len(new_forms))
+        links = {
+            index: new_link(form, url_hashed, date_created)
+            for (index, form), url_hashed in zip(new_forms.values(), hashes)
+        }
+        try:
+            async with in_transaction() as connection:
+                await insert_links(list(links.values()), connection)
+            break
+        except Exception as error:
+            for url_hashed in hashes:
+                allocator.release(url_hashed)
+            # a small hash stored by another process since it was checked, the
+            # batch is inserted again with the next ones
+            if (
+                not isinstance(error, IntegrityError)
+                or attempt == HASH_ATTEMPTS
+                or not await Links.filter(url_hashed__in=hashes).exists()
+            ):
+                raise
+
+    keys: Set[str] = {DAYS}
+    for link in links.values():
+        if link.url:
+            existing.setdefault(link.url, BulkResult(EXISTING, link.id, link.url_hashed))
+        keys |= link_keys(link.private, link.date_created, link.tags, link.url_hashed)
+    await invalidate(keys)
+    # the title, the text and the image left empty, from the page of the links
+    await enrich_later(links.values())
+
+    return [
+        BulkResult(CREATED, links[index].id, links[index].url_hashed)
+        if index in links
+        else existing[str(form.url)]
+        for index, form in enumerate(forms)
+    ]
+
+
+async def update_links(forms: Sequence[Tuple[str, LinksForm]]) -> List[BulkResult]:
+    """
+    save the content of the existing links
+    forms: the small hash of each link and its form
+    returns the result of each form, in their order
+    """
+    links = {
+        link.url_hashed: link
+        for link in await Links.filter(url_hashed__in=[url_hashed for url_hashed, _ in forms])
+    }
+    # the links move from a list to the other one
+    before = [(link.private, link.date_created) for link in links.values()]
+    counters = links_counters(before, -1)
+    days = links_days(before, -1)
+    keys: Set[str] = set()
+    for link in links.values():
+        keys |= link_keys(link.private, link.date_created, link.tags, link.url_hashed)
+
+    for url_hashed, form in forms:
+        if url_hashed in links:
+            # the last form of a link given twice wins
+            apply_form(links[url_hashed], form)
+
+    if links:
+        after = [(link.private, link.date_created) for link in links.values()]
+        counters.update(links_counters(after))
+        days.update(links_days(after))
+        async with in_transaction() as connection:
+            await Links.bulk_update(
+                links.values(), fields=UPDATED_FIELDS, batch_size=BATCH_SIZE, using_db=connection
+            )
+            await remove_links_tags([link.id for link in links.values()], connection)
+            await add_links_tags([(link.id, link.tags) for link in links.values()], connection)
+            await record_changes(
+                UPDATED, [(link.id, link.url_hashed) for link in links.values()], connection
+            )
+            await update_counters(counters, connection)
+            await update_days(days, connection)
+        for link in links.values():
+            keys |= link_keys(link.private, link.date_created, link.tags, link.url_hashed)
+        await invalidate(keys)
+
+    return [
+        BulkResult(UPDATED, links[url_hashed].id, url_hashed)
+        if url_hashed in links
+        else BulkResult(NOT_FOUND, url_hashed=url_hashed)
+        for url_hashed, _ in forms
+    ]
+
+
+async def delete_links(hashes: Sequence[str]) -> List[BulkResult]:
+    """
+    delete the links by their small hash
+    returns the result of each hash, in their order
+    """
+    rows = await Links.filter(url_hashed__in=hashes).values_list(
+        "id", "url_hashed", "private", "date_created", "tags"
+    )
+    deleted = {url_hashed: link_id for link_id, url_hashed, _, _, _ in rows}
+    if rows:
+        dates = [(private, date_created) for _, _, private, date_created, _ in rows]
+        async with in_transaction() as connection:
+            await remove_links_tags(list(deleted.values()), connection)
+            await record_changes(
+                DELETED, [(link_id, url_hashed) for link_id, url_hashed, *_ in rows], connection
+            )
+            await update_counters(links_counters(dates, -1), connection)
+            await update_days(links_days(dates, -1), connection)
+            await Links.filter(id__in=list(deleted.values())).using_db(connection).delete()
+        keys: Set[str] = {DAYS}
+        for _, url_hashed, private, date_created, tags in rows:
+            allocator.release(url_hashed)
+            keys |= link_keys(private, date_created, tags, url_hashed)
+        await invalidate(keys)
+
+    return [
+        BulkResult(DELETED, deleted[url_hashed], url_hashed)
+        if url_hashed in deleted
+        else BulkResult(NOT_FOUND, url_hashed=url_hashed)
+        for url_hashed in hashes
+    ]
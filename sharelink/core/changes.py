@@ -0,0 +1,62 @@
+# coding: utf-8
+"""
+2024 - ShareLink - changes - 셰어 링크
+
+each link created, updated or deleted is written in the Changes table, with
+the link, in the same transaction when there is one. Its seq only grows: a
+client mirroring the links keeps the seq of the last change it read and asks
+for the next ones, instead of reading all the links again.
+
+the seq are given in the order of the commits: the transaction writing the
+changes bumps the version of the links first, whose row it holds until its
+commit, so another one writing changes waits for it. A change of a lower seq
+is never committed after a client read the next ones
+"""
+
+from typing import Dict, Iterable, List, Tuple
+
+from tortoise.backends.base.client import BaseDBAsyncClient
+
+from sharelink.core.http_cache import touch
+from sharelink.models import Changes, Links
+
+CREATED = "created"
+UPDATED = "updated"
+DELETED = "deleted"
+
+
+async def record_changes(
+    operation: str,
+    links: Iterable[Tuple[int, str]],
+    using_db: BaseDBAsyncClient | None = None,
+) -> None:
+    """
+    log the changes of the links, and bump the version of the links
+    links: the id and the small hash of each link
+    """
+    # locks the version until the commit, before the seq are given
+    await touch(using_db)
+    await Changes.bulk_create(
+        [
+            Changes(operation=operation, link_id=link_id, url_hashed=url_hashed)
+            for link_id, url_hashed in links
+        ],
+        using_db=using_db,
+    )
+
+
+async def get_changes(since: int, limit: int) -> Tuple[List[Changes], Dict[int, Links]]:
+    """
+    the changes following the one of seq since, and the links still existing
+    """
+    changes = await Changes.filter(seq__gt=since).order_by("seq").limit(limit)
+    ids = {change.link_id for change in changes if change.operation != DELETED}
+    links = {link.id: link for link in await Links.filter(id__in=ids)} if ids else {}
+    return changes, links
+
+
+async def last_seq() -> int:
+    """
+    the seq of the last change, where a new mirror starts from
+    """
+    return await Changes.all().order_by("-seq").first().values_list("seq", flat=True) or 0
@@ -0,0 +1,104 @@
+# coding: utf-8
+"""
+2024 - ShareLink - counters - 셰어 링크
+
+the number of links of each list (all, private, public) is kept in the
+Counters table and updated with the links, so the pages do not count the links.
+A counter that does not exist is not known: it is counted on its first read,
+and removing the counters is always safe. The number of links of each tag is
+Tags.count, see sharelink.core.tags, the ones of each day are in the Days
+table, see sharelink.core.days
+"""
+
+import asyncio
+from collections import Counter
+from datetime import datetime
+from typing import Dict, Iterable, List, Tuple
+
+from tortoise.backends.base.client import BaseDBAsyncClient
+from tortoise.expressions import F
+from tortoise.queryset import QuerySet
+from tortoise.transactions import in_transaction
+
+from sharelink.config import settings
+from sharelink.models import Counters, Links
+
+ALL = "all"
+PRIVATE = "private"
+PUBLIC = "public"
+
+# the counts running in the background, one by counter
+_recounts: Dict[str, asyncio.Task] = {}
+
+
+def link_counters(private: bool) -> List[str]:
+    """
+    the names of the counters of the lists of a link
+    """
+    return [ALL, PRIVATE if private else PUBLIC]
+
+
+def links_counters(links: Iterable[Tuple[bool, datetime]], delta: int = 1) -> Counter[str]:
+    """
+    the changes of the counters when the links are added (or removed when delta is -1)
+    links: private and date_created of each link
+    """
+    deltas: Counter[str] = Counter()
+    for private, _ in links:
+        for name in link_counters(private):
+            deltas[name] += delta
+    return deltas
+
+
+async def update_counters(
+    deltas: Dict[str, int], using_db: BaseDBAsyncClient | None = None
+) -> None:
+    """
+    add to the known counters
+    deltas: the number of links added (or removed when negative) by counter
+    """
+    names = {}
+    for name, delta in deltas.items():
+        if delta:
+            names.setdefault(delta, []).append(name)
+    # one query for all the counters changing by the same number
+    for delta, counters in names.items():
+        await Counters.filter(name__in=counters).using_db(using_db).update(count=F("count") + delta)
+
+
+async def recount(name: str, query: QuerySet[Links]) -> int:
+    """
+    count the links of a list and keep the result
+    in one transaction, the changes of the counter written meanwhile are not lost
+    """
+    async with in_transaction() as connection:
+        count = await query.using_db(connection).count()
+        await Counters.update_or_create(defaults={"count": count}, name=name, using_db=connection)
+    return count
+
+
+async def count_links(name: str, query: QuerySet[Links]) -> int:
+    """
+    the number of links of a list
+    name: the name of the counter of the list
+    query: the links of the list, counted when the counter is not known
+    """
+    counter = await Counters.get_or_none(name=name)
+    if counter:
+        return counter.count
+    if not settings.COUNTS_ESTIMATED:
+        return await recount(name, query)
+
+    # at most COUNTS_ESTIMATE_LIMIT, read from the index, until the links are counted
+    if name not in _recounts:
+        task = asyncio.create_task(recount(name, query))
+        _recounts[name] = task
+        task.add_done_callback(lambda _: _recounts.pop(name, None))
+    return len(await query.limit(settings.COUNTS_ESTIMATE_LIMIT).values_list("id", flat=True))
+
+
+async def reset_counters(using_db: BaseDBAsyncClient | None = None) -> None:
+    """
+    forget all the counters, they will be counted again
+    """
+    await Counters.all().using_db(using_db).delete()
@@ -0,0 +1,36 @@
+# coding: utf-8
+"""
+2024 - ShareLink - database - 셰어 링크
+"""
+
+from tortoise import connections
+
+
+def pool_stats(connection_name: str = "default") -> dict:
+    """
+    usage of the connections to the database
+    """
+    connection = connections.get(connection_name)
+    stats: dict = {"dialect": connection.capabilities.dialect}
+
+    pool = getattr(connection, "_pool", None)
+    if connection.capabilities.dialect == "sqlite":
+        # one connection, shared by all the requests
+        stats["size"] = 1 if getattr(connection, "_connection", None) else 0
+        stats["pragmas"] = getattr(connection, "pragmas", {})
+    elif pool is None:
+        stats["size"] = 0
+    elif hasattr(pool, "get_size"):
+        # asyncpg
+        stats.update(
+            size=pool.get_size(),
+            idle=pool.get_idle_size(),
+            min_size=pool.get_min_size(),
+            max_size=pool.get_max_size(),
+        )
+    else:
+        # aiomysql
+        stats.update(
+            size=pool.size, idle=pool.freesize, min_size=pool.minsize, max_size=pool.maxsize
+        )
+    return stats
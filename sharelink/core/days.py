@@ -0,0 +1,181 @@
+# coding: utf-8
+"""
+2024 - ShareLink - days - 셰어 링크
+
+the Days table is the index of the days having links, in the timezone of the
+app, with their number of links (all of them and the public ones). It is
+kept up to date with the links, so /daily finds the previous and the next
+days in the index instead of the links, and the calendar and the digest
+read it instead of counting the links. 'sharelink count-days' builds it
+again, after a change of SHARELINK_TZ
+"""
+
+import calendar
+from collections import Counter
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Dict, Iterable, List, Tuple
+
+import pytz
+from tortoise.backends.base.client import BaseDBAsyncClient
+from tortoise.expressions import F
+from tortoise.transactions import in_transaction
+
+from sharelink.config import settings
+from sharelink.models import Days, Links
+
+# number of links read at once by count_days()
+BATCH_SIZE = 1000
+
+
+def link_day(date_created: datetime) -> date:
+    """
+    the day of a link, in the timezone of the app
+    """
+    return date_created.astimezone(pytz.timezone(settings.SHARELINK_TZ)).date()
+
+
+def day_bounds(day: date) -> Tuple[datetime, datetime]:
+    """
+    the beginning and the end of a day in the timezone of the app, in UTC as stored
+    """
+    tz = pytz.timezone(settings.SHARELINK_TZ)
+    start = tz.localize(datetime.combine(day, time.min))
+    end = tz.localize(datetime.combine(day + timedelta(days=1), time.min))
+    return start.astimezone(timezone.utc), end.astimezone(timezone.utc)
+
+
+def links_days(
+    links: Iterable[Tuple[bool, datetime]], delta: int = 1
+) -> Counter[Tuple[date, bool]]:
+    """
+    the changes of the days when the links are added (or removed when delta is -1)
+    links: private and date_created of each link
+    returns the changes by day and by public or not
+    """
+    deltas: Counter[Tuple[date, bool]] = Counter()
+    for private, date_created in links:
+        deltas[(link_day(date_created), not private)] += delta
+    return deltas
+
+
+def days_counts(deltas: Counter[Tuple[date, bool]]) -> Dict[date, Tuple[int, int]]:
+    """
+    the number of links and of public links of each day
+    """
+    counts: Dict[date, Tuple[int, int]] = {}
+    for (day, public), delta in deltas.items():
+        count, public_count = counts.get(day, (0, 0))
+        counts[day] = (count + delta, public_count + (delta if public else 0))
+    return counts
+
+
+async def update_days(
+    deltas: Counter[Tuple[date, bool]], using_db: BaseDBAsyncClient | None = None
+) -> None:
+    """
+    add the links to their days, the days without links leave the index
+    """
+    emptied = []
+    missing = {}
+    for day, (count, public_count) in days_counts(deltas).items():
+        if not count and not public_count:
+            continue
+        changes = {"count": F("count") + count, "public_count": F("public_count") + public_count}
+        if await Days.filter(day=day).using_db(using_db).update(**changes):
+            if count < 0:
+                emptied.append(day)
+        else:
+            missing[day] = changes
+    if missing:
+        # created empty, the ones created meanwhile by another write are kept: a failed
+        # insert would abort the whole transaction on PostgreSQL
+        await Days.bulk_create(
+            [Days(day=day) for day in missing], ignore_conflicts=True, using_db=using_db
+        )
+        for day, changes in missing.items():
+            await Days.filter(day=day).using_db(using_db).update(**changes)
+    if emptied:
+        await Days.filter(day__in=emptied, count__lte=0).using_db(using_db).delete()
+
+
+async def count_days() -> int:
+    """
+    build the index of the days again from the links
+    returns the number of days having links
+    """
+    deltas: Counter[Tuple[date, bool]] = Counter()
+    last_id = 0
+    while True:
+        links = (
+            await Links.filter(id__gt=last_id)
+            .order_by("id")
+            .limit(BATCH_SIZE)
+            .values_list("id", "private", "date_created")
+        )
+        if not links:
+            break
+        deltas.update(links_days((private, date_created) for _, private, date_created in links))
+        last_id = links[-1][0]
+    counts = days_counts(deltas)
+    async with in_transaction() as connection:
+        await Days.all().using_db(connection).delete()
+        await Days.bulk_create(
+            [
+                Days(day=day, count=count, public_count=public_count)
+                for day, (count, public_count) in counts.items()
+            ],
+            batch_size=BATCH_SIZE,
+            using_db=connection,
+        )
+    return len(counts)
+
+
+async def previous_day(day: date) -> date | None:
+    """
+    the last day having links before a day
+    """
+    return await Days.filter(day__lt=day).order_by("-day").first().values_list("day", flat=True)
+
+
+async def next_day(day: date) -> date | None:
+    """
+    the first day having links after a day
+    """
+    return await Days.filter(day__gt=day).order_by("day").first().values_list("day", flat=True)
+
+
+async def year_counts(year: int) -> Dict[date, int]:
+    """
+    the number of links of each day of a year
+    """
+    days = Days.filter(day__gte=date(year, 1, 1), day__lt=date(year + 1, 1, 1), count__gt=0)
+    return dict(await days.values_list("day", "count"))
+
+
+def calendar_months(
+    year: int, counts: Dict[date, int]
+) -> List[Tuple[date, List[List[Tuple[date, int | None]]]]]:
+    """
+    the weeks of each month of a year, with the number of links of each day,
+    None for the days of the other months
+    """
+    months = []
+    for month in range(1, 13):
+        weeks = [
+            [(day, counts.get(day, 0) if day.month == month else None) for day in week]
+            for week in calendar.Calendar().monthdatescalendar(year, month)
+        ]
+        months.append((date(year, month, 1), weeks))
+    return months
+
+
+async def public_days(before: date, limit: int) -> List[Tuple[date, int]]:
+    """
+    the last days having public links before a day, and their number of public links
+    """
+    return await (
+        Days.filter(day__lt=before, public_count__gt=0)
+        .order_by("-day")
+        .limit(limit)
+        .values_list("day", "public_count")
+    )
@@ -0,0 +1,132 @@
+# coding: utf-8
+"""
+2024 - ShareLink - export - 셰어 링크
+
+the whole archive as a Netscape bookmark file, read back by 'sharelink import',
+as JSON Lines or as CSV. The links are read by chunks, in the order of their id,
+and each chunk is written as soon as it is read: only one chunk is in memory,
+whatever the number of links.
+
+the notes have no URL, they are exported with the URL of their page
+"""
+
+import csv
+import html
+import io
+from datetime import datetime
+from typing import AsyncIterator, Callable, Dict, List, Tuple
+
+from sharelink.config import settings
+from sharelink.core.feeds import site_url
+from sharelink.models import Links
+from sharelink.schemas import LinkSchema
+
+NETSCAPE = "netscape"
+JSONL = "jsonl"
+CSV = "csv"
+FORMATS = [NETSCAPE, JSONL, CSV]
+
+MEDIA_TYPES = {
+    NETSCAPE: "text/html; charset=utf-8",
+    JSONL: "application/x-ndjson; charset=utf-8",
+    CSV: "text/csv; charset=utf-8",
+}
+
+EXTENSIONS = {NETSCAPE: "html", JSONL: "jsonl", CSV: "csv"}
+
+# number of links read at once
+CHUNK_SIZE = 1000
+
+# the exported columns, the ones of LinkSchema
+FIELDS = list(LinkSchema.model_fields)
+
+
+async def iter_chunks(chunk_size: int = CHUNK_SIZE) -> AsyncIterator[List[Tuple]]:
+    """
+    the values of FIELDS of all the links, by chunks of chunk_size links
+    """
+    last_id = 0
+    while True:
+        rows = (
+            await Links.filter(id__gt=last_id).order_by("id").limit(chunk_size).values_list(*FIELDS)
+        )
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1][0]
+
+
+def netscape_entry(link: Dict) -> str:
+    """
+    the <DT> entry of a link, as parsed by sharelink.core.shaarli.parse_entry
+    """
+    url = link["url"] or site_url(f"/links/{link['url_hashed']}")
+    attrs = (
+        f'HREF="{html.escape(url)}"'
+        f' ADD_DATE="{int(link["date_created"].timestamp())}"'
+        f' LAST_MODIFIED="{int(link["date_modified"].timestamp())}"'
+        f' PRIVATE="{int(link["private"])}"'
+        f' TAGS="{html.escape(link["tags"] or "")}"'
+    )
+    entry = f"<DT><A {attrs}>{html.escape(link['title'] or '')}</A>\n"
+    if link["text"]:
+        # escaped, so a text never starts another entry
+        entry += f"<DD>{html.escape(link['text'])}\n"
+    return entry
+
+
+def netscape_chunk(rows: List[Tuple]) -> str:
+    return "".join(netscape_entry(dict(zip(FIELDS, row))) for row in rows)
+
+
+def jsonl_chunk(rows: List[Tuple]) -> str:
+    return "".join(
+        f"{LinkSchema.model_construct(**dict(zip(FIELDS, row))).model_dump_json()}\n"
+        for row in rows
+    )
+
+
+def csv_chunk(rows: List[Tuple]) -> str:
+    output = io.StringIO()
+    csv.writer(output).writerows(
+        [value.isoformat() if isinstance(value, datetime) else value for value in row]
+        for row in rows
+    )
+    return output.getvalue()
+
+
+def netscape_header() -> str:
+    title = html.escape(settings.SHARELINK_NAME)
+    return (
+        "<!DOCTYPE NETSCAPE-Bookmark-file-1>\n"
+        '<META HTTP-EQUIV="Content-Type" CONTENT="text/html; charset=UTF-8">\n'
+        f"<TITLE>{title}</TITLE>\n"
+        f"<H1>{title}</H1>\n"
+        "<DL><p>\n"
+    )
+
+
+def csv_header() -> str:
+    output = io.StringIO()
+    csv.writer(output).writerow(FIELDS)
+    return output.getvalue()
+
+
+# the beginning, the chunks and the end of each format
+WRITERS: Dict[str, Tuple[Callable[[], str], Callable[[List[Tuple]], str], str]] = {
+    NETSCAPE: (netscape_header, netscape_chunk, "</DL><p>\n"),
+    JSONL: (str, jsonl_chunk, ""),
+    CSV: (csv_header, csv_chunk, ""),
+}
+
+
+async def export_links(format: str, chunk_size: int = CHUNK_SIZE) -> AsyncIterator[str]:
+    """
+    the links exported in the format, piece by piece
+    """
+    header, chunk, footer = WRITERS[format]
+    yield header()
+    async for rows in iter_chunks(chunk_size):
+        yield chunk(rows)
+    if footer:
+        yield footer
@@ -0,0 +1,249 @@
+# coding: utf-8
+"""
+2024 - ShareLink - feeds - 셰어 링크
+
+the RSS and Atom feeds of the public links, of all of them or of a tag.
+The XML of each link, its RSS item and its Atom entry, is rendered when the
+link is saved and stored with the link, as its text in HTML: a feed only
+reads the stored items of the last links and puts them together. The items
+rendered by an older version, or imported, are rendered on their first read.
+
+the digest is the RSS feed of the last days, one item per day listing its
+public links, the days are read from the index of the days
+"""
+
+import html
+import zlib
+from collections import defaultdict
+from datetime import date, datetime, timezone
+from email.utils import format_datetime
+from typing import Dict, List, Tuple
+from xml.sax.saxutils import escape, quoteattr
+
+from tortoise.expressions import Subquery
+from tortoise.queryset import QuerySet
+
+from sharelink.config import settings
+from sharelink.core.days import day_bounds, link_day, public_days
+from sharelink.core.render import RENDERER_VERSION, link_html
+from sharelink.core.tags import UNTAGGED, split_tags
+from sharelink.models import Links, LinksTags, Tags
+
+RSS = "rss"
+ATOM = "atom"
+
+MEDIA_TYPES = {
+    RSS: "application/rss+xml; charset=utf-8",
+    ATOM: "application/atom+xml; charset=utf-8",
+}
+
+# number of days of the digest, and of links read at most for them
+DIGEST_DAYS = 30
+DIGEST_LINKS = 1000
+
+# change it when the XML would not be the same, to render the items again
+FEED_VERSION = "1"
+
+
+def feed_version() -> str:
+    """
+    the version of the items, they change with the renderer of the text and the settings
+    """
+    site = zlib.crc32(f"{settings.SHARELINK_URL}|{settings.SHARELINK_AUTHOR}".encode())
+    return f"{FEED_VERSION}-{RENDERER_VERSION}-{site:x}"
+
+
+def site_url(path: str = "") -> str:
+    return f"{settings.SHARELINK_URL.rstrip('/')}{path}"
+
+
+def permalink(link: Links) -> str:
+    """
+    the URL of the page of a link
+    """
+    return site_url(f"/links/{link.url_hashed}")
+
+
+def atom_date(date: datetime) -> str:
+    return date.replace(microsecond=0).isoformat()
+
+
+def rss_item(link: Links) -> str:
+    """
+    the RSS item of a link
+    """
+    categories = "".join(f"<category>{escape(tag)}</category>" for tag in split_tags(link.tags))
+    return (
+        "<item>"
+        f"<title>{escape(link.title or '')}</title>"
+        f"<link>{escape(link.url or permalink(link))}</link>"
+        f'<guid isPermaLink="true">{escape(permalink(link))}</guid>'
+        f"<description>{escape(link_html(link))}</description>"
+        f"{categories}"
+        f"<pubDate>{format_datetime(link.date_created)}</pubDate>"
+        "</item>"
+    )
+
+
+def atom_entry(link: Links) -> str:
+    """
+    the Atom entry of a link
+    """
+    categories = "".join(f"<category term={quoteattr(tag)}/>" for tag in split_tags(link.tags))
+    updated = link.date_modified or link.date_created
+    return (
+        "<entry>"
+        f"<title>{escape(link.title or '')}</title>"
+        f"<link href={quoteattr(link.url or permalink(link))}/>"
+        f"<id>{escape(permalink(link))}</id>"
+        f"<published>{atom_date(link.date_created)}</published>"
+        f"<updated>{atom_date(updated)}</updated>"
+        f'<content type="html">{escape(link_html(link))}</content>'
+        f"{categories}"
+        "</entry>"
+    )
+
+
+def render_feed(link: Links) -> None:
+    """
+    render the items of a link before it is saved
+    """
+    link.feed_rss = rss_item(link)
+    link.feed_atom = atom_entry(link)
+    link.feed_version = feed_version()
+
+
+def tag_query(tag: str) -> QuerySet[Links]:
+    """
+    the links of a tag, found from the index of the tag
+    """
+    tags_ids = Tags.filter(name=tag).values("id")
+    links_ids = LinksTags.filter(tag_id__in=Subquery(tags_ids)).values("link_id")
+    return Links.filter(id__in=Subquery(links_ids))
+
+
+async def feed_items(query: QuerySet[Links], feed: str) -> Tuple[List[str], datetime | None]:
+    """
+    the stored items of the last public links of a query, and the date of their last change
+    """
+    rows = (
+        await query.filter(private=False)
+        .order_by("-date_created", "-id")
+        .limit(settings.FEED_SIZE)
+        .values_list("id", "feed_version", f"feed_{feed}", "date_modified")
+    )
+    version = feed_version()
+    stale = [link_id for link_id, link_version, _, _ in rows if link_version != version]
+    rendered: Dict[int, str] = {}
+    if stale:
+        links = await Links.filter(id__in=stale)
+        for link in links:
+            render_feed(link)
+        await Links.bulk_update(links, fields=["feed_rss", "feed_atom", "feed_version"])
+        rendered = {link.id: getattr(link, f"feed_{feed}") for link in links}
+    items = [rendered.get(link_id, item) for link_id, _, item, _ in rows]
+    updated = max((date_modified for _, _, _, date_modified in rows), default=None)
+    return items, updated
+
+
+def rss_feed(items: List[str], title: str, path: str, updated: datetime | None) -> str:
+    """
+    the RSS feed made of the items
+    """
+    last_build_date = (
+        f"<lastBuildDate>{format_datetime(updated)}</lastBuildDate>" if updated else ""
+    )
+    return (
+        '<?xml version="1.0" encoding="utf-8"?>'
+        '<rss version="2.0" xmlns:atom="http://www.w3.org/2005/Atom"><channel>'
+        f"<title>{escape(title)}</title>"
+        f"<link>{escape(site_url())}</link>"
+        f'<atom:link rel="self" type="application/rss+xml" href={quoteattr(site_url(path))}/>'
+        f"<description>{escape(settings.SHARELINK_DESCRIPTION)}</description>"
+        f"<language>{escape(settings.LANGUAGE_CODE)}</language>"
+        f"{last_build_date}"
+        "<generator>ShareLink</generator>"
+        f"{''.join(items)}"
+        "</channel></rss>"
+    )
+
+
+def atom_feed(items: List[str], title: str, path: str, updated: datetime | None) -> str:
+    """
+    the Atom feed made of the items
+    """
+    return (
+        '<?xml version="1.0" encoding="utf-8"?>'
+        '<feed xmlns="http://www.w3.org/2005/Atom">'
+        f"<title>{escape(title)}</title>"
+        f"<subtitle>{escape(settings.SHARELINK_DESCRIPTION)}</subtitle>"
+        f"<link href={quoteattr(site_url())}/>"
+        f'<link rel="self" href={quoteattr(site_url(path))}/>'
+        f"<id>{escape(site_url(path))}</id>"
+        f"<updated>{atom_date(updated or datetime.fromtimestamp(0, tz=timezone.utc))}</updated>"
+        f"<author><name>{escape(settings.SHARELINK_AUTHOR)}</name></author>"
+        "<generator>ShareLink</generator>"
+        f"{''.join(items)}"
+        "</feed>"
+    )
+
+
+async def build_feed(feed: str, path: str, tag: str | None = None) -> str:
+    """
+    the RSS or Atom feed of the public links, or of the public links of a tag
+    path: the path of the feed, its id
+    """
+    query = tag_query(tag) if tag else Links.all()
+    items, updated = await feed_items(query, feed)
+    title = settings.SHARELINK_NAME
+    if tag and tag != UNTAGGED:
+        title = f"{title} - {tag}"
+    if feed == ATOM:
+        return atom_feed(items, title, path, updated)
+    return rss_feed(items, title, path, updated)
+
+
+def digest_item(day: date, links: List[Tuple[str | None, str | None, str]]) -> str:
+    """
+    the RSS item of a day, listing its links
+    links: title, url and url_hashed of each link
+    """
+    url = site_url(f"/daily?yesterday={day.isoformat()}")
+    items = "".join(
+        f'<li><a href="{html.escape(link_url or site_url(f"/links/{url_hashed}"))}">'
+        f"{html.escape(title or '')}</a></li>"
+        for title, link_url, url_hashed in links
+    )
+    return (
+        "<item>"
+        f"<title>{escape(settings.SHARELINK_NAME)} - {day.isoformat()}</title>"
+        f"<link>{escape(url)}</link>"
+        f'<guid isPermaLink="true">{escape(url)}</guid>'
+        f"<description>{escape(f'<ul>{items}</ul>')}</description>"
+        f"<pubDate>{format_datetime(day_bounds(day)[1])}</pubDate>"
+        "</item>"
+    )
+
+
+async def build_digest(path: str) -> str:
+    """
+    the RSS feed of the last days before today having public links
+    path: the path of the feed
+    """
+    today = link_day(datetime.now(tz=timezone.utc))
+    days = await public_days(today, DIGEST_DAYS)
+    if not days:
+        return rss_feed([], settings.SHARELINK_NAME, path, None)
+    start, _ = day_bounds(days[-1][0])
+    _, end = day_bounds(days[0][0])
+    links = (
+        await Links.filter(private=False, date_created__gte=start, date_created__lt=end)
+        .order_by("-date_created")
+        .limit(DIGEST_LINKS)
+        .values_list("title", "url", "url_hashed", "date_created")
+    )
+    by_day: Dict[date, list] = defaultdict(list)
+    for title, url, url_hashed, date_created in links:
+        by_day[link_day(date_created)].append((title, url, url_hashed))
+    items = [digest_item(day, by_day[day]) for day, _ in days if by_day[day]]
+    return rss_feed(items, settings.SHARELINK_NAME, path, end)
@@ -4,17 +4,28 @@
 """
 
 import base64
+import threading
+import zlib
+from typing import Iterable, List
 
 # CRC Stuff
 
+# table to reverse the bits of each byte
+# PHP's hash(crc32) is the "bzip2" flavour of the CRC32 (MSB first) while zlib
+# provides the reflected one (LSB first): mirroring the bits of each byte of the
+# input, then of each byte of the result, let zlib compute the PHP's one in C
+_REVERSED_BITS = bytes(int(f"{i:08b}"[::-1], 2) for i in range(256))
 
-async def crc_that(string: str) -> int:
+
+def crc_bitwise(string: str) -> int:
     """
     the PHP's hash(crc32) in Python :P
 
     implem in python:
        https://chezsoi.org/shaarli/shaare/U7admg
        https://stackoverflow.com/a/50843127/636849
+
+    reference implementation, bit by bit, kept for the tests and the benchmarks
     """
     a = bytearray(string, "utf-8")
     crc = 0xFFFFFFFF
@@ -27,6 +38,48 @@ async def crc_that(string: str) -> int:
     return int.from_bytes(crc.to_bytes(4, "big"), "little")
 
 
+def crc(string: str) -> int:
+    """
+    the PHP's hash(crc32) in Python, computed by zlib
+
+    gives the same value as crc_bitwise() (final little-endian byte swap included)
+    """
+    value = zlib.crc32(string.encode("utf-8").translate(_REVERSED_BITS))
+    return int.from_bytes(value.to_bytes(4, "big").translate(_REVERSED_BITS), "big")
+
+
+async def crc_that(string: str) -> int:
+    """
+    the PHP's hash(crc32) in Python :P
+    """
+    return crc(string)
+
+
+def encode_hash(number: int) -> str:
+    """
+    encode a CRC using RFC 4648 base64url format
+    """
+    number_bytes = number.to_bytes((number.bit_length() + 7) // 8, byteorder="big")
+
+    encoded = base64.b64encode(number_bytes)
+    return encoded.decode().rstrip("=").replace("+", "-").replace("/", "_")
+
+
+def small_hash_sync(text: str) -> str:
+    """
+    synchronous version of small_hash()
+    """
+    return encode_hash(crc(text))
+
+
+def small_hashes(texts: Iterable[str]) -> List[str]:
+    """
+    Returns the small hash of each string, in the same order
+    eg. small_hashes(['20111006_131924']) --> ['yZH23w']
+    """
+    return [encode_hash(crc(text)) for text in texts]
+
+
 async def small_hash(text: str) -> str:
     """
     Returns the small hash of a string, using RFC 4648 base64url format
@@ -38,10 +91,74 @@ async def small_hash(text: str) -> str:
      - are NOT cryptographically secure (they CAN be forged)
     In Shaarli, they are used as a tinyurl-like link to individual entries.
     """
-    number = await crc_that(text)
+    return small_hash_sync(text)
 
-    number_bytes = number.to_bytes((number.bit_length() + 7) // 8, byteorder="big")
 
-    encoded = base64.b64encode(number_bytes)
-    final_value = encoded.decode().rstrip("=").replace("+", "-").replace("/", "_")
-    return final_value
+# Hashes allocation
+
+
+class HashAllocator:
+    """
+    allocate the small hashes of the new links
+
+    small hashes are made from the creation date of the link, to the second,
+    so two links created during the same second would get the same one.
+    The hashes already in use are kept in memory and, on collision, the date is
+    suffixed by a counter ('20111006_131924_1', '20111006_131924_2', ...) until
+    a free hash is found, without querying the database for each attempt.
+    The hashes taken meanwhile by another process are found by the database,
+    see sharelink.core.bulk.free_hashes()
+    """
+
+    def __init__(self, hashes: Iterable[str] = ()) -> None:
+        self._hashes: set[str] = set(hashes)
+        self._lock = threading.Lock()
+        self.loaded = False
+
+    def __contains__(self, url_hashed: str) -> bool:
+        return url_hashed in self._hashes
+
+    def __len__(self) -> int:
+        return len(self._hashes)
+
+    def load(self, hashes: Iterable[str]) -> None:
+        """
+        preload the hashes already stored in the database
+        """
+        with self._lock:
+            self._hashes.update(hashes)
+            self.loaded = True
+
+    def allocate(self, text: str, url_hashed: str | None = None) -> str:
+        """
+        return a small hash of text not used yet, and reserve it
+        url_hashed: the small hash of text, when already computed
+        """
+        with self._lock:
+            return self._allocate(text, url_hashed)
+
+    def allocate_many(self, texts: Iterable[str]) -> List[str]:
+        """
+        batch version of allocate()
+        """
+        with self._lock:
+            return [self._allocate(text) for text in texts]
+
+    def release(self, url_hashed: str) -> None:
+        """
+        free the hash of a deleted link
+        """
+        with self._lock:
+            self._hashes.discard(url_hashed)
+
+    def _allocate(self, text: str, url_hashed: str | None = None) -> str:
+        url_hashed = url_hashed or small_hash_sync(text)
+        suffix = 0
+        while url_hashed in self._hashes:
+            suffix += 1
+            url_hashed = small_hash_sync(f"{text}_{suffix}")
+        self._hashes.add(url_hashed)
+        return url_hashed
+
+
+allocator = HashAllocator()
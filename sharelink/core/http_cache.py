@@ -0,0 +1,180 @@
+# coding: utf-8
+"""
+2024 - ShareLink - http cache - 셰어 링크
+
+the pages only change when the links do: each write (add, update, delete,
+import) bumps the version of the links, stored in the Versions table so all
+the workers of the app share it. The ETag of a page is made of this version,
+the day and the URL of the page: a browser asking again for a page it has
+got is answered 304 Not Modified by the middleware, before the page queries
+the links or renders its template
+"""
+
+import hashlib
+from datetime import datetime, time, timedelta, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Dict, Tuple
+
+import pytz
+from starlette.middleware.base import BaseHTTPMiddleware, RequestResponseEndpoint
+from starlette.requests import Request
+from starlette.responses import Response
+from tortoise.backends.base.client import BaseDBAsyncClient
+from tortoise.expressions import F
+
+from sharelink import __version__
+from sharelink.config import settings
+from sharelink.models import Versions
+
+LINKS = "links"
+
+PRIVATE = "private"
+PUBLIC = "public"
+
+JSON = "application/json"
+
+# the pages cached by the browsers, and whether they display the private links
+CACHED_PAGES = {
+    "/": PRIVATE,
+    "/private": PRIVATE,
+    "/public": PUBLIC,
+    "/daily": PRIVATE,
+    "/daily/calendar": PRIVATE,
+    "/daily/rss": PUBLIC,
+    # the tags of the private links too
+    "/tags": PRIVATE,
+    "/search": PRIVATE,
+    "/feeds": PUBLIC,
+}
+CACHED_PREFIXES = {
+    "/feeds/": PUBLIC,
+    "/links/": PRIVATE,
+    "/links_by_tag/": PRIVATE,
+}
+
+
+def page_scope(path: str) -> str | None:
+    """
+    whether a page displays the private links, None when it is not cached
+    """
+    if path in CACHED_PAGES:
+        return CACHED_PAGES[path]
+    for prefix, scope in CACHED_PREFIXES.items():
+        if path.startswith(prefix):
+            return scope
+    return None
+
+
+def cache_control(scope: str) -> str:
+    """
+    the private pages are only kept by the browser, and checked each time
+    """
+    if scope == PRIVATE:
+        return "private, no-cache"
+    return f"public, max-age={settings.CACHE_MAX_AGE}"
+
+
+async def get_version() -> Tuple[int, datetime]:
+    """
+    the version of the links and the date of their last change
+    """
+    version = await Versions.get_or_none(name=LINKS)
+    if version is None:
+        version, _ = await Versions.get_or_create(
+            name=LINKS, defaults={"date_modified": datetime.now(tz=timezone.utc)}
+        )
+    return version.version, version.date_modified.astimezone(timezone.utc)
+
+
+async def touch(using_db: BaseDBAsyncClient | None = None) -> None:
+    """
+    bump the version of the links after a write
+    """
+    now = datetime.now(tz=timezone.utc)
+    updated = (
+        await Versions.filter(name=LINKS)
+        .using_db(using_db)
+        .update(version=F("version") + 1, date_modified=now)
+    )
+    if not updated:
+        await Versions.create(name=LINKS, version=1, date_modified=now, using_db=using_db)
+
+
+def accepts_json(request: Request) -> bool:
+    """
+    whether the client asks for JSON by its Accept header, as /search gives it
+    """
+    return JSON in request.headers.get("accept", "")
+
+
+def make_etag(version: int, request: Request, today: str) -> str:
+    """
+    the ETag of a page for a version of the links, and the format asked by Accept
+    """
+    query = "&".join(f"{key}={value}" for key, value in sorted(request.query_params.multi_items()))
+    media_type = JSON if accepts_json(request) else "text/html"
+    key = f"{__version__}|{version}|{today}|{media_type}|{request.url.path}?{query}"
+    return f'W/"{hashlib.sha1(key.encode()).hexdigest()}"'
+
+
+def is_not_modified(request: Request, etag: str, last_modified: datetime | None) -> bool:
+    """
+    whether the page the browser has is still the same one
+    last_modified: None when the page has no date yet
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        # If-Modified-Since is ignored when If-None-Match is given
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in tags or any(tag.removeprefix("W/") == etag[2:] for tag in tags)
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        return since.tzinfo is not None and last_modified <= since
+    return False
+
+
+class HttpCacheMiddleware(BaseHTTPMiddleware):
+    """
+    give an ETag and a Last-Modified date to the cached pages,
+    and answer 304 Not Modified when the browser has the current page
+    """
+
+    async def dispatch(self, request: Request, call_next: RequestResponseEndpoint) -> Response:
+        scope = page_scope(request.url.path)
+        if scope is None or request.method not in ("GET", "HEAD"):
+            return await call_next(request)
+
+        # read before the page: a link changed meanwhile gives another ETag next time
+        version, date_modified = await get_version()
+        # the pages of the current day change at midnight too
+        tz = pytz.timezone(settings.SHARELINK_TZ)
+        today = datetime.now(tz=tz).date()
+        midnight = tz.localize(datetime.combine(today, time.min)).astimezone(timezone.utc)
+        # the dates are given to the second: the one of the last write is the
+        # next second, and a page read before it ends has no date, as another
+        # write in the same second would not change it
+        last_modified: datetime | None = max(
+            date_modified.replace(microsecond=0) + timedelta(seconds=1), midnight
+        )
+        etag = make_etag(version, request, today.isoformat())
+        headers: Dict[str, str] = {
+            "ETag": etag,
+            "Cache-Control": cache_control(scope),
+            # /search gives HTML or JSON
+            "Vary": "Accept",
+        }
+        if last_modified <= datetime.now(tz=timezone.utc):
+            headers["Last-Modified"] = format_datetime(last_modified, usegmt=True)
+        else:
+            last_modified = None
+        if is_not_modified(request, etag, last_modified):
+            return Response(status_code=304, headers=headers)
+
+        response = await call_next(request)
+        if response.status_code == 200:
+            response.headers.update(headers)
+        return response
@@ -0,0 +1,241 @@
+# coding: utf-8
+"""
+2024 - ShareLink - jobs - 셰어 링크
+
+the work following a write that would slow it down, as fetching the page of
+a link, is a job stored in the Jobs table and run by the workers started with
+the app: the write returns as soon as the job is stored, and the jobs of a
+stopped app are run once it starts again.
+
+each kind of job has its function, registered by @register, and runs
+`concurrency` jobs at most at once in a process. A job failing is run again
+JOBS_BACKOFF seconds later, then twice as late each time, `attempts` times at
+most before being kept as failed. A running job whose worker stopped, after
+JOBS_LEASE seconds, is taken by another worker. A worker failing to read or
+write the jobs, as when the database is busy, logs the error and goes on
+"""
+
+import asyncio
+import logging
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, NamedTuple
+
+from tortoise.backends.base.client import BaseDBAsyncClient
+
+from sharelink.config import settings
+from sharelink.models import Jobs
+
+PENDING = "pending"
+RUNNING = "running"
+FAILED = "failed"
+
+# number of jobs stored at once
+BATCH_SIZE = 1000
+
+Handler = Callable[..., Awaitable[Any]]
+# the values of the payload of a job, stored as JSON
+JsonValue = str | int | float | bool | list | dict | None
+
+
+class JobType(NamedTuple):
+    """
+    the function of a kind of jobs, called with the payload of each job
+    """
+
+    handler: Handler
+    concurrency: int
+    attempts: int
+
+
+JOB_TYPES: Dict[str, JobType] = {}
+
+# the queue running in this process
+_queue: "JobQueue | None" = None
+
+logger = logging.getLogger(__name__)
+
+
+def register(kind: str, concurrency: int = 1, attempts: int = 5) -> Callable[[Handler], Handler]:
+    """
+    the function running the jobs of a kind
+    """
+
+    def decorator(handler: Handler) -> Handler:
+        JOB_TYPES[kind] = JobType(handler, concurrency, attempts)
+        return handler
+
+    return decorator
+
+
+async def enqueue(
+    kind: str, using_db: BaseDBAsyncClient | None = None, **payload: JsonValue
+) -> Jobs:
+    """
+    store a job, run as soon as a worker is free
+    """
+    job = await Jobs.create(
+        kind=kind, payload=payload, run_at=datetime.now(tz=timezone.utc), using_db=using_db
+    )
+    if _queue is not None:
+        _queue.wakeup.set()
+    return job
+
+
+async def enqueue_many(
+    kind: str,
+    payloads: Iterable[Dict[str, JsonValue]],
+    using_db: BaseDBAsyncClient | None = None,
+) -> int:
+    """
+    batch version of enqueue()
+    returns the number of jobs stored
+    """
+    now = datetime.now(tz=timezone.utc)
+    jobs = [Jobs(kind=kind, payload=payload, run_at=now) for payload in payloads]
+    if jobs:
+        await Jobs.bulk_create(jobs, batch_size=BATCH_SIZE, using_db=using_db)
+        if _queue is not None:
+            _queue.wakeup.set()
+    return len(jobs)
+
+
+class JobQueue:
+    """
+    the workers running the jobs
+    """
+
+    def __init__(self, workers: int, poll_interval: float, lease: int, backoff: float) -> None:
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.lease = lease
+        self.backoff = backoff
+        # the jobs running in this process, by kind
+        self.running: Counter[str] = Counter()
+        self.wakeup = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+
+    def free_kinds(self) -> List[str]:
+        return [
+            kind
+            for kind, job_type in JOB_TYPES.items()
+            if self.running[kind] < job_type.concurrency
+        ]
+
+    async def claim(self) -> Jobs | None:
+        """
+        take the next job to run, of a kind not running its maximum of jobs
+        """
+        kinds = self.free_kinds()
+        if not kinds:
+            return None
+        now = datetime.now(tz=timezone.utc)
+        jobs = (
+            await Jobs.filter(kind__in=kinds, status__in=[PENDING, RUNNING], run_at__lte=now)
+            .order_by("run_at", "id")
+            .limit(self.workers)
+        )
+        for job in jobs:
+            if job.kind not in self.free_kinds():
+                continue
+            # counted before being taken, another worker of this process sees it
+            self.running[job.kind] += 1
+            lease = now + timedelta(seconds=self.lease)
+            # the number of attempts tells if another worker took it meanwhile
+            try:
+                taken = await Jobs.filter(id=job.id, attempts=job.attempts).update(
+                    status=RUNNING, run_at=lease, attempts=job.attempts + 1
+                )
+            except Exception:
+                self.running[job.kind] -= 1
+                raise
+            if taken:
+                job.status, job.run_at, job.attempts = RUNNING, lease, job.attempts + 1
+                return job
+            self.running[job.kind] -= 1
+        return None
+
+    async def run(self, job: Jobs) -> None:
+        """
+        run a job taken, then forget it, or run it again later when it fails
+        """
+        job_type = JOB_TYPES[job.kind]
+        try:
+            await job_type.handler(**job.payload)
+        except Exception as error:
+            if job.attempts >= job_type.attempts:
+                changes: Dict[str, Any] = {"status": FAILED}
+            else:
+                delay = self.backoff * 2 ** (job.attempts - 1)
+                run_at = datetime.now(tz=timezone.utc) + timedelta(seconds=delay)
+                changes = {"status": PENDING, "run_at": run_at}
+            await Jobs.filter(id=job.id, attempts=job.attempts).update(error=repr(error), **changes)
+        else:
+            await Jobs.filter(id=job.id, attempts=job.attempts).delete()
+        finally:
+            self.running[job.kind] -= 1
+            # a kind of jobs can run again
+            self.wakeup.set()
+
+    async def run_pending(self) -> int:
+        """
+        run the jobs to run now, one after the other
+        returns the number of jobs run
+        """
+        count = 0
+        while job := await self.claim():
+            await self.run(job)
+            count += 1
+        return count
+
+    async def work(self) -> None:
+        """
+        a worker, waiting for the jobs
+        """
+        while True:
+            self.wakeup.clear()
+            try:
+                job = await self.claim()
+                if job is not None:
+                    await self.run(job)
+                    continue
+            except Exception:
+                # a job taken whose end was not stored is run again after its lease
+                logger.exception("the jobs can not be run now")
+                await asyncio.sleep(self.poll_interval)
+                continue
+            try:
+                # the jobs stored by the other processes, and the ones to run again
+                async with asyncio.timeout(self.poll_interval):
+                    await self.wakeup.wait()
+            except TimeoutError:
+                pass
+
+    def start(self) -> None:
+        global _queue
+        _queue = self
+        self._tasks = [asyncio.create_task(self.work()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        """
+        stop the workers, the jobs running are run again by the next ones
+        """
+        global _queue
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if _queue is self:
+            _queue = None
+
+
+def make_queue() -> JobQueue:
+    """
+    the queue of the app, made from the settings
+    """
+    return JobQueue(
+        workers=settings.JOBS_WORKERS,
+        poll_interval=settings.JOBS_POLL_INTERVAL,
+        lease=settings.JOBS_LEASE,
+        backoff=settings.JOBS_BACKOFF,
+    )
@@ -0,0 +1,366 @@
+# coding: utf-8
+"""
+2024 - ShareLink - metadata - 셰어 링크
+
+the title, the description and the image of the page of a link, read from
+its <head> (Open Graph, or the <title> and the description), fill the ones
+left empty in the form. They are fetched by a job once the link is saved, so
+saving a link never waits for its site. The description is stored as plain
+text, never as HTML or Markdown of the page. The sites of the local network,
+loopback, private or link-local addresses, are not fetched, the redirections
+included, but with METADATA_PRIVATE_HOSTS.
+
+the pages are fetched by a pool of connections, METADATA_PER_HOST at most at
+once from the same site, METADATA_TIMEOUT seconds at most each, and their
+metadata are kept METADATA_CACHE_TTL seconds by normalized URL, pages that can
+not be read included. A site that does not answer, or answers with an error of
+the server, fails the job: it is run again later
+"""
+
+import asyncio
+import ipaddress
+import json
+import socket
+import weakref
+from html.parser import HTMLParser
+from typing import Dict, Iterable, List, NamedTuple, Tuple
+from urllib.parse import urljoin, urlsplit, urlunsplit
+
+import httpx
+from pydantic import ValidationError
+from tortoise.backends.base.client import BaseDBAsyncClient
+
+from sharelink import __version__
+from sharelink.config import settings
+from sharelink.core.jobs import enqueue_many, register
+from sharelink.core.render import escape_markdown
+from sharelink.core.response_cache import MemoryStore
+from sharelink.forms import MAX_LENGTH, LinksForm
+from sharelink.models import Links
+
+# characters of a page read at most to find its <head>
+MAX_SIZE = 512 * 1024
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+# redirections followed at most to the page
+MAX_REDIRECTS = 5
+
+# the meta tags read, the first ones found win
+META = ("og:title", "og:description", "description", "og:image", "twitter:image")
+
+# the kind of the jobs enriching the links, see sharelink.core.jobs
+METADATA = "metadata"
+
+
+class FetchError(Exception):
+    """
+    a page that can not be read now, but could be later
+    """
+
+
+class Metadata(NamedTuple):
+    """
+    the metadata of a page
+    """
+
+    title: str
+    description: str
+    image: str | None
+
+
+def normalize_url(url: str) -> str:
+    """
+    the URL of a page as it is cached: lower case scheme and host, without
+    default port, credentials nor fragment
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = parts.hostname or ""
+    if ":" in host:
+        host = f"[{host}]"
+    if parts.port is not None and DEFAULT_PORTS.get(scheme) != parts.port:
+        host = f"{host}:{parts.port}"
+    return urlunsplit((scheme, host, parts.path or "/", parts.query, ""))
+
+
+async def is_public(host: str) -> bool:
+    """
+    a host whose addresses are all on the internet
+    raises FetchError when it can not be resolved now
+    """
+    try:
+        infos = await asyncio.get_running_loop().getaddrinfo(host, None, type=socket.SOCK_STREAM)
+    except socket.gaierror as error:
+        raise FetchError(host) from error
+    for *_, sockaddr in infos:
+        address = ipaddress.ip_address(sockaddr[0])
+        if isinstance(address, ipaddress.IPv6Address) and address.ipv4_mapped:
+            address = address.ipv4_mapped
+        if not address.is_global:
+            return False
+    return bool(infos)
+
+
+class MetadataParser(HTMLParser):
+    """
+    read the metadata of the <head> of a page, fed piece by piece
+    """
+
+    def __init__(self) -> None:
+        super().__init__(convert_charrefs=True)
+        self.meta: Dict[str, str] = {}
+        self.title: List[str] = []
+        self.in_title = False
+        # the end of the <head>
+        self.done = False
+
+    def handle_starttag(self, tag: str, attrs: List[Tuple[str, str | None]]) -> None:
+        if self.done:
+            return
+        if tag == "title":
+            self.in_title = True
+        elif tag == "meta":
+            attributes = dict(attrs)
+            name = (attributes.get("property") or attributes.get("name") or "").lower()
+            content = (attributes.get("content") or "").strip()
+            if name in META and content:
+                self.meta.setdefault(name, content)
+        elif tag == "body":
+            self.done = True
+
+    def handle_endtag(self, tag: str) -> None:
+        if tag == "title":
+            self.in_title = False
+        elif tag == "head":
+            self.done = True
+
+    def handle_data(self, data: str) -> None:
+        if self.in_title:
+            self.title.append(data)
+
+    def metadata(self, url: str) -> Metadata:
+        """
+        the metadata found in the page of url
+        """
+        title = self.meta.get("og:title") or " ".join("".join(self.title).split())
+        description = self.meta.get("og:description") or self.meta.get("description") or ""
+        image = self.meta.get("og:image") or self.meta.get("twitter:image")
+        if image:
+            image = urljoin(url, image)
+            if not image.startswith(("http://", "https://")) or len(image) > MAX_LENGTH:
+                image = None
+        return Metadata(title, description, image)
+
+
+class MetadataFetcher:
+    """
+    fetch the metadata of the pages, sharing the connections, limited by site,
+    and keep them
+    """
+
+    def __init__(
+        self,
+        timeout: float,
+        per_host: int,
+        connections: int,
+        cache_size: int,
+        cache_ttl: int,
+        private_hosts: bool = False,
+    ) -> None:
+        self.timeout = timeout
+        self.per_host = per_host
+        self.private_hosts = private_hosts
+        self.cache = MemoryStore(cache_size)
+        self.cache_ttl = cache_ttl
+        self.client = httpx.AsyncClient(
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=connections),
+            # followed by _read(), checking the host of each one
+            follow_redirects=False,
+            headers={"User-Agent": f"ShareLink/{__version__}"},
+        )
+        # a site without page being fetched loses its semaphore
+        self._hosts: weakref.WeakValueDictionary[str, asyncio.Semaphore] = (
+            weakref.WeakValueDictionary()
+        )
+        # the pages being fetched, each one is fetched once
+        self._pending: Dict[str, asyncio.Task] = {}
+
+    async def fetch(self, url: str) -> Metadata | None:
+        """
+        the metadata of the page of url, None when it can not be read
+        raises FetchError when its site does not answer
+        """
+        key = normalize_url(url)
+        cached = (await self.cache.mget([key]))[0]
+        if cached is not None:
+            data = json.loads(cached)
+            return Metadata(*data) if data else None
+        task = self._pending.get(key)
+        if task is None:
+            task = asyncio.create_task(self._fetch(key))
+            self._pending[key] = task
+            task.add_done_callback(lambda _: self._pending.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def _fetch(self, url: str) -> Metadata | None:
+        host = urlsplit(url).netloc
+        semaphore = self._hosts.get(host)
+        if semaphore is None:
+            semaphore = self._hosts[host] = asyncio.Semaphore(self.per_host)
+        async with semaphore:
+            try:
+                async with asyncio.timeout(self.timeout):
+                    metadata = await self._read(url)
+            except UnicodeDecodeError:
+                metadata = None
+            except (httpx.HTTPError, TimeoutError) as error:
+                # not kept, the next attempt reads the page again
+                raise FetchError(url) from error
+        await self.cache.set(url, json.dumps(metadata).encode(), ex=self.cache_ttl)
+        return metadata
+
+    async def allowed(self, url: str) -> bool:
+        """
+        a page the fetcher may read: on the web, out of the local network
+        """
+        parts = urlsplit(url)
+        if parts.scheme not in DEFAULT_PORTS or not parts.hostname:
+            return False
+        return self.private_hosts or await is_public(parts.hostname)
+
+    async def _read(self, url: str) -> Metadata | None:
+        for _ in range(MAX_REDIRECTS + 1):
+            if not await self.allowed(url):
+                return None
+            async with self.client.stream("GET", url) as response:
+                if response.has_redirect_location:
+                    url = urljoin(str(response.url), response.headers["Location"])
+                    continue
+                if response.status_code == 429 or response.status_code >= 500:
+                    raise FetchError(f"{url}: {response.status_code}")
+                if response.status_code != 200:
+                    return None
+                if "html" not in response.headers.get("content-type", ""):
+                    return None
+                parser = MetadataParser()
+                size = 0
+                async for chunk in response.aiter_text():
+                    parser.feed(chunk)
+                    size += len(chunk)
+                    if parser.done or size > MAX_SIZE:
+                        break
+                return parser.metadata(str(response.url))
+        # too many redirections
+        return None
+
+    async def close(self) -> None:
+        await self.client.aclose()
+
+
+_fetcher: MetadataFetcher | None = None
+
+
+def get_fetcher() -> MetadataFetcher:
+    """
+    the fetcher of the app, made from the settings
+    """
+    global _fetcher
+    if _fetcher is None:
+        _fetcher = MetadataFetcher(
+            timeout=settings.METADATA_TIMEOUT,
+            per_host=settings.METADATA_PER_HOST,
+            connections=settings.METADATA_CONNECTIONS,
+            cache_size=settings.METADATA_CACHE_SIZE,
+            cache_ttl=settings.METADATA_CACHE_TTL,
+            private_hosts=settings.METADATA_PRIVATE_HOSTS,
+        )
+    return _fetcher
+
+
+async def close_fetcher() -> None:
+    """
+    close the connections of the fetcher, when the app stops
+    """
+    global _fetcher
+    if _fetcher is not None:
+        await _fetcher.close()
+        _fetcher = None
+
+
+# as many links at once as connections to their sites
+@register(METADATA, concurrency=settings.METADATA_CONNECTIONS, attempts=3)
+async def enrich_link(link_id: int) -> bool:
+    """
+    fill the title, the text and the image of a link left empty by its page,
+    the text escaped to display the description of the page as it is
+    returns True when the link changed
+    raises FetchError when its site does not answer, the job is run again later
+    """
+    # sharelink.core.bulk enqueues these jobs when it creates the links
+    from sharelink.core.bulk import update_links
+
+    link = await Links.get_or_none(id=link_id)
+    if link is None or not link.url:
+        return False
+    metadata = await get_fetcher().fetch(link.url)
+    if metadata is None:
+        return False
+
+    # changed while its page was fetched
+    link = await Links.get_or_none(id=link_id)
+    if link is None or not link.url:
+        return False
+    changes = {}
+    if metadata.title and link.title in (None, "", link.url):
+        changes["title"] = metadata.title[:MAX_LENGTH]
+    if metadata.description and not link.text:
+        changes["text"] = escape_markdown(metadata.description)
+    if metadata.image and not link.image:
+        changes["image"] = metadata.image
+    if not changes:
+        return False
+    try:
+        form = LinksForm(
+            **{
+                "url": link.url,
+                "title": link.title or "",
+                "text": link.text or "",
+                "tags": link.tags or "",
+                "private": link.private,
+                "sticky": link.sticky,
+                "image": link.image,
+                "video": link.video,
+                **changes,
+            }
+        )
+    except ValidationError:
+        return False
+    await update_links([(link.url_hashed, form)])
+    return True
+
+
+def needs_metadata(link: Links, untitled: bool = False) -> bool:
+    """
+    a link whose title, text or image was left empty
+    untitled: only a link whose title was left empty
+    """
+    if not link.url:
+        return False
+    if link.title in (None, "", link.url):
+        return True
+    return not untitled and (not link.text or not link.image)
+
+
+async def enrich_later(
+    links: Iterable[Links], using_db: BaseDBAsyncClient | None = None, untitled: bool = False
+) -> None:
+    """
+    enrich the saved links by jobs
+    using_db: the transaction saving the links, their jobs run once it is committed
+    untitled: only the links whose title was left empty
+    """
+    if settings.METADATA_FETCH:
+        payloads = ({"link_id": link.id} for link in links if needs_metadata(link, untitled))
+        await enqueue_many(METADATA, payloads, using_db)
@@ -0,0 +1,198 @@
+# coding: utf-8
+"""
+2024 - ShareLink - migrations - 셰어 링크
+
+the tables are created by Tortoise when they do not exist,
+the migrations bring the existing ones up to date with the models.
+
+each worker of the app migrates the database when it starts: the first one
+holds the "lock" row of the Migrations table while it applies them, the
+others wait for it to end, then find nothing left to apply
+"""
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, List, Tuple
+
+from tortoise import connections
+from tortoise.backends.base.client import BaseDBAsyncClient
+from tortoise.exceptions import IntegrityError, OperationalError
+from tortoise.utils import generate_schema_for_client
+
+from sharelink.core.days import count_days
+from sharelink.core.search import create_search_index
+from sharelink.core.tags import BATCH_SIZE, backfill_tags
+from sharelink.models import Counters, Links, Migrations
+
+# the row of Migrations held by the worker applying the migrations
+LOCK = "lock"
+# seconds after which the lock of a worker stopped while migrating is taken,
+# its date is renewed after each migration
+LOCK_TIMEOUT = 3600
+
+
+async def create_indexes(connection: BaseDBAsyncClient) -> None:
+    """
+    create the tables and the indexes declared by the models that the database
+    does not have yet
+    """
+    # created "IF NOT EXISTS", with the names Tortoise gives them
+    await generate_schema_for_client(connection, safe=True)
+
+
+async def add_column(connection: BaseDBAsyncClient, table: str, column: str, sql: str) -> None:
+    """
+    add a column to a table that does not have it yet
+    sql: the definition of the column
+    """
+    try:
+        await connection.execute_query(f"SELECT {column} FROM {table} LIMIT 0")
+    except OperationalError:
+        await connection.execute_script(f"ALTER TABLE {table} ADD COLUMN {column} {sql}")
+
+
+async def links_indexes(connection: BaseDBAsyncClient) -> None:
+    """
+    index date_created and (private, date_created) of Links
+    """
+    await create_indexes(connection)
+
+
+async def links_tags(connection: BaseDBAsyncClient) -> None:
+    """
+    fill the Tags/LinksTags tables from Links.tags
+    """
+    await backfill_tags()
+
+
+async def tags_count(connection: BaseDBAsyncClient) -> None:
+    """
+    count the links of each tag, the links without tag get the 0Tag one
+    """
+    await add_column(connection, "tags", "count", "INT NOT NULL DEFAULT 0")
+    await backfill_tags()
+
+
+async def utc_dates(connection: BaseDBAsyncClient) -> None:
+    """
+    store again in UTC the dates of the links that were stored in the timezone of the app
+    """
+    if connection.capabilities.dialect != "sqlite":
+        # the other databases store the dates with their timezone, not as strings
+        return
+    last_id = 0
+    while True:
+        links = (
+            await Links.filter(id__gt=last_id)
+            .order_by("id")
+            .limit(BATCH_SIZE)
+            .values_list("id", "date_created", "date_modified")
+        )
+        if not links:
+            return
+        await connection.execute_many(
+            "UPDATE links SET date_created = ?, date_modified = ? WHERE id = ?",
+            [
+                [
+                    date_created.astimezone(timezone.utc).isoformat(" "),
+                    date_modified.astimezone(timezone.utc).isoformat(" "),
+                    link_id,
+                ]
+                for link_id, date_created, date_modified in links
+            ],
+        )
+        last_id = links[-1][0]
+
+
+async def links_text_html(connection: BaseDBAsyncClient) -> None:
+    """
+    add the columns of the rendered text, filled on the first display of the links
+    """
+    await add_column(connection, "links", "text_html", "TEXT")
+    await add_column(connection, "links", "text_html_version", "VARCHAR(50)")
+
+
+async def links_search(connection: BaseDBAsyncClient) -> None:
+    """
+    index the links for the full-text search
+    """
+    await create_search_index(connection)
+
+
+async def links_feeds(connection: BaseDBAsyncClient) -> None:
+    """
+    add the columns of the items of the feeds, filled on the first read of the feeds
+    """
+    await add_column(connection, "links", "feed_rss", "TEXT")
+    await add_column(connection, "links", "feed_atom", "TEXT")
+    await add_column(connection, "links", "feed_version", "VARCHAR(50)")
+
+
+async def days(connection: BaseDBAsyncClient) -> None:
+    """
+    index the days having links, they were counted with the lists
+    """
+    await count_days()
+    await Counters.filter(name__startswith="day:").delete()
+
+
+async def links_text_excerpt(connection: BaseDBAsyncClient) -> None:
+    """
+    add the column of the beginning of the text, filled when the links are rendered again
+    """
+    await add_column(connection, "links", "text_excerpt", "TEXT")
+
+
+MIGRATIONS: List[Tuple[str, Callable[[BaseDBAsyncClient], Awaitable[None]]]] = [
+    ("0001_links_indexes", links_indexes),
+    ("0002_links_tags", links_tags),
+    ("0003_tags_count", tags_count),
+    ("0004_utc_dates", utc_dates),
+    ("0005_links_text_html", links_text_html),
+    ("0006_links_search", links_search),
+    ("0007_links_feeds", links_feeds),
+    ("0008_days", days),
+    ("0009_links_text_excerpt", links_text_excerpt),
+]
+
+
+async def lock(poll_interval: float = 0.5) -> None:
+    """
+    wait for the other workers to end their migrations, and take the lock
+    """
+    while True:
+        try:
+            await Migrations.create(name=LOCK)
+            return
+        except IntegrityError:
+            stale = datetime.now(tz=timezone.utc) - timedelta(seconds=LOCK_TIMEOUT)
+            await Migrations.filter(name=LOCK, date_applied__lt=stale).delete()
+            await asyncio.sleep(poll_interval)
+
+
+async def migrate() -> List[str]:
+    """
+    apply the migrations not applied yet
+    returns their names
+    """
+    connection = connections.get("default")
+    applied = set(await Migrations.all().values_list("name", flat=True))
+    if all(name in applied for name, _ in MIGRATIONS):
+        return []
+
+    await lock()
+    try:
+        # applied by another worker meanwhile
+        applied = set(await Migrations.all().values_list("name", flat=True))
+        names = []
+        for name, migration in MIGRATIONS:
+            if name in applied:
+                continue
+            await migration(connection)
+            await Migrations.create(name=name)
+            names.append(name)
+            # still migrating
+            await Migrations.filter(name=LOCK).update(date_applied=datetime.now(tz=timezone.utc))
+        return names
+    finally:
+        await Migrations.filter(name=LOCK).delete()
@@ -0,0 +1,131 @@
+# coding: utf-8
+"""
+2024 - ShareLink - pagination - 셰어 링크
+
+the lists of links are ordered by (date_created, id), newest first.
+Besides the offset, a page can be given by a cursor: the position of the link
+it follows (after) or precedes (before), found from the index like the first
+page, whatever the number of links before it
+"""
+
+import base64
+from datetime import datetime, timezone
+from typing import Annotated, Any, Dict, Iterable, List, Tuple
+
+from pydantic import AfterValidator
+from tortoise.expressions import Q
+from tortoise.queryset import QuerySet
+
+from sharelink.core.render import render_rows
+from sharelink.core.rows import LinkRow, fetch_rows
+from sharelink.models import Links
+
+
+class Page(List[Any]):
+    """
+    the links of a page, with the cursors of the next and previous pages
+    """
+
+    def __init__(
+        self,
+        links: Iterable[LinkRow | Links] = (),
+        next_cursor: str | None = None,
+        prev_cursor: str | None = None,
+    ) -> None:
+        super().__init__(links)
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+
+def encode_cursor(link: LinkRow | Links) -> str:
+    """
+    the cursor of the position of a link
+    """
+    date_created = link.date_created.astimezone(timezone.utc).isoformat()
+    return base64.urlsafe_b64encode(f"{date_created},{link.id}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """
+    the date of creation and the id of a cursor
+    raises ValueError when the cursor is not valid
+    """
+    try:
+        value = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        date_created, _, link_id = value.partition(",")
+        return datetime.fromisoformat(date_created).astimezone(timezone.utc), int(link_id)
+    except (UnicodeDecodeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor {cursor!r}") from e
+
+
+def check_cursor(cursor: str | None) -> str | None:
+    """
+    validate a cursor given as parameter
+    """
+    if cursor:
+        decode_cursor(cursor)
+    return cursor
+
+
+# a query parameter holding a cursor
+Cursor = Annotated[str | None, AfterValidator(check_cursor)]
+
+
+def cursor_headers(page: Page) -> Dict[str, str]:
+    """
+    the headers giving the cursors of the next and previous pages
+    """
+    headers = {}
+    if page.next_cursor:
+        headers["X-Next-Cursor"] = page.next_cursor
+    if page.prev_cursor:
+        headers["X-Prev-Cursor"] = page.prev_cursor
+    return headers
+
+
+async def paginate(
+    query: QuerySet[Links],
+    offset: int = 0,
+    limit: int = 10,
+    after: str | None = None,
+    before: str | None = None,
+) -> Page:
+    """
+    the links of a page of the query, given by its offset or by a cursor,
+    with the columns of the lists only
+    after: the cursor of the last link of the previous page
+    before: the cursor of the first link of the next page
+    """
+    if before:
+        date_created, link_id = decode_cursor(before)
+        # the newer links, read from the cursor then reversed
+        # date_created <= x AND (...) lets the database seek in the index of date_created
+        links = await fetch_rows(
+            query.filter(date_created__gte=date_created)
+            .filter(Q(date_created__gt=date_created) | Q(id__gt=link_id))
+            .order_by("date_created", "id")
+            .limit(limit + 1)
+        )
+        has_prev = len(links) > limit
+        links = links[:limit][::-1]
+        has_next = True
+    else:
+        if after:
+            date_created, link_id = decode_cursor(after)
+            query = query.filter(date_created__lte=date_created).filter(
+                Q(date_created__lt=date_created) | Q(id__lt=link_id)
+            )
+            offset = 0
+        links = await fetch_rows(
+            query.order_by("-date_created", "-id").offset(offset).limit(limit + 1)
+        )
+        has_next = len(links) > limit
+        links = links[:limit]
+        has_prev = bool(after) or offset > 0
+
+    links = await render_rows(links)
+    return Page(
+        links,
+        next_cursor=encode_cursor(links[-1]) if links and has_next else None,
+        prev_cursor=encode_cursor(links[0]) if links and has_prev else None,
+    )
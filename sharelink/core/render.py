@@ -0,0 +1,227 @@
+# coding: utf-8
+"""
+2024 - ShareLink - render - 셰어 링크
+
+the text of the links is written in Markdown. The HTML displayed by the lists
+is rendered once, when the link is saved or on its first display, and stored
+in Links.text_html with the version of the renderer that made it: the pages
+render again only the links rendered by an older version, and
+'sharelink render' renders them all again, in parallel. The beginning of the
+text is stored too, in Links.text_excerpt, so the lists render it again
+without reading the whole text
+"""
+
+import asyncio
+import html
+import os
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import Callable, Deque, Dict, Iterable, List, Tuple
+
+import markdown
+import pygments
+from jinja2 import Environment
+from jinja2.filters import do_truncate
+from tortoise.expressions import Q
+
+from sharelink.core.rows import LinkRow
+from sharelink.models import Links
+
+EXTENSIONS = ["fenced_code", "codehilite", "footnotes", "tables"]
+
+# change it when the HTML would not be the same, to render the links again
+RENDERER_VERSION = f"1-{markdown.__version__}-{pygments.__version__}"
+
+# the lists display the beginning of the text
+TEXT_LENGTH = 500
+
+# number of links rendered at once by render_all()
+BATCH_SIZE = 500
+
+_env = Environment()
+
+# the renderer of each thread, its extensions are loaded once
+_local = threading.local()
+
+
+def get_renderer() -> markdown.Markdown:
+    """
+    the Markdown renderer of the current thread
+    """
+    renderer = getattr(_local, "renderer", None)
+    if renderer is None:
+        renderer = _local.renderer = markdown.Markdown(extensions=EXTENSIONS)
+    return renderer
+
+
+def convert(text: str) -> str:
+    """
+    convert Markdown with the renderer of the thread
+    """
+    # reset() forgets the footnotes... of the previous text
+    return get_renderer().reset().convert(text)
+
+
+def escape_markdown(text: str) -> str:
+    """
+    the Markdown of a plain text, displayed as it is: its HTML and its
+    Markdown are escaped
+    """
+    escaped = html.escape(text, quote=False)
+    return "".join(
+        f"\\{char}" if char in get_renderer().ESCAPED_CHARS else char for char in escaped
+    )
+
+
+@lru_cache(maxsize=1024)
+def render_markdown(text: str) -> str:
+    """
+    convert Markdown, the last texts converted are kept in memory
+    """
+    return convert(text)
+
+
+def render_texts(texts: List[str | None]) -> List[Tuple[str, str]]:
+    """
+    the beginning of each text and its HTML, in a worker process
+    """
+    return [(beginning, convert(beginning)) for beginning in map(excerpt, texts)]
+
+
+def excerpt(text: str | None) -> str:
+    """
+    the beginning of the text displayed by the lists, as truncate(500) in the templates
+    """
+    return do_truncate(_env, text or "", TEXT_LENGTH)
+
+
+def link_html(link: Links | LinkRow) -> str:
+    """
+    the HTML of the beginning of the text of a link
+    """
+    if link.text_html_version == RENDERER_VERSION and link.text_html is not None:
+        return link.text_html
+    if link.text_excerpt is not None:
+        return render_markdown(link.text_excerpt)
+    return render_markdown(excerpt(getattr(link, "text", None)))
+
+
+def render_link(link: Links) -> None:
+    """
+    render the text of a link before it is saved
+    """
+    link.text_excerpt = excerpt(link.text)
+    link.text_html = render_markdown(link.text_excerpt)
+    link.text_html_version = RENDERER_VERSION
+
+
+async def render_links(links: Iterable[Links]) -> None:
+    """
+    render and store the text of the links not rendered by the current renderer yet
+    """
+    stale = [link for link in links if link.text_html_version != RENDERER_VERSION]
+    if not stale:
+        return
+    for link in stale:
+        render_link(link)
+    await Links.bulk_update(stale, fields=["text_excerpt", "text_html", "text_html_version"])
+
+
+async def render_rows(rows: List[LinkRow]) -> List[LinkRow]:
+    """
+    render and store the text of the rows not rendered by the current renderer yet
+    returns the rows rendered
+    """
+    stale = [row for row in rows if row.text_html_version != RENDERER_VERSION]
+    if not stale:
+        return rows
+    # the whole text of the links imported, or rendered before text_excerpt
+    missing = [row.id for row in stale if row.text_excerpt is None]
+    texts = dict(await Links.filter(id__in=missing).values_list("id", "text")) if missing else {}
+    rendered: Dict[int, LinkRow] = {}
+    for row in stale:
+        beginning = row.text_excerpt if row.text_excerpt is not None else excerpt(texts.get(row.id))
+        rendered[row.id] = row._replace(
+            text_excerpt=beginning,
+            text_html=render_markdown(beginning),
+            text_html_version=RENDERER_VERSION,
+        )
+    await Links.bulk_update(
+        [
+            Links(
+                id=row.id,
+                text_excerpt=row.text_excerpt,
+                text_html=row.text_html,
+                text_html_version=row.text_html_version,
+            )
+            for row in rendered.values()
+        ],
+        fields=["text_excerpt", "text_html", "text_html_version"],
+    )
+    return [rendered.get(row.id, row) for row in rows]
+
+
+async def render_all(
+    workers: int | None = None,
+    batch_size: int = BATCH_SIZE,
+    everything: bool = False,
+    progress: Callable[[int], None] | None = None,
+) -> int:
+    """
+    render and store the text of the links not rendered by the current renderer,
+    by batch rendered in parallel by worker processes
+
+    workers: number of processes, one per CPU by default
+    everything: render all the links again, even the ones of the current renderer
+    progress: called after each batch with the number of links rendered
+    returns the number of links rendered
+    """
+    query = Links.all()
+    if not everything:
+        query = Links.filter(
+            Q(text_html_version__isnull=True) | Q(text_html_version__not=RENDERER_VERSION)
+        )
+    workers = workers or os.cpu_count() or 1
+    loop = asyncio.get_running_loop()
+    rendered = last_id = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # the batches read ahead are rendered while the first one is stored
+        pending: Deque[Tuple[List[int], asyncio.Future]] = deque()
+        read = False
+        while not read or pending:
+            if not read:
+                links = (
+                    await query.filter(id__gt=last_id)
+                    .order_by("id")
+                    .limit(batch_size)
+                    .values_list("id", "text")
+                )
+                read = not links
+                if links:
+                    last_id = links[-1][0]
+                    texts = [text for _, text in links]
+                    future = loop.run_in_executor(pool, render_texts, texts)
+                    pending.append(([link_id for link_id, _ in links], future))
+                if not read and len(pending) <= workers:
+                    continue
+            if not pending:
+                break
+            ids, htmls = pending.popleft()
+            await Links.bulk_update(
+                [
+                    Links(
+                        id=link_id,
+                        text_excerpt=beginning,
+                        text_html=html,
+                        text_html_version=RENDERER_VERSION,
+                    )
+                    for link_id, (beginning, html) in zip(ids, await htmls)
+                ],
+                fields=["text_excerpt", "text_html", "text_html_version"],
+            )
+            rendered += len(ids)
+            if progress:
+                progress(rendered)
+    return rendered
@@ -0,0 +1,309 @@
+# coding: utf-8
+"""
+2024 - ShareLink - response cache - 셰어 링크
+
+the pages read the most (/, /public, /tags, the feeds, /daily...) are kept once
+rendered, by the URL of the page, its scheme and its host included as the pages
+give absolute URLs, so a burst of identical requests does not
+query the links nor render the templates each time.
+
+each page depends on keys: the lists (all, private, public), the tags, a day,
+a tag or a link. Writing a link invalidates the keys it changes: a cached page
+is served only while the generations of its keys are the ones it was rendered
+with, so a page rendered while a link was written is not served.
+
+the pages are kept in a store with the methods of redis.asyncio.Redis: in
+memory by default (least recently used pages go first, and after
+RESPONSE_CACHE_TTL seconds), or in Redis with RESPONSE_CACHE_URL, shared by
+all the workers of the app; the in-memory store only sees the writes of its
+own worker, the others serve their pages until they expire
+"""
+
+import base64
+import json
+import time
+from collections import OrderedDict
+from datetime import date, datetime
+from typing import Dict, Iterable, List, NamedTuple, Protocol, Set, Tuple
+
+import pytz
+from starlette.middleware.base import BaseHTTPMiddleware, RequestResponseEndpoint
+from starlette.requests import Request
+from starlette.responses import Response
+
+from sharelink.config import settings
+from sharelink.core.tags import UNTAGGED, split_tags
+
+# the counters kept by the in-memory store for each of its values
+COUNTERS_PER_VALUE = 10
+
+# the keys the pages depend on
+EVERYTHING = "*"
+ALL = "all"
+PRIVATE = "private"
+PUBLIC = "public"
+TAGS = "tags"
+# the days having links, shown by the navigation of /daily
+DAYS = "days"
+
+
+def day_key(day: date) -> str:
+    return f"day:{day.isoformat()}"
+
+
+def tag_key(tag: str) -> str:
+    return f"tag:{tag}"
+
+
+def link_key(url_hashed: str) -> str:
+    return f"link:{url_hashed}"
+
+
+def page_keys(request: Request) -> List[str] | None:
+    """
+    the keys a page depends on, None when the page is not cached
+    """
+    path = request.url.path
+    if path == "/":
+        return [ALL]
+    if path in ("/feeds", "/feeds/atom"):
+        return [PUBLIC]
+    if path.startswith("/feeds/tag/"):
+        return [tag_key(path.removeprefix("/feeds/tag/").removesuffix("/atom"))]
+    if path in ("/private", "/public"):
+        return [path[1:]]
+    if path == "/tags":
+        return [TAGS]
+    if path == "/daily":
+        try:
+            day = date.fromisoformat(request.query_params["yesterday"])
+        except (KeyError, ValueError):
+            day = datetime.now(tz=pytz.timezone(settings.SHARELINK_TZ)).date()
+        return [day_key(day), DAYS]
+    if path == "/daily/calendar":
+        return [DAYS]
+    if path == "/daily/rss":
+        return [PUBLIC]
+    if path.startswith("/links/"):
+        return [link_key(path.removeprefix("/links/"))]
+    if path.startswith("/links_by_tag/"):
+        return [tag_key(path.removeprefix("/links_by_tag/").strip())]
+    return None
+
+
+def link_keys(private: bool, date_created: datetime, tags: str | None, url_hashed: str) -> Set[str]:
+    """
+    the keys changed by the update of a link
+    """
+    day = date_created.astimezone(pytz.timezone(settings.SHARELINK_TZ)).date()
+    return {
+        ALL,
+        PRIVATE if private else PUBLIC,
+        TAGS,
+        day_key(day),
+        link_key(url_hashed),
+        *(tag_key(tag) for tag in split_tags(tags) or [UNTAGGED]),
+    }
+
+
+class Store(Protocol):
+    """
+    the methods of redis.asyncio.Redis used by the cache
+    """
+
+    async def mget(self, keys: List[str]) -> List[bytes | None]: ...
+
+    async def set(self, key: str, value: bytes, ex: int | None = None) -> object: ...
+
+    async def incr(self, key: str) -> int: ...
+
+
+class MemoryStore:
+    """
+    a store in the memory of the worker, the least recently used values go first
+
+    the counters, `counters` at most, are all forgotten at once when a new one
+    would go beyond: a counter created again then starts above all the values
+    they had, it never takes a value it had before
+    """
+
+    def __init__(self, size: int, counters: int | None = None) -> None:
+        self.size = size
+        self.counters = size * COUNTERS_PER_VALUE if counters is None else counters
+        # key -> expiry (monotonic time), value
+        self._values: OrderedDict[str, Tuple[float | None, bytes]] = OrderedDict()
+        self._counters: Dict[str, int] = {}
+        # the highest value of the counters forgotten
+        self._floor = 0
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def _get(self, key: str) -> bytes | None:
+        if key in self._counters:
+            return str(self._counters[key]).encode()
+        item = self._values.get(key)
+        if item is None:
+            return None
+        expiry, value = item
+        if expiry is not None and expiry <= time.monotonic():
+            del self._values[key]
+            return None
+        self._values.move_to_end(key)
+        return value
+
+    async def mget(self, keys: List[str]) -> List[bytes | None]:
+        return [self._get(key) for key in keys]
+
+    async def set(self, key: str, value: bytes, ex: int | None = None) -> bool:
+        self._values[key] = (time.monotonic() + ex if ex else None, value)
+        self._values.move_to_end(key)
+        while len(self._values) > self.size:
+            self._values.popitem(last=False)
+        return True
+
+    async def incr(self, key: str) -> int:
+        if key not in self._counters and len(self._counters) >= self.counters:
+            self._floor = max(self._floor, *self._counters.values())
+            self._counters.clear()
+        self._counters[key] = self._counters.get(key, self._floor) + 1
+        return self._counters[key]
+
+
+class CachedResponse(NamedTuple):
+    status_code: int
+    headers: List[Tuple[str, str]]
+    body: bytes
+
+
+class ResponseCache:
+    """
+    the rendered pages and the generations of the keys they depend on
+    """
+
+    def __init__(self, store: Store, ttl: int, prefix: str = "sharelink:") -> None:
+        self.store = store
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def _generation_keys(self, keys: Iterable[str]) -> List[str]:
+        return [f"{self.prefix}generation:{key}" for key in (EVERYTHING, *keys)]
+
+    async def get(self, name: str, keys: List[str]) -> Tuple[CachedResponse | None, List[int]]:
+        """
+        the cached page if it is still valid, and the current generations of its keys
+        """
+        generation_keys = self._generation_keys(keys)
+        value, *values = await self.store.mget([f"{self.prefix}page:{name}", *generation_keys])
+        # a key not written yet, or forgotten by the store, starts a new generation:
+        # it never matches the one of an older page
+        generations = [
+            int(generation) if generation is not None else await self.store.incr(key)
+            for key, generation in zip(generation_keys, values)
+        ]
+        if value is None:
+            return None, generations
+        data = json.loads(value)
+        if data["generations"] != generations:
+            return None, generations
+        response = CachedResponse(
+            data["status_code"],
+            [(key, header) for key, header in data["headers"]],
+            base64.b64decode(data["body"]),
+        )
+        return response, generations
+
+    async def set(self, name: str, response: CachedResponse, generations: List[int]) -> None:
+        """
+        keep a page rendered with these generations of its keys
+        """
+        data = {
+            "generations": generations,
+            "status_code": response.status_code,
+            "headers": response.headers,
+            "body": base64.b64encode(response.body).decode(),
+        }
+        await self.store.set(f"{self.prefix}page:{name}", json.dumps(data).encode(), ex=self.ttl)
+
+    async def invalidate(self, keys: Iterable[str]) -> None:
+        """
+        the pages depending on these keys are not valid anymore
+        """
+        for key in self._generation_keys(keys)[1:]:
+            await self.store.incr(key)
+
+    async def clear(self) -> None:
+        """
+        no page is valid anymore
+        """
+        await self.store.incr(self._generation_keys([])[0])
+
+
+_cache: ResponseCache | None = None
+
+
+def get_response_cache() -> ResponseCache | None:
+    """
+    the cache of the pages, None when it is disabled
+    """
+    global _cache
+    if _cache is None and settings.RESPONSE_CACHE_SIZE > 0:
+        if settings.RESPONSE_CACHE_URL:
+            # optional dependency, only needed to share the cache
+            from redis.asyncio import Redis
+
+            store: Store = Redis.from_url(settings.RESPONSE_CACHE_URL)
+        else:
+            store = MemoryStore(settings.RESPONSE_CACHE_SIZE)
+        _cache = ResponseCache(store, settings.RESPONSE_CACHE_TTL)
+    return _cache
+
+
+async def invalidate(keys: Iterable[str]) -> None:
+    """
+    invalidate the pages depending on the keys changed by a write
+    """
+    cache = get_response_cache()
+    if cache is not None:
+        await cache.invalidate(keys)
+
+
+async def clear() -> None:
+    """
+    invalidate all the pages, after an import
+    """
+    cache = get_response_cache()
+    if cache is not None:
+        await cache.clear()
+
+
+class ResponseCacheMiddleware(BaseHTTPMiddleware):
+    """
+    serve the cached pages, keep the ones rendered
+    """
+
+    async def dispatch(self, request: Request, call_next: RequestResponseEndpoint) -> Response:
+        cache = get_response_cache()
+        keys = page_keys(request) if request.method == "GET" else None
+        if cache is None or keys is None:
+            return await call_next(request)
+
+        # the day is part of the name: /daily changes at midnight
+        today = datetime.now(tz=pytz.timezone(settings.SHARELINK_TZ)).date()
+        url = request.url
+        name = f"{today.isoformat()}|{url.scheme}://{url.netloc}{url.path}?{url.query}"
+        cached, generations = await cache.get(name, keys)
+        if cached is not None:
+            response = Response(cached.body, cached.status_code, dict(cached.headers))
+            response.headers["X-Cache"] = "HIT"
+            return response
+
+        response = await call_next(request)
+        if response.status_code != 200 or "set-cookie" in response.headers:
+            return response
+        body = b"".join([chunk async for chunk in response.body_iterator])  # type: ignore
+        headers = [(key, value) for key, value in response.headers.items()]
+        await cache.set(name, CachedResponse(response.status_code, headers, body), generations)
+        response = Response(body, response.status_code, dict(headers))
+        response.headers["X-Cache"] = "MISS"
+        return response
@@ -0,0 +1,42 @@
+# coding: utf-8
+"""
+2024 - ShareLink - rows - 셰어 링크
+
+the lists of links only read the columns they display: the beginning of the
+text (text_excerpt) and its HTML, not the whole text. Each link is a LinkRow,
+a named tuple lighter than a Links object
+"""
+
+from datetime import datetime
+from typing import List, NamedTuple
+
+from tortoise.queryset import QuerySet
+
+from sharelink.models import Links
+
+
+class LinkRow(NamedTuple):
+    """
+    a link as displayed by the lists
+    """
+
+    id: int
+    url: str | None
+    url_hashed: str
+    title: str | None
+    text_excerpt: str | None
+    text_html: str | None
+    text_html_version: str | None
+    tags: str | None
+    private: bool
+    sticky: bool
+    image: str | None
+    video: str | None
+    date_created: datetime
+
+
+async def fetch_rows(query: QuerySet[Links]) -> List[LinkRow]:
+    """
+    the links of a query, with the columns of the lists only
+    """
+    return [LinkRow._make(row) for row in await query.values_list(*LinkRow._fields)]
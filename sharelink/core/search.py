@@ -0,0 +1,314 @@
+# coding: utf-8
+"""
+2024 - ShareLink - search - 셰어 링크
+
+full-text search over the title, the text, the URL and the tags of the links.
+With SQLite, the links are indexed by a FTS5 table kept up to date by triggers,
+so the links added by any mean (form, import...) are found.
+The other databases use an index in memory in each worker, built on the first
+search, then brought up to date before each search by the changes of the links
+written since, by any worker or the CLI, see sharelink.core.changes.
+The results are ordered by relevance (bm25, the lower the better) then by id,
+the next page is given by the cursor of the last result. Ranking all the links
+matching a common word costs too much, beyond SEARCH_RANKED_LIMIT results the
+newest links come first
+"""
+
+import base64
+import math
+import re
+import threading
+import unicodedata
+from collections import Counter, defaultdict
+from typing import Annotated, Dict, List, Set, Tuple
+
+from pydantic import AfterValidator
+from tortoise import connections
+from tortoise.backends.base.client import BaseDBAsyncClient
+
+from sharelink.config import settings
+from sharelink.core.changes import last_seq
+from sharelink.core.pagination import Page
+from sharelink.models import Changes, Links
+
+# the indexed columns and their weight in the relevance
+COLUMNS = {"title": 10.0, "text": 1.0, "url": 2.0, "tags": 5.0}
+
+# the FTS5 table, its content is read from the links table
+FTS_SQL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS links_fts USING fts5("
+    "title, text, url, tags, content='links', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS links_fts_insert AFTER INSERT ON links BEGIN "
+    "INSERT INTO links_fts(rowid, title, text, url, tags) "
+    "VALUES (new.id, new.title, new.text, new.url, new.tags); END",
+    "CREATE TRIGGER IF NOT EXISTS links_fts_delete AFTER DELETE ON links BEGIN "
+    "INSERT INTO links_fts(links_fts, rowid, title, text, url, tags) "
+    "VALUES ('delete', old.id, old.title, old.text, old.url, old.tags); END",
+    "CREATE TRIGGER IF NOT EXISTS links_fts_update AFTER UPDATE OF title, text, url, tags "
+    "ON links BEGIN "
+    "INSERT INTO links_fts(links_fts, rowid, title, text, url, tags) "
+    "VALUES ('delete', old.id, old.title, old.text, old.url, old.tags); "
+    "INSERT INTO links_fts(rowid, title, text, url, tags) "
+    "VALUES (new.id, new.title, new.text, new.url, new.tags); END",
+]
+
+WORD_RE = re.compile(r"\w+")
+
+
+def words(text: str | None) -> List[str]:
+    """
+    the words of a text, lower case and without diacritics, as the FTS5 tokenizer does
+    """
+    if not text:
+        return []
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return WORD_RE.findall(text)
+
+
+def match_query(q: str) -> str:
+    """
+    the FTS5 query finding the links having all the words of q
+    """
+    return " ".join(f'"{word}"' for word in words(q))
+
+
+def encode_cursor(rank: float, link_id: int) -> str:
+    """
+    the cursor of the position of a result
+    """
+    return base64.urlsafe_b64encode(f"{rank!r},{link_id}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[float, int]:
+    """
+    the rank and the id of a cursor
+    raises ValueError when the cursor is not valid
+    """
+    try:
+        value = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        rank, _, link_id = value.partition(",")
+        return float(rank), int(link_id)
+    except (UnicodeDecodeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor {cursor!r}") from e
+
+
+def check_cursor(cursor: str | None) -> str | None:
+    """
+    validate a cursor given as parameter
+    """
+    if cursor:
+        decode_cursor(cursor)
+    return cursor
+
+
+# a query parameter holding the cursor of a result
+Cursor = Annotated[str | None, AfterValidator(check_cursor)]
+
+
+class SearchIndex:
+    """
+    an inverted index of the links in memory, ranked by bm25 like FTS5
+    """
+
+    k1 = 1.2
+    b = 0.75
+
+    def __init__(self) -> None:
+        # word -> link id -> weighted number of occurrences
+        self._postings: Dict[str, Dict[int, float]] = defaultdict(dict)
+        # link id -> its words, and its weighted length
+        self._words: Dict[int, Set[str]] = {}
+        self._lengths: Dict[int, float] = {}
+        self._lock = threading.Lock()
+        self.loaded = False
+        # the seq of the last change of the links indexed
+        self.seq = 0
+
+    def __len__(self) -> int:
+        return len(self._words)
+
+    def add(self, link_id: int, **columns: str | None) -> None:
+        """
+        index (again) the columns of a link
+        """
+        frequencies: Dict[str, float] = Counter()
+        for column, weight in COLUMNS.items():
+            for word in words(columns.get(column)):
+                frequencies[word] += weight
+        with self._lock:
+            self._remove(link_id)
+            for word, frequency in frequencies.items():
+                self._postings[word][link_id] = frequency
+            self._words[link_id] = set(frequencies)
+            self._lengths[link_id] = sum(frequencies.values())
+
+    def remove(self, link_id: int) -> None:
+        """
+        forget a deleted link
+        """
+        with self._lock:
+            self._remove(link_id)
+
+    def _remove(self, link_id: int) -> None:
+        for word in self._words.pop(link_id, ()):
+            postings = self._postings[word]
+            postings.pop(link_id, None)
+            if not postings:
+                del self._postings[word]
+        self._lengths.pop(link_id, None)
+
+    def search(self, q: str, ranked: int | None = None) -> List[Tuple[float, int]]:
+        """
+        the rank and the id of the links having all the words of q, the most relevant first
+        ranked: beyond this number of links, the newest first, with -id as rank
+        """
+        query_words = set(words(q))
+        with self._lock:
+            postings = [self._postings.get(word, {}) for word in query_words]
+            if not postings or not all(postings):
+                return []
+            links = set.intersection(*(set(p) for p in postings))
+            if ranked is not None and len(links) > ranked:
+                return sorted((-link_id, link_id) for link_id in links)
+            count = len(self._lengths)
+            average = sum(self._lengths.values()) / count
+            results = []
+            for link_id in links:
+                score = 0.0
+                for p in postings:
+                    idf = math.log((count - len(p) + 0.5) / (len(p) + 0.5) + 1)
+                    frequency = p[link_id]
+                    norm = 1 - self.b + self.b * self._lengths[link_id] / average
+                    score += idf * frequency * (self.k1 + 1) / (frequency + self.k1 * norm)
+                results.append((-score, link_id))
+        return sorted(results)
+
+
+fallback_index = SearchIndex()
+
+
+def is_sqlite(connection: BaseDBAsyncClient) -> bool:
+    """
+    whether the links are indexed by the FTS5 table
+    """
+    return connection.capabilities.dialect == "sqlite"
+
+
+async def create_search_index(connection: BaseDBAsyncClient) -> None:
+    """
+    create the FTS5 table and its triggers, then index the existing links
+    """
+    if not is_sqlite(connection):
+        return
+    for sql in FTS_SQL:
+        await connection.execute_script(sql)
+    await connection.execute_script("INSERT INTO links_fts(links_fts) VALUES ('rebuild')")
+
+
+async def load_fallback_index(batch_size: int = 1000) -> None:
+    """
+    index all the links in memory
+    """
+    # the links changed while they are read are indexed again by the next search
+    fallback_index.seq = await last_seq()
+    last_id = 0
+    while True:
+        links = (
+            await Links.filter(id__gt=last_id)
+            .order_by("id")
+            .limit(batch_size)
+            .values_list("id", *COLUMNS)
+        )
+        if not links:
+            break
+        for link_id, *values in links:
+            fallback_index.add(link_id, **dict(zip(COLUMNS, values)))
+        last_id = links[-1][0]
+    fallback_index.loaded = True
+
+
+async def update_fallback_index(batch_size: int = 1000) -> None:
+    """
+    index the links changed since the last search, or forget them when deleted
+    """
+    while changes := (
+        await Changes.filter(seq__gt=fallback_index.seq)
+        .order_by("seq")
+        .limit(batch_size)
+        .values_list("seq", "link_id")
+    ):
+        ids = {link_id for _, link_id in changes}
+        links = await Links.filter(id__in=ids).values_list("id", *COLUMNS)
+        for link_id in ids - {link_id for link_id, *_ in links}:
+            fallback_index.remove(link_id)
+        for link_id, *values in links:
+            fallback_index.add(link_id, **dict(zip(COLUMNS, values)))
+        fallback_index.seq = changes[-1][0]
+
+
+async def search_ids(
+    q: str, limit: int, after: str | None = None
+) -> Tuple[List[Tuple[float, int]], int]:
+    """
+    the rank and the id of the links of a page of results, and the number of results
+    """
+    connection = connections.get("default")
+    if not is_sqlite(connection):
+        if not fallback_index.loaded:
+            await load_fallback_index()
+        else:
+            await update_fallback_index()
+        results = fallback_index.search(q, ranked=settings.SEARCH_RANKED_LIMIT)
+        count = len(results)
+        if after:
+            position = decode_cursor(after)
+            results = [result for result in results if result > position]
+        return results[: limit + 1], count
+
+    match = match_query(q)
+    if not match:
+        return [], 0
+    _, rows = await connection.execute_query(
+        "SELECT COUNT(*) AS count FROM links_fts WHERE links_fts MATCH ?", [match]
+    )
+    count = rows[0]["count"]
+    position = decode_cursor(after) if after else None
+
+    if count > settings.SEARCH_RANKED_LIMIT:
+        # too many results to rank them all: the newest first, with -id as rank
+        sql = "SELECT -rowid AS rank, rowid AS id FROM links_fts WHERE links_fts MATCH ?"
+        params: list = [match]
+        if position:
+            sql += " AND rowid < ?"
+            params.append(-position[0])
+        sql += " ORDER BY rowid DESC LIMIT ?"
+    else:
+        weights = ", ".join(str(weight) for weight in COLUMNS.values())
+        sql = (
+            f"SELECT rowid AS id, bm25(links_fts, {weights}) AS rank "
+            "FROM links_fts WHERE links_fts MATCH ?"
+        )
+        params = [match]
+        if position:
+            sql = f"SELECT * FROM ({sql}) WHERE rank > ? OR (rank = ? AND id > ?)"
+            params += [position[0], position[0], position[1]]
+        sql += " ORDER BY rank, id LIMIT ?"
+    _, rows = await connection.execute_query(sql, [*params, limit + 1])
+    return [(row["rank"], row["id"]) for row in rows], count
+
+
+async def search_links(q: str, limit: int = 10, after: str | None = None) -> Tuple[Page, int]:
+    """
+    the links of a page of results, the most relevant first, and the number of results
+    after: the cursor of the last result of the previous page
+    """
+    results, count = await search_ids(q, limit, after)
+    has_next = len(results) > limit
+    results = results[:limit]
+    links = await Links.in_bulk([link_id for _, link_id in results], "id")
+    page = Page(links[link_id] for _, link_id in results if link_id in links)
+    if has_next:
+        page.next_cursor = encode_cursor(*results[-1])
+    return page, count
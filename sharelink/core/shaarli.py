@@ -3,98 +3,331 @@
 2024 - ShareLink - 셰어 링크
 """
 
+import asyncio
 import html
+import multiprocessing
+import queue
 import re
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime, timezone
+from itertools import chain
+from typing import AsyncIterable, AsyncIterator, Callable, Dict, Iterable, Iterator
 
-from sqlmodel import Session, create_engine, select
+from tortoise.transactions import in_transaction
 
 from sharelink.config import settings
-from sharelink.core.hashed_urls import small_hash
+from sharelink.core import response_cache
+from sharelink.core.bulk import free_hashes, insert_links
+from sharelink.core.hashed_urls import allocator, small_hash_sync
+from sharelink.core.metadata import enrich_later
+from sharelink.forms import MAX_LENGTH, TAG_LENGTH
 from sharelink.models import Links
 
-engine = create_engine(settings.DATABASE_URL)
+NETSCAPE_HEADER = "<!DOCTYPE NETSCAPE-Bookmark-file-1>"
 
+# number of links inserted at once
+BATCH_SIZE = 1000
 
-async def import_shaarli(the_file: str) -> None:
+# number of batches of links a worker parses ahead of the writer
+PARSED_BATCHES = 2
+
+LINK_RE = re.compile(r"<A (.*?)>(.*?)</A>", re.DOTALL)
+ATTR_RE = re.compile(r'([A-Z_]+)="([^"]*)"')
+
+
+def iter_entries(lines: Iterable[str]) -> Iterator[str]:
+    """
+    split the content of a Netscape bookmark file on <DT>,
+    without reading the whole file: only the current entry is kept in memory
+    """
+    pending: list[str] = []
+    for line in lines:
+        if "<DT>" not in line:
+            pending.append(line)
+            continue
+        first, *others = line.split("<DT>")
+        pending.append(first)
+        yield "".join(pending)
+        yield from others[:-1]
+        pending = [others[-1]]
+    yield "".join(pending)
+
+
+def parse_entry(html_article: str) -> dict | None:
+    """
+    get the data of the link of one <DT> entry of a Netscape bookmark file
+    returns None when the entry has no URL
+    """
+    link: dict = {
+        "url": "",
+        "title": "",
+        "text": "",
+        "tags": "",
+        "image": None,
+        "video": None,
+        "private": False,
+        "date_created": None,
+    }
+    line, _, text = html_article.partition("<DD>")
+    if text:
+        link["text"] = html.unescape(text.split("</DL>")[0].rstrip())
+
+    matches = LINK_RE.match(line)
+    if not matches:
+        return None
+
+    link["title"] = html.unescape(matches.group(2))
+
+    for attr_found, value_found in ATTR_RE.findall(matches.group(1)):
+        if attr_found == "HREF":
+            link["url"] = html.unescape(value_found)
+        elif attr_found == "ADD_DATE":
+            raw_add_date = float(value_found)
+            if raw_add_date > 30000000000:
+                raw_add_date /= 1000
+            link["date_created"] = datetime.fromtimestamp(raw_add_date, tz=timezone.utc)
+        elif attr_found == "PRIVATE":
+            link["private"] = value_found != "0"
+        elif attr_found == "TAGS":
+            link["tags"] = html.unescape(value_found)
+
+    if not link["url"]:
+        return None
+
+    if link["date_created"] is None:
+        link["date_created"] = datetime.now(tz=timezone.utc)
+
+    return link
+
+
+def iter_links(lines: Iterable[str]) -> Iterator[dict]:
+    """
+    generator of the links of a Netscape bookmark file
+    """
+    entries = iter_entries(lines)
+    # the header of the file
+    next(entries, None)
+    for html_article in entries:
+        link = parse_entry(html_article)
+        if link:
+            yield link
+
+
+async def aiter_links(links: Iterable[dict] | AsyncIterable[dict]) -> AsyncIterator[dict]:
+    """
+    iterate over the links, whether they are produced synchronously or not
+    """
+    if isinstance(links, AsyncIterable):
+        async for link in links:
+            yield link
+    else:
+        for link in links:
+            yield link
+
+
+async def import_links(
+    links: Iterable[dict] | AsyncIterable[dict],
+    batch_size: int = BATCH_SIZE,
+    progress: Callable[[int, int], None] | None = None,
+    skipped: Callable[[dict], None] | None = None,
+) -> int:
+    """
+    insert the links that do not exist yet, by batch, in one transaction
+
+    links: the data produced by iter_links() or parse_file()
+    progress: called after each batch with the number of links read and added
+    skipped: called with each link not imported, its URL, its tags or one of
+    them being too long to be stored; a title too long is cut
+    returns the number of added links
+    """
+    existing_urls = set(await Links.all().values_list("url", flat=True))
+    if not allocator.loaded:
+        allocator.load(await Links.all().values_list("url_hashed", flat=True))
+
+    read = added = 0
+    batch: list[Links] = []
+    texts: list[str] = []
+    hashes: list[str] = []
+    now = datetime.now(tz=timezone.utc)
+    try:
+        async with in_transaction() as connection:
+
+            async def insert(batch: list[Links]) -> None:
+                # the small hashes taken by another process get the next ones
+                free = await free_hashes(texts, [link.url_hashed for link in batch], connection)
+                hashes.extend(free)
+                for link, url_hashed in zip(batch, free):
+                    link.url_hashed = url_hashed
+                await insert_links(batch, connection)
+                # run by the app once the import is committed, one fetch per link:
+                # the bookmarks keep their text, only the ones without title are filled
+                if settings.METADATA_IMPORT:
+                    await enrich_later(batch, connection, untitled=True)
+
+            async for link in aiter_links(links):
+                read += 1
+                # if the url does not already exist add it
+                if link["url"] in existing_urls:
+                    continue
+                tags = link["tags"] or ""
+                if (
+                    len(link["url"]) > MAX_LENGTH
+                    or len(tags) > MAX_LENGTH
+                    or any(len(tag.strip()) > TAG_LENGTH for tag in tags.split(","))
+                ):
+                    if skipped:
+                        skipped(link)
+                    continue
+                existing_urls.add(link["url"])
+                link["title"] = link["title"][:MAX_LENGTH]
+
+                to_hash = link["date_created"].strftime("%Y%m%d_%H%M%S")
+                texts.append(to_hash)
+                link.update(
+                    url_hashed=allocator.allocate(to_hash, link.get("url_hashed")),
+                    sticky=False,
+                    date_modified=now,
+                )
+                # the fields missing from the file, as the rendered text, are left empty
+                batch.append(Links(**link))
+
+                if len(batch) >= batch_size:
+                    await insert(batch)
+                    added += len(batch)
+                    batch, texts = [], []
+                    if progress:
+                        progress(read, added)
+
+            if batch:
+                await insert(batch)
+                added += len(batch)
+    except Exception:
+        # the hashes of the links not imported
+        for url_hashed in chain(hashes, (link.url_hashed for link in batch)):
+            allocator.release(url_hashed)
+        raise
+    if added:
+        await response_cache.clear()
+    if progress:
+        progress(read, added)
+    return added
+
+
+async def import_shaarli(
+    the_file: str,
+    batch_size: int = BATCH_SIZE,
+    progress: Callable[[int, int], None] | None = None,
+    skipped: Callable[[dict], None] | None = None,
+) -> int:
     """
     the_file: name of the file to import
+    returns the number of added links
     """
-    private = 0
-    date_created: datetime
     with open(the_file, "r", encoding="utf-8") as f:
-        data = f.read()
-
-    if data.startswith("<!DOCTYPE NETSCAPE-Bookmark-file-1>"):
-        i = 0
-
-        for html_article in data.split("<DT>"):
-            i += 1
-            link = {
-                "url": "",
-                "title": "",
-                "text": "",
-                "tags": "",
-                "image": None,
-                "video": None,
-                "private": False,
-            }
-            if i == 1:
-                continue
-
-            if len(html_article.split("<DD>")) == 2:
-                line, text = html_article.split("<DD>")
-                link["text"] = html.unescape(text)
-
-            for line in html_article.split("<DD>"):
-                if line.startswith("<A "):
-                    matches = re.match(r"<A (.*?)>(.*?)</A>", line)
-                    if matches:
-                        attrs = matches.group(1)
-
-                        link["title"] = matches.group(2) if matches.group(2) else ""
-                        link["title"] = html.unescape(str(link["title"]))
-
-                    for attr in attrs.split(" "):
-                        matches = re.match(r'([A-Z_]+)="(.+)"', attr)
-                        attr_found = matches.group(1) if matches else ""
-                        value_found = matches.group(2) if matches else ""
-                        if attr_found == "HREF":
-                            link["url"] = html.unescape(value_found)
-                        elif attr_found == "ADD_DATE":
-                            raw_add_date = float(value_found)
-                            if raw_add_date > 30000000000:
-                                raw_add_date /= 1000
-                            date_created = datetime.fromtimestamp(raw_add_date).replace(
-                                tzinfo=timezone.utc
-                            )
-                        elif attr == "PRIVATE":
-                            link["private"] = False if value_found == "0" else True
-                        elif attr == "TAGS":
-                            link["tags"] = value_found
-
-                    if link["url"] != "" and link["url"]:
-                        if private:
-                            link["private"] = True
-
-                        with Session(engine) as session:
-                            # check if the URL already exists
-                            statement = select(Links).where(Links.url == link["url"])
-                            my_link = session.exec(statement).first()
-                            to_hash = date_created.strftime("%Y%m%d_%H%M%S")
-                            url_hashed = await small_hash(to_hash)
-                            # if the url does not already exist add it
-                            if not my_link:
-                                link_to_add = Links(
-                                    url=link["url"],
-                                    title=str(link["title"]),
-                                    text=str(link["text"]),
-                                    tags=str(link["tags"]),
-                                    private=bool(private),
-                                    date_created=date_created,
-                                    image=str(link["image"]),
-                                    video=str(link["video"]),
-                                    url_hashed=url_hashed,
-                                )
-                                session.add(link_to_add)
-                                session.commit()
+        first_line = f.readline()
+        if not first_line.startswith(NETSCAPE_HEADER):
+            return 0
+        links = iter_links(chain([first_line], f))
+        return await import_links(links, batch_size=batch_size, progress=progress, skipped=skipped)
+
+
+def parse_file(
+    the_file: str,
+    batches: "queue.Queue[list[dict] | None]",
+    batch_size: int = BATCH_SIZE,
+    stop: threading.Event | None = None,
+) -> None:
+    """
+    parse a Netscape bookmark file, in a worker process, giving its links to the
+    writer by batches, PARSED_BATCHES at most ahead of it, then None
+    the small hashes are computed there too, the writer only checks they are free
+    stop: set when the writer does not want the links anymore
+    """
+    try:
+        with open(the_file, "r", encoding="utf-8") as f:
+            first_line = f.readline()
+            if not first_line.startswith(NETSCAPE_HEADER):
+                return
+            batch = []
+            for link in iter_links(chain([first_line], f)):
+                link["url_hashed"] = small_hash_sync(link["date_created"].strftime("%Y%m%d_%H%M%S"))
+                batch.append(link)
+                if len(batch) >= batch_size:
+                    if stop is not None and stop.is_set():
+                        return
+                    batches.put(batch)
+                    batch = []
+            if batch:
+                batches.put(batch)
+    finally:
+        batches.put(None)
+
+
+async def import_shaarli_files(
+    files: list[str],
+    workers: int | None = None,
+    batch_size: int = BATCH_SIZE,
+    progress: Callable[[int, int], None] | None = None,
+    skipped: Callable[[dict], None] | None = None,
+) -> int:
+    """
+    files: names of the files to import
+    workers: number of processes parsing the files, one per CPU by default
+
+    the files are parsed in parallel, each one by a worker process, while a single
+    writer inserts the links of the batches as soon as a worker gives them: when
+    an URL is found in several files, the first one read wins. A single file is
+    read by the writer itself
+    returns the number of added links
+    """
+    if len(files) == 1:
+        return await import_shaarli(
+            files[0], batch_size=batch_size, progress=progress, skipped=skipped
+        )
+    loop = asyncio.get_running_loop()
+    with (
+        ProcessPoolExecutor(max_workers=workers) as pool,
+        multiprocessing.Manager() as manager,
+        # a thread waiting for the next batch of each file
+        ThreadPoolExecutor(max_workers=len(files)) as readers,
+    ):
+        stop = manager.Event()
+        queues = [manager.Queue(PARSED_BATCHES) for _ in files]
+        parsed_files = [
+            loop.run_in_executor(pool, parse_file, the_file, batches, batch_size, stop)
+            for the_file, batches in zip(files, queues)
+        ]
+        # the next batch of each file not read until its end
+        reading: Dict[int, asyncio.Future] = {}
+
+        def read(index: int) -> None:
+            reading[index] = loop.run_in_executor(readers, queues[index].get)
+
+        async def parsed_links() -> AsyncIterator[dict]:
+            for index in range(len(files)):
+                read(index)
+            while reading:
+                ready, _ = await asyncio.wait(reading.values(), return_when=asyncio.FIRST_COMPLETED)
+                for index in [index for index, batch in reading.items() if batch in ready]:
+                    batch = reading.pop(index).result()
+                    if batch is None:
+                        # the error of the worker, if any
+                        await parsed_files[index]
+                        continue
+                    read(index)
+                    for link in batch:
+                        yield link
+
+        try:
+            return await import_links(
+                parsed_links(), batch_size=batch_size, progress=progress, skipped=skipped
+            )
+        except Exception:
+            # the workers stop once their last batch is taken
+            stop.set()
+            for index, batch in reading.items():
+                while await batch is not None:
+                    batch = loop.run_in_executor(readers, queues[index].get)
+            await asyncio.gather(*parsed_files, return_exceptions=True)
+            raise
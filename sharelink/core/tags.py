@@ -0,0 +1,142 @@
+# coding: utf-8
+"""
+2024 - ShareLink - tags - 셰어 링크
+
+the tags of a link are kept as typed in Links.tags, and in the Tags/LinksTags
+tables to find the links of a tag with an index
+a link without tag gets the 0Tag one
+
+Tags.count is the number of links of each tag, kept up to date when the tags of
+a link change, so the tags cloud does not have to read the links
+"""
+
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Tuple
+
+from tortoise import connections
+from tortoise.backends.base.client import BaseDBAsyncClient
+from tortoise.expressions import F
+from tortoise.transactions import in_transaction
+
+from sharelink.models import Links, LinksTags, Tags
+
+# number of links handled at once by the backfill
+BATCH_SIZE = 1000
+
+# the tag of the links without tag
+UNTAGGED = "0Tag"
+
+
+def split_tags(tags: str | None) -> List[str]:
+    """
+    the tags of the comma separated string, without duplicate nor empty ones
+    """
+    if not tags:
+        return []
+    return list(dict.fromkeys(tag.strip() for tag in tags.split(",") if tag.strip()))
+
+
+async def get_tags_ids(names: Iterable[str], using_db: BaseDBAsyncClient | None = None) -> dict:
+    """
+    the ids of the tags, created when they do not exist yet
+    """
+    names = set(names)
+    if not names:
+        return {}
+    tags = dict(await Tags.filter(name__in=names).using_db(using_db).values_list("name", "id"))
+    missing = names - tags.keys()
+    if missing:
+        await Tags.bulk_create(
+            [Tags(name=name) for name in missing], ignore_conflicts=True, using_db=using_db
+        )
+        tags.update(
+            await Tags.filter(name__in=missing).using_db(using_db).values_list("name", "id")
+        )
+    return tags
+
+
+async def add_links_tags(
+    links: Iterable[Tuple[int, str | None]], using_db: BaseDBAsyncClient | None = None
+) -> None:
+    """
+    link the tags to their links
+    links: the id and the tags of each link
+    """
+    links_tags = [(link_id, split_tags(tags) or [UNTAGGED]) for link_id, tags in links]
+    tags = await get_tags_ids((name for _, names in links_tags for name in names), using_db)
+    rows = [
+        LinksTags(link_id=link_id, tag_id=tags[name])
+        for link_id, names in links_tags
+        for name in names
+    ]
+    await LinksTags.bulk_create(rows, ignore_conflicts=True, using_db=using_db)
+    await update_count(Counter(row.tag_id for row in rows), using_db)
+
+
+async def remove_links_tags(link_ids: List[int], using_db: BaseDBAsyncClient | None = None) -> None:
+    """
+    unlink the tags of links, before they are deleted or their tags are changed
+    """
+    tag_ids = (
+        await LinksTags.filter(link_id__in=link_ids)
+        .using_db(using_db)
+        .values_list("tag_id", flat=True)
+    )
+    await LinksTags.filter(link_id__in=link_ids).using_db(using_db).delete()
+    await update_count({tag_id: -count for tag_id, count in Counter(tag_ids).items()}, using_db)
+
+
+async def update_count(deltas: Dict[int, int], using_db: BaseDBAsyncClient | None = None) -> None:
+    """
+    add to the number of links of each tag
+    deltas: the number of links added (or removed when negative) by tag id
+    """
+    # one query for all the tags changing by the same number
+    tag_ids = defaultdict(list)
+    for tag_id, delta in deltas.items():
+        if delta:
+            tag_ids[delta].append(tag_id)
+    for delta, ids in tag_ids.items():
+        await Tags.filter(id__in=ids).using_db(using_db).update(count=F("count") + delta)
+
+
+async def count_tags(using_db: BaseDBAsyncClient | None = None) -> None:
+    """
+    compute again the number of links of all the tags
+    """
+    connection = using_db or connections.get("default")
+    await connection.execute_script(
+        "UPDATE tags SET count = (SELECT COUNT(*) FROM links_tags WHERE tag_id = tags.id)"
+    )
+
+
+async def get_tags_count() -> Dict[str, int]:
+    """
+    the number of links of each used tag, ordered by name
+    """
+    return dict(await Tags.filter(count__gt=0).order_by("name").values_list("name", "count"))
+
+
+async def backfill_tags(batch_size: int = BATCH_SIZE) -> int:
+    """
+    rebuild the tags of all the links from Links.tags, and their number of links
+    returns the number of links
+    """
+    # the pages never see the links without their tags
+    async with in_transaction() as connection:
+        await LinksTags.all().using_db(connection).delete()
+        await Tags.all().using_db(connection).delete()
+        last_id = count = 0
+        while True:
+            links = (
+                await Links.filter(id__gt=last_id)
+                .using_db(connection)
+                .order_by("id")
+                .limit(batch_size)
+                .values_list("id", "tags")
+            )
+            if not links:
+                return count
+            await add_links_tags(links, connection)
+            last_id = links[-1][0]
+            count += len(links)
@@ -5,7 +5,13 @@
 
 from datetime import datetime
 
-import markdown
+import pytz
+
+from sharelink.config import settings
+from sharelink.core.render import link_html, render_markdown
+from sharelink.core.rows import LinkRow
+from sharelink.core.tags import split_tags
+from sharelink.models import Links
 
 # template filters
 
@@ -14,11 +20,27 @@ def filter_markdown(text: str) -> str:
     """
     convert Markdown
     """
-    return markdown.markdown(text, extensions=["fenced_code", "codehilite", "footnotes", "tables"])
+    return render_markdown(text)
+
+
+def filter_link_html(link: Links | LinkRow) -> str:
+    """
+    the HTML of the beginning of the text of a link, rendered when it was saved
+    """
+    return link_html(link)
+
+
+def filter_split_tags(tags: str | None) -> list[str]:
+    """
+    the tags of a link, as they are stored in the Tags table
+    """
+    return split_tags(tags)
 
 
 def filter_datetime(my_date: str, fmt: str = "%Y-%m-%d") -> str:
     """
-    return a date from a string, formated as expected
+    return a date from a string, formated as expected, in the timezone of the app
     """
+    if isinstance(my_date, datetime) and my_date.tzinfo:
+        my_date = my_date.astimezone(pytz.timezone(settings.SHARELINK_TZ))  # type: ignore
     return datetime.strftime(my_date, fmt)  # type: ignore
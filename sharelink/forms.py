@@ -0,0 +1,61 @@
+# coding: utf-8
+"""
+2024 - ShareLink - forms - 셰어 링크
+"""
+
+from typing import Annotated
+
+from pydantic import BaseModel, Field, HttpUrl, field_validator, model_validator
+
+# the length of the columns of the links, and of the names of the tags
+MAX_LENGTH = 255
+TAG_LENGTH = 100
+
+
+class LinksForm(BaseModel):
+    """
+    Form to create or update a link/note
+    """
+
+    url: HttpUrl | None = None
+    title: Annotated[str, Field(max_length=MAX_LENGTH)] = ""
+    text: str = ""
+    tags: Annotated[str, Field(max_length=MAX_LENGTH)] = ""
+    private: bool = False
+    sticky: bool = False
+    image: HttpUrl | None = None
+    video: HttpUrl | None = None
+
+    @field_validator("url", "image", "video", mode="before")
+    @classmethod
+    def empty_url(cls, value: object) -> object:
+        """
+        an empty field of the form is no URL at all
+        """
+        return value or None
+
+    @field_validator("url", "image", "video")
+    @classmethod
+    def url_length(cls, value: HttpUrl | None) -> HttpUrl | None:
+        """
+        the URL is stored as it is normalized
+        """
+        if value is not None and len(str(value)) > MAX_LENGTH:
+            raise ValueError(f"URL should have at most {MAX_LENGTH} characters")
+        return value
+
+    @field_validator("tags")
+    @classmethod
+    def tag_length(cls, value: str) -> str:
+        if any(len(tag.strip()) > TAG_LENGTH for tag in value.split(",")):
+            raise ValueError(f"Tags should have at most {TAG_LENGTH} characters each")
+        return value
+
+    @model_validator(mode="after")
+    def url_or_text(self) -> "LinksForm":
+        """
+        a link needs an URL, a note needs a text
+        """
+        if not self.url and not self.text.strip():
+            raise ValueError("Fill the URL to share a link or the text to share a note")
+        return self
@@ -3,6 +3,9 @@
 2024 - ShareLink - 셰어 링크
 """
 
+from contextlib import asynccontextmanager
+from typing import AsyncGenerator
+
 from fastapi import FastAPI, Request
 from fastapi.exceptions import HTTPException
 from fastapi.middleware.cors import CORSMiddleware
@@ -14,30 +17,72 @@ from fastapi_csrf_protect.exceptions import CsrfProtectError
 from starlette.middleware.sessions import SessionMiddleware
 from starlette.templating import _TemplateResponse
 
-from sharelink.config import settings
+from sharelink.config import register_orm, settings
+from sharelink.core.http_cache import HttpCacheMiddleware
+from sharelink.core.jobs import make_queue
+from sharelink.core.metadata import close_fetcher
+from sharelink.core.migrations import migrate
+from sharelink.core.response_cache import ResponseCacheMiddleware
 from sharelink.router import (
+    api as api_router,
+    export as export_router,
     feeds as feeds_router,
     links as links_router,
     links_daily,
     links_priv_pub,
+    search as search_router,
+    status as status_router,
     tags as tags_router,
 )
 
 # APP
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
+    """
+    connect to the database and start the workers when the app starts, stop them when it stops
+    """
+    async with register_orm(app):
+        await migrate()
+        # the workers of the jobs following the writes
+        queue = make_queue()
+        queue.start()
+        yield
+        await queue.stop()
+        await close_fetcher()
+
+
+app = FastAPI(lifespan=lifespan)
 
 # A.1 ROUTER for each part of the APP
 
+app.include_router(api_router.router)
+app.include_router(export_router.router)
 app.include_router(feeds_router.router)
 app.include_router(links_router.router)
 app.include_router(links_daily.router)
 app.include_router(links_priv_pub.router)
+app.include_router(search_router.router)
+app.include_router(status_router.router)
 app.include_router(tags_router.router)
 
 
 templates = Jinja2Templates(directory="templates")
 
+# C - CACHE
+
+# the middlewares added first run last: the cached pages are served, and the
+# pages not modified answered, once the host is trusted and CORS is applied
+
+# the pages rendered are kept until a link changes
+
+app.add_middleware(ResponseCacheMiddleware)
+
+# the pages not modified since the browser got them are answered 304, before the cache
+
+app.add_middleware(HttpCacheMiddleware)
+
 # SECURITY
 
 # B.1 - CORS + TrustedHost
@@ -92,21 +137,3 @@ async def internal_error_exception_handler(
     return templates.TemplateResponse(
         "500.html", {"request": request, "settings": settings}, status_code=500
     )
-
-
-@asynccontextmanager
-async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
-    if getattr(app.state, "testing", None):
-        async with lifespan_test(app) as _:
-            yield
-    else:
-        # app startup
-        async with register_orm(app):
-            # db connected
-            yield
-            # app teardown
-        # db connections closed
-
-
-app = FastAPI(title="Tortoise ORM FastAPI example", lifespan=lifespan)
-app.include_router(users_router, prefix="")
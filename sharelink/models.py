@@ -1,20 +1,138 @@
+# coding: utf-8
+"""
+2024 - ShareLink - models - 셰어 링크
+"""
+
 from tortoise import fields, models
 
 
 class Links(models.Model):
     """
-    The User model
+    The Links model
     """
 
     id = fields.IntField(primary_key=True)
-    url = fields.CharField(max_length=20, unique=True)
-    url_hashed = fields.CharField(max_length=20, unique=True)
-    title = fields.CharField(max_length=50, null=True)
-    text = fields.CharField(max_length=50, null=True)
-    tags = fields.CharField(max_length=30, null=True)
+    url = fields.CharField(max_length=255, unique=True, null=True)
+    url_hashed = fields.CharField(max_length=10, unique=True)
+    title = fields.CharField(max_length=255, null=True)
+    text = fields.TextField(null=True)
+    # the beginning of the text and its HTML, see sharelink.core.render
+    text_excerpt = fields.TextField(null=True)
+    text_html = fields.TextField(null=True)
+    text_html_version = fields.CharField(max_length=50, null=True)
+    # the items of the link in the feeds, see sharelink.core.feeds
+    feed_rss = fields.TextField(null=True)
+    feed_atom = fields.TextField(null=True)
+    feed_version = fields.CharField(max_length=50, null=True)
+    tags = fields.CharField(max_length=255, null=True)
     private = fields.BooleanField(default=False)
     sticky = fields.BooleanField(default=False)
-    image = fields.CharField(max_length=20, null=True)
-    video = fields.CharField(max_length=20, null=True)
-    created_at = fields.DatetimeField(auto_now_add=True)
-    modified_at = fields.DatetimeField(auto_now=True)
+    image = fields.CharField(max_length=255, null=True)
+    video = fields.CharField(max_length=255, null=True)
+    date_created = fields.DatetimeField(auto_now_add=True, db_index=True)
+    date_modified = fields.DatetimeField(auto_now=True)
+
+    class Meta:
+        # the lists of links filter on private and are ordered by date_created
+        indexes = (("private", "date_created"),)
+
+
+class Tags(models.Model):
+    """
+    The Tags model
+    """
+
+    id = fields.IntField(primary_key=True)
+    name = fields.CharField(max_length=100, unique=True)
+    # number of links of the tag, see sharelink.core.tags
+    count = fields.IntField(default=0)
+
+
+class LinksTags(models.Model):
+    """
+    The tags of each link
+    """
+
+    id = fields.IntField(primary_key=True)
+    link: fields.ForeignKeyRelation[Links] = fields.ForeignKeyField(
+        "models.Links", related_name="links_tags", on_delete=fields.CASCADE
+    )
+    tag: fields.ForeignKeyRelation[Tags] = fields.ForeignKeyField(
+        "models.Tags", related_name="links_tags", on_delete=fields.CASCADE
+    )
+
+    class Meta:
+        table = "links_tags"
+        unique_together = (("link", "tag"),)
+        # the links of a tag
+        indexes = (("tag_id", "link_id"),)
+
+
+class Counters(models.Model):
+    """
+    The number of links of the lists, see sharelink.core.counters
+    """
+
+    name = fields.CharField(max_length=100, primary_key=True)
+    count = fields.IntField(default=0)
+
+
+class Days(models.Model):
+    """
+    The days having links, in the timezone of the app, see sharelink.core.days
+    """
+
+    day = fields.DateField(primary_key=True)
+    count = fields.IntField(default=0)
+    public_count = fields.IntField(default=0)
+
+
+class Versions(models.Model):
+    """
+    The version of the data, changed by each write, see sharelink.core.http_cache
+    """
+
+    name = fields.CharField(max_length=100, primary_key=True)
+    version = fields.IntField(default=0)
+    date_modified = fields.DatetimeField()
+
+
+class Changes(models.Model):
+    """
+    The log of the changes of the links, see sharelink.core.changes
+    """
+
+    seq = fields.IntField(primary_key=True)
+    operation = fields.CharField(max_length=10)
+    link_id = fields.IntField()
+    url_hashed = fields.CharField(max_length=10)
+    date_created = fields.DatetimeField(auto_now_add=True)
+
+
+class Jobs(models.Model):
+    """
+    The jobs to run after the writes, see sharelink.core.jobs
+    """
+
+    id = fields.IntField(primary_key=True)
+    kind = fields.CharField(max_length=50)
+    payload = fields.JSONField(default=dict)
+    status = fields.CharField(max_length=10, default="pending")
+    attempts = fields.IntField(default=0)
+    # when to run it, or when a running job is given to another worker
+    run_at = fields.DatetimeField()
+    error = fields.TextField(null=True)
+    date_created = fields.DatetimeField(auto_now_add=True)
+
+    class Meta:
+        # the next jobs to run
+        indexes = (("status", "run_at"),)
+
+
+class Migrations(models.Model):
+    """
+    The migrations applied to the database
+    """
+
+    name = fields.CharField(max_length=100, primary_key=True)
+    date_applied = fields.DatetimeField(auto_now_add=True)
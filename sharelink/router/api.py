@@ -0,0 +1,104 @@
+# coding: utf-8
+"""
+2024 - ShareLink - router api - 셰어 링크
+
+the JSON API, to create, update or delete the links by batch, and to follow their changes
+"""
+
+import secrets
+from typing import Annotated, Awaitable, List
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import Response
+from tortoise.exceptions import IntegrityError
+
+from sharelink.config import settings
+from sharelink.core.bulk import BulkResult, add_links, delete_links, update_links
+from sharelink.core.changes import get_changes
+from sharelink.schemas import (
+    BulkResultSchema,
+    BulkResultsSchema,
+    ChangeSchema,
+    ChangesSchema,
+    LinkSchema,
+    LinksCreateSchema,
+    LinksDeleteSchema,
+    LinksUpdateSchema,
+)
+
+
+async def check_token(authorization: str = Header("")) -> None:
+    """
+    the clients give the token of API_TOKEN, the API is disabled without one
+    """
+    if not settings.API_TOKEN:
+        raise HTTPException(status_code=403, detail="API disabled, no API_TOKEN")
+    if not secrets.compare_digest(authorization.encode(), f"Bearer {settings.API_TOKEN}".encode()):
+        raise HTTPException(status_code=401, detail="Invalid token")
+
+
+router = APIRouter(prefix="/api/v1", dependencies=[Depends(check_token)])
+
+
+async def results_response(results: Awaitable[List[BulkResult]]) -> Response:
+    """
+    the results of a batch, as compact JSON, serialized without validating them again
+    """
+    try:
+        links = [BulkResultSchema.model_construct(**result._asdict()) for result in await results]
+    except IntegrityError:
+        # an URL of the batch is already the one of another link
+        raise HTTPException(status_code=409, detail="URL already used by another link")
+    content = BulkResultsSchema.model_construct(links=links).model_dump_json(exclude_none=True)
+    return Response(content, media_type="application/json")
+
+
+@router.post("/links", response_model=BulkResultsSchema, response_model_exclude_none=True)
+async def api_create_links(batch: LinksCreateSchema) -> Response:
+    """
+    create the links whose URL does not exist yet
+    """
+    return await results_response(add_links(batch.links))
+
+
+@router.patch("/links", response_model=BulkResultsSchema, response_model_exclude_none=True)
+async def api_update_links(batch: LinksUpdateSchema) -> Response:
+    """
+    update the links given by their small hash
+    """
+    return await results_response(update_links([(link.url_hashed, link) for link in batch.links]))
+
+
+@router.delete("/links", response_model=BulkResultsSchema, response_model_exclude_none=True)
+async def api_delete_links(batch: LinksDeleteSchema) -> Response:
+    """
+    delete the links given by their small hash
+    """
+    return await results_response(delete_links(batch.url_hashed))
+
+
+@router.get("/changes", response_model=ChangesSchema, response_model_exclude_none=True)
+async def api_changes(
+    since: Annotated[int, Query(ge=0)] = 0,
+    limit: Annotated[int, Query(ge=1, le=settings.API_BATCH_SIZE)] = settings.API_BATCH_SIZE,
+) -> Response:
+    """
+    the changes of the links following the one of seq since, the oldest first
+    """
+    changes, links = await get_changes(since, limit)
+    page = ChangesSchema.model_construct(
+        changes=[
+            ChangeSchema.model_construct(
+                seq=change.seq,
+                operation=change.operation,
+                link_id=change.link_id,
+                url_hashed=change.url_hashed,
+                link=LinkSchema.model_validate(links[change.link_id])
+                if change.link_id in links
+                else None,
+            )
+            for change in changes
+        ],
+        cursor=changes[-1].seq if changes else since,
+    )
+    return Response(page.model_dump_json(exclude_none=True), media_type="application/json")
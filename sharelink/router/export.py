@@ -0,0 +1,37 @@
+# coding: utf-8
+"""
+2024 - ShareLink - router export - 셰어 링크
+"""
+
+from datetime import date
+from typing import AsyncIterator, Literal
+
+from fastapi import APIRouter, Depends
+from fastapi.responses import StreamingResponse
+
+from sharelink.core.changes import last_seq
+from sharelink.core.export import EXTENSIONS, MEDIA_TYPES, NETSCAPE, export_links
+from sharelink.router.api import check_token
+
+router = APIRouter()
+
+
+async def encode(chunks: AsyncIterator[str]) -> AsyncIterator[bytes]:
+    async for chunk in chunks:
+        yield chunk.encode()
+
+
+@router.get("/export", dependencies=[Depends(check_token)])
+async def export(format: Literal["netscape", "jsonl", "csv"] = NETSCAPE) -> StreamingResponse:
+    """
+    download all the links, private ones included, sent while they are read
+    """
+    filename = f"sharelink-{date.today().isoformat()}.{EXTENSIONS[format]}"
+    headers = {
+        "Content-Disposition": f'attachment; filename="{filename}"',
+        # read before the links: a mirror gets the changes made during the export too
+        "X-Changes-Seq": str(await last_seq()),
+    }
+    return StreamingResponse(
+        encode(export_links(format)), media_type=MEDIA_TYPES[format], headers=headers
+    )
@@ -3,55 +3,49 @@
 2024 - ShareLink - router feeds - 셰어 링크
 """
 
-import datetime
+from fastapi import APIRouter, Request
+from fastapi.responses import Response
 
-import pytz
-from fastapi import APIRouter, Depends
-from fastapi.templating import Jinja2Templates
-from fastapi_rss import Item, RSSFeed, RSSResponse
-from sqlmodel import Session
+from sharelink.core.feeds import ATOM, MEDIA_TYPES, RSS, build_feed
 
-from sharelink.config import settings
-from sharelink.dependencies import get_session
-from sharelink.router.links import get_links
+router = APIRouter()
 
-templates = Jinja2Templates(directory="templates")
 
-router = APIRouter()
+async def feed_response(request: Request, feed: str, tag: str | None = None) -> Response:
+    """
+    the feed, made of the items stored with the links
+    """
+    content = await build_feed(feed, request.url.path, tag=tag)
+    return Response(content, media_type=MEDIA_TYPES[feed])
 
 
 @router.get("/feeds")
-async def feeds(session: Session = Depends(get_session)) -> RSSResponse:
-    """
-    flow to generate a feeds
-    """
-    links, ttl = await get_links(session=session)
-    right_now = datetime.datetime.now(tz=pytz.timezone(settings.SHARELINK_TZ))
-    feed_data = {
-        "title": settings.SHARELINK_NAME,
-        "link": settings.SHARELINK_URL,
-        "description": settings.SHARELINK_DESCRIPTION,
-        "language": settings.LANGUAGE_CODE,
-        "last_build_date": datetime.datetime(
-            right_now.year,
-            right_now.month,
-            right_now.day,
-            right_now.hour,
-            right_now.minute,
-            right_now.second,
-        ),
-        "generator": "ShareLink",
-        "ttl": ttl,
-        "item": [
-            Item(
-                title=link.title,
-                link=link.url,
-                description=link.description,
-                author=settings.SHARELINK_AUTHOR,
-                pub_date=link.date_created,
-            )
-            for link in links
-        ],
-    }
-    feed = RSSFeed(**feed_data)
-    return RSSResponse(feed)
+async def feeds(request: Request) -> Response:
+    """
+    the RSS feed of the public links
+    """
+    return await feed_response(request, RSS)
+
+
+@router.get("/feeds/atom")
+async def feeds_atom(request: Request) -> Response:
+    """
+    the Atom feed of the public links
+    """
+    return await feed_response(request, ATOM)
+
+
+@router.get("/feeds/tag/{tag}")
+async def feeds_tag(request: Request, tag: str) -> Response:
+    """
+    the RSS feed of the public links of a tag
+    """
+    return await feed_response(request, RSS, tag=tag)
+
+
+@router.get("/feeds/tag/{tag}/atom")
+async def feeds_tag_atom(request: Request, tag: str) -> Response:
+    """
+    the Atom feed of the public links of a tag
+    """
+    return await feed_response(request, ATOM, tag=tag)
@@ -3,28 +3,33 @@
 2024 - ShareLink - router links - 셰어 링크
 """
 
-from datetime import datetime
 from typing import Annotated, Tuple
 
-import pytz
 from fastapi import APIRouter, Depends, Form, HTTPException, Query, Request
 from fastapi.responses import HTMLResponse, RedirectResponse
 from fastapi.templating import Jinja2Templates
 from fastapi_csrf_protect import CsrfProtect
 from pydantic import ValidationError
-from sqlalchemy.engine.result import ScalarResult
-from sqlmodel import Session, func, select
 
 from sharelink.config import CsrfSettings, settings
-from sharelink.core.hashed_urls import small_hash
-from sharelink.dependencies import filter_datetime, filter_markdown
-from sharelink.dependencies_sqlalchemy import get_session
+from sharelink.core.bulk import NOT_FOUND, add_links, delete_links, update_links
+from sharelink.core.counters import ALL, count_links
+from sharelink.core.pagination import Cursor, Page, cursor_headers, paginate
+from sharelink.core.render import render_links
+from sharelink.dependencies import (
+    filter_datetime,
+    filter_link_html,
+    filter_markdown,
+    filter_split_tags,
+)
 from sharelink.forms import LinksForm
 from sharelink.models import Links
 
 templates = Jinja2Templates(directory="templates")
 templates.env.filters["filter_markdown"] = filter_markdown
 templates.env.filters["filter_datetime"] = filter_datetime
+templates.env.filters["filter_link_html"] = filter_link_html
+templates.env.filters["filter_split_tags"] = filter_split_tags
 
 router = APIRouter()
 
@@ -49,13 +54,14 @@ async def home(
     request: Request,
     offset: int = 0,
     limit: Annotated[int, Query(le=settings.LINKS_PER_PAGE)] = 5,
-    session: Session = Depends(get_session),
+    after: Cursor = None,
+    before: Cursor = None,
 ) -> HTMLResponse:
     """
     get the links on the home page
     """
 
-    links, ttl = await get_links(session, offset=offset, limit=limit)
+    links, ttl = await get_links(offset=offset, limit=limit, after=after, before=before)
 
     context = {
         "request": request,
@@ -63,6 +69,10 @@ async def home(
         "ttl": ttl,
         "offset": offset,
         "limit": limit,
+        "next_cursor": links.next_cursor,
+        "prev_cursor": links.prev_cursor,
+        # pages given by a cursor
+        "cursor": bool(after or before),
         # link to use when using pagination
         "url": "home",
         "settings": settings,
@@ -72,6 +82,7 @@ async def home(
     response.headers["X-Total-Count"] = str(ttl)
     response.headers["X-Offset"] = str(offset)
     response.headers["X-Limit"] = str(limit)
+    response.headers.update(cursor_headers(links))
 
     return response
 
@@ -80,7 +91,6 @@ async def home(
 async def create_link_form(
     request: Request,
     csrf_protect: CsrfProtect = Depends(),
-    session: Session = Depends(get_session),
 ) -> HTMLResponse:
     """
     form to create a link
@@ -106,7 +116,6 @@ async def create_link_form(
 async def create_link(
     request: Request,
     csrf_protect: CsrfProtect = Depends(),
-    session: Session = Depends(get_session),
 ) -> HTMLResponse:
     """
     Form submitted, save the link
@@ -120,7 +129,7 @@ async def create_link(
         linkForm = LinksForm(**form)
 
         if linkForm.url:
-            existing_link = await get_link_by_url(url=str(linkForm.url), session=session)
+            existing_link = await get_link_by_url(url=str(linkForm.url))
             if existing_link:
                 context = {
                     "request": request,
@@ -132,7 +141,7 @@ async def create_link(
                 return response
 
         # add link if it does not already exist
-        new_link = await add_link(session=session, link_form=linkForm)
+        new_link = await add_link(link_form=linkForm)
         context = {
             "request": request,
             "data": new_link,
@@ -168,13 +177,12 @@ async def create_link(
 
 
 @router.get("/links/{url_hashed}", response_class=HTMLResponse)
-async def links_detail(
-    request: Request, url_hashed: str, session: Session = Depends(get_session)
-) -> HTMLResponse:
+async def links_detail(request: Request, url_hashed: str) -> HTMLResponse:
     """
     view the link by its hashed URL
     """
-    link = await get_link_by_url_hashed(url_hashed=url_hashed, session=session)
+    link = await get_link_by_url_hashed(url_hashed=url_hashed)
+    await render_links([link])
     context = {
         "request": request,
         "data": link,
@@ -191,14 +199,13 @@ async def links_edit(
     request: Request,
     url_hashed: str,
     csrf_protect: CsrfProtect = Depends(),
-    session: Session = Depends(get_session),
 ) -> HTMLResponse:
     """
     edit the link by its hashed URL
     """
 
     csrf_token, signed_token = csrf_protect.generate_csrf_tokens()
-    link = await get_link_by_url_hashed(url_hashed=url_hashed, session=session)
+    link = await get_link_by_url_hashed(url_hashed=url_hashed)
     link_form = link
 
     context = {
@@ -221,7 +228,6 @@ async def links_save(
     request: Request,
     url_hashed: str,
     csrf_protect: CsrfProtect = Depends(),
-    session: Session = Depends(get_session),
 ) -> HTMLResponse:
     """
     Form submitted, update Link
@@ -234,7 +240,7 @@ async def links_save(
         # form validated
         linkForm = LinksForm(**form)
         # update link if it already exists
-        link = await update_link(url_hashed=url_hashed, link_form=linkForm, session=session)
+        link = await update_link(url_hashed=url_hashed, link_form=linkForm)
 
         context = {
             "request": request,
@@ -271,19 +277,16 @@ async def links_save(
 
 
 @router.get("/delete/{link_id}", response_class=RedirectResponse, status_code=302)
-async def links_delete(
-    request: Request, link_id: int, session: Session = Depends(get_session)
-) -> RedirectResponse:
+async def links_delete(request: Request, link_id: int) -> RedirectResponse:
     """
     delete a link by its ID
     """
-    link = await get_link(link_id=link_id, session=session)
+    link = await get_link(link_id=link_id)
 
     if not link:
         raise HTTPException(status_code=404, detail="Link not found")
 
-    session.delete(link)
-    session.commit()
+    await delete_links([link.url_hashed])
 
     redirect_url = request.url_for("home")
     return RedirectResponse(redirect_url, status_code=303)
@@ -293,25 +296,24 @@ async def links_delete(
 
 
 async def get_links(
-    session: Session,
     offset: int = 0,
     limit: Annotated[int, Query(le=100)] = 100,
-) -> Tuple[ScalarResult[Links], int | None]:
+    after: str | None = None,
+    before: str | None = None,
+) -> Tuple[Page, int]:
     """
     get all the links
     """
-    count = session.exec(select(func.count()).select_from(Links)).first()
-    query = select(Links).order_by(Links.date_created.desc()).offset(offset).limit(limit)  # type: ignore
-    links = session.exec(query)
+    count = await count_links(ALL, Links.all())
+    links = await paginate(Links.all(), offset=offset, limit=limit, after=after, before=before)
     return links, count
 
 
-async def get_link(link_id: int, session: Session) -> Links | None:
+async def get_link(link_id: int) -> Links:
     """
     get data of the link
     """
-    statement = select(Links).where(Links.id == link_id)
-    link = session.exec(statement).first()
+    link = await Links.get_or_none(id=link_id)
 
     if not link:
         raise HTTPException(status_code=404, detail="Link not found")
@@ -319,12 +321,11 @@ async def get_link(link_id: int, session: Session) -> Links | None:
     return link
 
 
-async def get_link_by_url_hashed(url_hashed: str, session: Session) -> Links | None:
+async def get_link_by_url_hashed(url_hashed: str) -> Links:
     """
     get the link related to the url_hashed
     """
-    statement = select(Links).where(Links.url_hashed == url_hashed)
-    link = session.exec(statement).first()
+    link = await Links.get_or_none(url_hashed=url_hashed)
 
     if not link:
         raise HTTPException(status_code=404, detail="Link not found")
@@ -332,72 +333,28 @@ async def get_link_by_url_hashed(url_hashed: str, session: Session) -> Links | N
     return link
 
 
-async def get_link_by_url(url: str, session: Session) -> Links | None:
+async def get_link_by_url(url: str) -> Links | None:
     """
     get the link related to the url
     """
-    statement = select(Links).where(Links.url == url)
-    link = session.exec(statement).first()
-    return link
+    return await Links.get_or_none(url=url)
 
 
-async def add_link(link_form: Annotated[LinksForm, Form()], session: Session) -> Links:
+async def add_link(link_form: Annotated[LinksForm, Form()]) -> Links:
     """
-    let's create a link,
-    two path :
-    1 - grab the content of an URL from the form and fill title and text from that URL
-    2 - fill title text url from the form
+    let's create a link, as the JSON API does
+    the link of the URL when it already exists
     """
-    # let's calculate the hashed url of the created Link (not for the URL)
-    date_created = datetime.now(tz=pytz.timezone(settings.SHARELINK_TZ))
-    url_hashed = await small_hash(date_created.strftime("%Y%m%d_%H%M%S"))
-
-    # let's get the content of the URL only if JUST the URL field has been filled
-    # otherwise we'll use URL + title or/and text
-    link = Links(
-        url=str(link_form.url),
-        url_hashed=url_hashed,
-        title=link_form.title.strip(),
-        text=link_form.text.strip(),
-        sticky=link_form.sticky,
-        private=link_form.private,
-        image=link_form.image,
-        video=link_form.video,
-        tags=link_form.tags.strip() if link_form.tags else "",
-        date_created=datetime.now(tz=pytz.timezone(settings.SHARELINK_TZ)),
-    )
-
-    db_link = Links.model_validate(link)
-
-    session.add(db_link)
-    session.commit()
-    session.refresh(db_link)
-
-    return db_link
-
-
-async def update_link(
-    url_hashed: str, link_form: Annotated[LinksForm, Form()], session: Session
-) -> Links:
+    (result,) = await add_links([link_form])
+    return await Links.get(id=result.id)
+
+
+async def update_link(url_hashed: str, link_form: Annotated[LinksForm, Form()]) -> Links:
     """
     save the content of an existing link
     """
-    link = await get_link_by_url_hashed(url_hashed=url_hashed, session=session)
-
-    if not link:
+    (result,) = await update_links([(url_hashed, link_form)])
+    if result.status == NOT_FOUND:
         raise HTTPException(status_code=404, detail="Link not found")
 
-    link.url = str(link_form.url)
-    link.title = link_form.title.strip() if link_form.title else ""
-    link.text = link_form.text.strip() if link_form.text else ""
-    link.sticky = link_form.sticky
-    link.private = link_form.private
-    link.image = link_form.image
-    link.video = link_form.video
-    link.tags = link_form.tags.strip() if link_form.tags else ""
-
-    session.add(link)
-    session.commit()
-    session.refresh(link)
-
-    return link
+    return await Links.get(id=result.id)
@@ -3,22 +3,37 @@
 2024 - ShareLink - router daily links - 셰어 링크
 """
 
-from datetime import date, datetime, timedelta
+from datetime import date, datetime
 from typing import Annotated
 
 import pytz
-from fastapi import APIRouter, Depends, Query, Request
-from fastapi.responses import HTMLResponse
+from fastapi import APIRouter, Query, Request
+from fastapi.responses import HTMLResponse, Response
 from fastapi.templating import Jinja2Templates
-from sqlmodel import Session, select
 
 from sharelink.config import settings
-from sharelink.dependencies import filter_datetime, filter_markdown, get_session
+from sharelink.core.days import (
+    calendar_months,
+    day_bounds,
+    next_day,
+    previous_day,
+    year_counts,
+)
+from sharelink.core.feeds import MEDIA_TYPES, RSS, build_digest
+from sharelink.core.rows import fetch_rows
+from sharelink.dependencies import (
+    filter_datetime,
+    filter_link_html,
+    filter_markdown,
+    filter_split_tags,
+)
 from sharelink.models import Links
 
 templates = Jinja2Templates(directory="templates")
 templates.env.filters["filter_markdown"] = filter_markdown
 templates.env.filters["filter_datetime"] = filter_datetime
+templates.env.filters["filter_link_html"] = filter_link_html
+templates.env.filters["filter_split_tags"] = filter_split_tags
 
 router = APIRouter()
 
@@ -28,7 +43,6 @@ router = APIRouter()
 @router.get("/daily", response_class=HTMLResponse)
 async def daily(
     request: Request,
-    session: Session = Depends(get_session),
     offset: int = 0,
     limit: Annotated[int, Query(le=settings.DAILY_PER_PAGE)] = 5,
     yesterday: date | None = None,
@@ -37,9 +51,7 @@ async def daily(
     get the daily links
     """
     # @TODO check the data related to the date
-    daily_links = await get_links_daily(
-        session=session, offset=offset, limit=limit, yesterday=yesterday
-    )
+    daily_links = await get_links_daily(offset=offset, limit=limit, yesterday=yesterday)
 
     context = {
         "request": request,
@@ -55,11 +67,47 @@ async def daily(
     return response
 
 
+@router.get("/daily/calendar", response_class=HTMLResponse)
+async def daily_calendar(
+    request: Request, year: Annotated[int | None, Query(ge=1, le=9998)] = None
+) -> HTMLResponse:
+    """
+    the number of links of each day of a year
+    """
+    tz = pytz.timezone(settings.SHARELINK_TZ)
+    if not year:
+        year = datetime.now(tz=tz).year
+    # the years having links, from the index of the days
+    previous_date = await previous_day(date(year, 1, 1))
+    next_date = await next_day(date(year, 12, 31))
+
+    context = {
+        "request": request,
+        "year": year,
+        "months": calendar_months(year, await year_counts(year)),
+        "previous_year": previous_date.year if previous_date else None,
+        "next_year": next_date.year if next_date else None,
+        "settings": settings,
+    }
+
+    response = templates.TemplateResponse("sharelink/links_calendar.html", context)
+
+    return response
+
+
+@router.get("/daily/rss")
+async def daily_rss(request: Request) -> Response:
+    """
+    the RSS feed of the public links of the last days, one item per day
+    """
+    content = await build_digest(request.url.path)
+    return Response(content, media_type=MEDIA_TYPES[RSS])
+
+
 # Function to handle daily links
 
 
 async def get_links_daily(
-    session: Session,
     offset: int = 0,
     limit: Annotated[int, Query(le=10)] = 10,
     yesterday: date | None = None,
@@ -69,46 +117,22 @@ async def get_links_daily(
     look for the date of "yesterday" and "tomorrow"
     then look for the data
     """
-    next_date: date | None = None
-    previous_date: date | None = None
-
-    now = datetime.now(tz=pytz.timezone(settings.SHARELINK_TZ))
-    today = date.today()
-
-    if yesterday:
-        start_of_day = yesterday
-
-    else:
-        yesterday = today - timedelta(days=1, seconds=-1)
-
-        start_of_day = datetime(now.year, now.month, now.day)
-
-    end_of_day = start_of_day + timedelta(days=1, seconds=-1)
-
-    # @TODO do not return private links
-    statement = (
-        select(Links).where(Links.date_created <= yesterday).order_by(Links.date_created.desc())
-    )  # type: ignore
-
-    my_previous_date = session.exec(statement).first()
+    tz = pytz.timezone(settings.SHARELINK_TZ)
 
-    if my_previous_date:
-        previous_date = my_previous_date.date_created.date()
+    if not yesterday:
+        yesterday = datetime.now(tz=tz).date()
 
-    # @TODO do not return private links
-    statement = (
-        select(Links).where(Links.date_created > end_of_day).order_by(Links.date_created.asc())
-    )  # type: ignore
-    my_next_date = session.exec(statement).first()
+    # boundaries of the day in the timezone of the app, compared in UTC as stored
+    start_of_day, end_of_day = day_bounds(yesterday)
 
-    if my_next_date:
-        next_date = my_next_date.date_created.date()
+    # the previous and the next days having links, from the index of the days
+    previous_date = await previous_day(yesterday)
+    next_date = await next_day(yesterday)
 
-    data = session.exec(
-        select(Links)
-        .where(Links.date_created <= end_of_day)
-        .where(Links.date_created >= start_of_day)
-        .order_by(Links.date_created.desc())  # type: ignore
+    # the links of the day, from the index of date_created
+    data = await fetch_rows(
+        Links.filter(date_created__gte=start_of_day, date_created__lt=end_of_day)
+        .order_by("-date_created")
         .offset(offset)
         .limit(limit)
     )
@@ -5,19 +5,26 @@
 
 from typing import Annotated, Tuple
 
-from fastapi import APIRouter, Depends, Query, Request
+from fastapi import APIRouter, Query, Request
 from fastapi.responses import HTMLResponse
 from fastapi.templating import Jinja2Templates
-from sqlalchemy.engine.result import ScalarResult
-from sqlmodel import Session, func, select
 
 from sharelink.config import settings
-from sharelink.dependencies import filter_datetime, filter_markdown, get_session
+from sharelink.core.counters import PRIVATE, PUBLIC, count_links
+from sharelink.core.pagination import Cursor, Page, cursor_headers, paginate
+from sharelink.dependencies import (
+    filter_datetime,
+    filter_link_html,
+    filter_markdown,
+    filter_split_tags,
+)
 from sharelink.models import Links
 
 templates = Jinja2Templates(directory="templates")
 templates.env.filters["filter_markdown"] = filter_markdown
 templates.env.filters["filter_datetime"] = filter_datetime
+templates.env.filters["filter_link_html"] = filter_link_html
+templates.env.filters["filter_split_tags"] = filter_split_tags
 
 router = APIRouter()
 
@@ -25,20 +32,25 @@ router = APIRouter()
 @router.get("/private", response_class=HTMLResponse)
 async def links_private(
     request: Request,
-    session: Session = Depends(get_session),
     offset: int = 0,
     limit: Annotated[int, Query(le=settings.LINKS_PER_PAGE)] = 5,
+    after: Cursor = None,
+    before: Cursor = None,
 ) -> HTMLResponse:
     """
     get the private links
     """
-    links, ttl = await get_links_private(session=session, offset=offset, limit=limit)
+    links, ttl = await get_links_private(offset=offset, limit=limit, after=after, before=before)
     context = {
         "request": request,
         "links": links,
         "ttl": ttl,
         "offset": offset,
         "limit": limit,
+        "next_cursor": links.next_cursor,
+        "prev_cursor": links.prev_cursor,
+        # pages given by a cursor
+        "cursor": bool(after or before),
         # link to use when using pagination
         "url": "links_private",
         "settings": settings,
@@ -48,6 +60,7 @@ async def links_private(
     response.headers["X-Total-Count"] = str(ttl)
     response.headers["X-Offset"] = str(offset)
     response.headers["X-Limit"] = str(limit)
+    response.headers.update(cursor_headers(links))
 
     return response
 
@@ -55,14 +68,15 @@ async def links_private(
 @router.get("/public", response_class=HTMLResponse)
 async def links_public(
     request: Request,
-    session: Session = Depends(get_session),
     offset: int = 0,
     limit: Annotated[int, Query(le=settings.LINKS_PER_PAGE)] = 5,
+    after: Cursor = None,
+    before: Cursor = None,
 ) -> HTMLResponse:
     """
     get the public links
     """
-    links, ttl = await get_links_public(session=session, offset=offset, limit=limit)
+    links, ttl = await get_links_public(offset=offset, limit=limit, after=after, before=before)
 
     context = {
         "request": request,
@@ -70,6 +84,10 @@ async def links_public(
         "ttl": ttl,
         "offset": offset,
         "limit": limit,
+        "next_cursor": links.next_cursor,
+        "prev_cursor": links.prev_cursor,
+        # pages given by a cursor
+        "cursor": bool(after or before),
         # link to use when using pagination
         "url": "links_public",
         "settings": settings,
@@ -79,6 +97,7 @@ async def links_public(
     response.headers["X-Total-Count"] = str(ttl)
     response.headers["X-Offset"] = str(offset)
     response.headers["X-Limit"] = str(limit)
+    response.headers.update(cursor_headers(links))
 
     return response
 
@@ -87,45 +106,30 @@ async def links_public(
 
 
 async def get_links_private(
-    session: Session,
     offset: int = 0,
     limit: Annotated[int, Query(le=10)] = 10,
-) -> Tuple[ScalarResult[Links], int | None]:
+    after: str | None = None,
+    before: str | None = None,
+) -> Tuple[Page, int]:
     """
     only get the private link created for ourselves
     """
-    # count_query = select(func.count(Links.id)).where(Links.private == 1)
-    # count = session.exec(count_query).one()  # Get the count
-
-    count = session.exec(select(func.count()).select_from(Links).where(Links.private == 1)).first()
-
-    links = session.exec(
-        select(Links)
-        .where(Links.private == 1)
-        .order_by(Links.date_created.desc())  # type: ignore
-        .offset(offset)
-        .limit(limit)
-    )
+    query = Links.filter(private=True)
+    count = await count_links(PRIVATE, query)
+    links = await paginate(query, offset=offset, limit=limit, after=after, before=before)
     return links, count
 
 
 async def get_links_public(
-    session: Session,
     offset: int = 0,
     limit: Annotated[int, Query(le=10)] = 10,
-) -> Tuple[ScalarResult[Links], int | None]:
+    after: str | None = None,
+    before: str | None = None,
+) -> Tuple[Page, int]:
     """
     only get the link created for everyone
     """
-    # count_query = select(func.count(Links.id)).where(Links.private == 0)
-    # count = session.exec(count_query).one()  # Get the count
-    count = session.exec(select(func.count()).select_from(Links).where(Links.private == 0)).first()
-
-    links = session.exec(
-        select(Links)
-        .where(Links.private == 0)
-        .order_by(Links.date_created.desc())  # type: ignore
-        .offset(offset)
-        .limit(limit)
-    )
+    query = Links.filter(private=False)
+    count = await count_links(PUBLIC, query)
+    links = await paginate(query, offset=offset, limit=limit, after=after, before=before)
     return links, count
@@ -0,0 +1,76 @@
+# coding: utf-8
+"""
+2024 - ShareLink - router search - 셰어 링크
+"""
+
+from typing import Annotated, Literal
+
+from fastapi import APIRouter, Query, Request
+from fastapi.responses import HTMLResponse, JSONResponse, Response
+from fastapi.templating import Jinja2Templates
+
+from sharelink.config import settings
+from sharelink.core.http_cache import accepts_json
+from sharelink.core.pagination import cursor_headers
+from sharelink.core.render import render_links
+from sharelink.core.search import Cursor, search_links
+from sharelink.dependencies import (
+    filter_datetime,
+    filter_link_html,
+    filter_markdown,
+    filter_split_tags,
+)
+from sharelink.schemas import LinkSchema, LinksPageSchema
+
+templates = Jinja2Templates(directory="templates")
+templates.env.filters["filter_markdown"] = filter_markdown
+templates.env.filters["filter_datetime"] = filter_datetime
+templates.env.filters["filter_link_html"] = filter_link_html
+templates.env.filters["filter_split_tags"] = filter_split_tags
+
+router = APIRouter()
+
+
+@router.get("/search", response_class=HTMLResponse)
+async def search(
+    request: Request,
+    q: str = "",
+    limit: Annotated[int, Query(le=settings.LINKS_PER_PAGE)] = 5,
+    after: Cursor = None,
+    format: Literal["html", "json"] | None = None,
+) -> Response:
+    """
+    search the links, as HTML or as JSON (?format=json or Accept: application/json)
+    """
+    links, ttl = await search_links(q, limit=limit, after=after)
+
+    if format == "json" or (format is None and accepts_json(request)):
+        page = LinksPageSchema(
+            links=[LinkSchema.model_validate(link) for link in links],
+            count=ttl,
+            next_cursor=links.next_cursor,
+        )
+        response: Response = JSONResponse(page.model_dump(mode="json"))
+    else:
+        await render_links(links)
+        context = {
+            "request": request,
+            "links": links,
+            "ttl": ttl,
+            "q": q,
+            "offset": 0,
+            "limit": limit,
+            "next_cursor": links.next_cursor,
+            "prev_cursor": None,
+            # the results are always given by a cursor
+            "cursor": True,
+            "url": "search",
+            "settings": settings,
+        }
+        response = templates.TemplateResponse("sharelink/links_list.html", context)
+
+    response.headers["X-Total-Count"] = str(ttl)
+    response.headers["X-Limit"] = str(limit)
+    response.headers.update(cursor_headers(links))
+
+    return response
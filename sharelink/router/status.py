@@ -0,0 +1,19 @@
+# coding: utf-8
+"""
+2024 - ShareLink - router status - 셰어 링크
+"""
+
+from fastapi import APIRouter, Depends
+
+from sharelink.core.database import pool_stats
+from sharelink.router.api import check_token
+
+router = APIRouter()
+
+
+@router.get("/status/db", dependencies=[Depends(check_token)])
+async def status_db() -> dict:
+    """
+    statistics of the connections to the database, for the clients of the API
+    """
+    return pool_stats()
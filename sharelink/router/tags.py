@@ -3,21 +3,29 @@
 2024 - ShareLink - router tags - 셰어 링크
 """
 
-from typing import Annotated, Sequence, Tuple
+from typing import Annotated, Dict, Tuple
 
-from fastapi import APIRouter, Depends, Query, Request
+from fastapi import APIRouter, Query, Request
 from fastapi.responses import HTMLResponse
 from fastapi.templating import Jinja2Templates
-from sqlalchemy.engine.result import ScalarResult
-from sqlmodel import Session, column, func, select
+from tortoise.expressions import Subquery
 
 from sharelink.config import settings
-from sharelink.dependencies import filter_datetime, filter_markdown, get_session
-from sharelink.models import Links
+from sharelink.core.pagination import Cursor, Page, cursor_headers, paginate
+from sharelink.core.tags import get_tags_count
+from sharelink.dependencies import (
+    filter_datetime,
+    filter_link_html,
+    filter_markdown,
+    filter_split_tags,
+)
+from sharelink.models import Links, LinksTags, Tags
 
 templates = Jinja2Templates(directory="templates")
 templates.env.filters["filter_markdown"] = filter_markdown
 templates.env.filters["filter_datetime"] = filter_datetime
+templates.env.filters["filter_link_html"] = filter_link_html
+templates.env.filters["filter_split_tags"] = filter_split_tags
 
 router = APIRouter()
 
@@ -25,29 +33,14 @@ router = APIRouter()
 
 
 @router.get("/tags", response_class=HTMLResponse)
-async def tags_list(request: Request, session: Session = Depends(get_session)) -> HTMLResponse:
+async def tags_list(request: Request) -> HTMLResponse:
     """
-    get the used tags and get the links of each tag
+    get the used tags and the number of links of each tag
     """
 
-    links = await get_tags(session=session)
-    tags = []
-    for data in links:
-        if data.tags is not None:
-            for tag in data.tags.split(","):
-                tags.append(tag)
-        else:
-            tags.append("0Tag")
-
-    tags = sorted(tags)
-    tags_dict = {}
-    for my_tag in tags:
-        tags_dict.update({my_tag: tags.count(my_tag)})
-
     context = {
         "request": request,
-        "links": links,
-        "tags": tags_dict,
+        "tags": await get_tags(),
         "settings": settings,
     }
 
@@ -60,21 +53,28 @@ async def tags_list(request: Request, session: Session = Depends(get_session)) -
 async def links_by_tag(
     request: Request,
     tag: str,
-    session: Session = Depends(get_session),
     offset: int = 0,
     limit: Annotated[int, Query(le=settings.LINKS_PER_PAGE)] = 5,
+    after: Cursor = None,
+    before: Cursor = None,
 ) -> HTMLResponse:
     """
     get the links of a given tag
     """
 
-    links, ttl = await get_links_by_tag(tag=tag, session=session, offset=offset, limit=limit)
+    links, ttl = await get_links_by_tag(
+        tag=tag, offset=offset, limit=limit, after=after, before=before
+    )
     context = {
         "request": request,
         "links": links,
         "ttl": ttl,
         "offset": offset,
         "limit": limit,
+        "next_cursor": links.next_cursor,
+        "prev_cursor": links.prev_cursor,
+        # pages given by a cursor
+        "cursor": bool(after or before),
         # link to use when using pagination
         "url": "home",
         "settings": settings,
@@ -84,6 +84,7 @@ async def links_by_tag(
     response.headers["X-Total-Count"] = str(ttl)
     response.headers["X-Offset"] = str(offset)
     response.headers["X-Limit"] = str(limit)
+    response.headers.update(cursor_headers(links))
 
     return response
 
@@ -91,46 +92,32 @@ async def links_by_tag(
 # ALL Functions to handle TAGS
 
 
-async def get_tags(session: Session) -> Sequence[Links]:
+async def get_tags() -> Dict[str, int]:
     """
-    get the tags of all the links
+    get the used tags and their number of links, counted when the links change
     """
-    return session.exec(select(Links)).all()
+    return await get_tags_count()
 
 
 async def get_links_by_tag(
-    session: Session,
     tag: str,
     offset: int = 0,
     limit: Annotated[int, Query(le=10)] = 10,
-) -> Tuple[ScalarResult[Links], int | None]:
+    after: str | None = None,
+    before: str | None = None,
+) -> Tuple[Page, int]:
     """
     get the links related to a tag
     """
 
-    tag = "" if tag == "0Tag" else tag
-
-    if tag:
-        count = session.exec(
-            select(func.count()).select_from(Links).filter(column("tags").contains(tag))
-        ).first()
-
-        links = session.exec(
-            select(Links)
-            .filter(column("tags").contains(tag))
-            .order_by(Links.date_created.desc())  # type: ignore
-            .offset(offset)
-            .limit(limit)
-        )
-    else:
-        count = session.exec(select(func.count()).select_from(Links)).first()
-
-        links = session.exec(
-            select(Links)
-            .where(Links.tags is None)
-            .order_by(Links.date_created.desc())  # type: ignore
-            .offset(offset)
-            .limit(limit)
-        )
+    # the links are found from the index of the tag, whatever the size of the table
+    # the links without tag have the 0Tag one, the names are stored stripped
+    tags = await Tags.filter(name=tag.strip()).values_list("id", "count")
+    links_ids = LinksTags.filter(tag_id__in=[tag_id for tag_id, _ in tags]).values("link_id")
+    query = Links.filter(id__in=Subquery(links_ids))
+
+    # counted when the links change
+    count = sum(count for _, count in tags)
+    links = await paginate(query, offset=offset, limit=limit, after=after, before=before)
 
     return links, count
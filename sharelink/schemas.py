@@ -0,0 +1,117 @@
+# coding: utf-8
+"""
+2024 - ShareLink - schemas - 셰어 링크
+"""
+
+from datetime import datetime
+from typing import Annotated
+
+from pydantic import BaseModel, ConfigDict, Field
+
+from sharelink.config import settings
+from sharelink.forms import LinksForm
+
+
+class LinkSchema(BaseModel):
+    """
+    a link/note, as returned by the JSON endpoints
+    """
+
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    url: str | None
+    url_hashed: str
+    title: str | None
+    text: str | None
+    tags: str | None
+    private: bool
+    sticky: bool
+    image: str | None
+    video: str | None
+    date_created: datetime
+    date_modified: datetime
+
+
+class LinksPageSchema(BaseModel):
+    """
+    a page of links, with the cursor of the next page
+    """
+
+    links: list[LinkSchema]
+    count: int
+    next_cursor: str | None = None
+    prev_cursor: str | None = None
+
+
+class LinksCreateSchema(BaseModel):
+    """
+    the links to create by the JSON API
+    """
+
+    links: Annotated[list[LinksForm], Field(min_length=1, max_length=settings.API_BATCH_SIZE)]
+
+
+class LinkUpdateSchema(LinksForm):
+    """
+    the new content of a link, given by its small hash
+    """
+
+    url_hashed: str
+
+
+class LinksUpdateSchema(BaseModel):
+    """
+    the links to update by the JSON API
+    """
+
+    links: Annotated[
+        list[LinkUpdateSchema], Field(min_length=1, max_length=settings.API_BATCH_SIZE)
+    ]
+
+
+class LinksDeleteSchema(BaseModel):
+    """
+    the small hashes of the links to delete by the JSON API
+    """
+
+    url_hashed: Annotated[list[str], Field(min_length=1, max_length=settings.API_BATCH_SIZE)]
+
+
+class BulkResultSchema(BaseModel):
+    """
+    what became of a link of the batch: created, existing, updated, deleted or not_found
+    """
+
+    status: str
+    id: int | None = None
+    url_hashed: str | None = None
+
+
+class BulkResultsSchema(BaseModel):
+    """
+    the results of a batch, in the order of its links
+    """
+
+    links: list[BulkResultSchema]
+
+
+class ChangeSchema(BaseModel):
+    """
+    a change of a link, with the link when it still exists
+    """
+
+    seq: int
+    operation: str
+    link_id: int
+    url_hashed: str
+    link: LinkSchema | None = None
+
+
+class ChangesSchema(BaseModel):
+    """
+    the changes following a cursor, and the cursor of the next ones
+    """
+
+    changes: list[ChangeSchema]
+    cursor: int
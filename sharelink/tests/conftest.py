@@ -0,0 +1,66 @@
+# coding: utf-8
+"""
+2024 - ShareLink - 셰어 링크
+"""
+
+import os
+from typing import AsyncGenerator
+
+import httpx
+import pytest
+from tortoise import Tortoise
+
+# the host used by httpx in the tests
+os.environ.setdefault("ALLOWED_HOST", "test")
+# the pages of the links are not fetched, but by the tests of the metadata
+os.environ.setdefault("METADATA_FETCH", "false")
+# the token given by the client of the tests
+os.environ.setdefault("API_TOKEN", "test")
+
+from sharelink.config import TORTOISE_ORM
+from sharelink.core.hashed_urls import HashAllocator
+
+
+@pytest.fixture
+def anyio_backend() -> str:
+    return "asyncio"
+
+
+@pytest.fixture(autouse=True)
+def allocator(monkeypatch: pytest.MonkeyPatch) -> HashAllocator:
+    """
+    the small hashes of each test, none allocated yet
+    """
+    hashes = HashAllocator()
+    monkeypatch.setattr("sharelink.core.bulk.allocator", hashes)
+    monkeypatch.setattr("sharelink.core.shaarli.allocator", hashes)
+    return hashes
+
+
+@pytest.fixture
+async def db() -> AsyncGenerator[None, None]:
+    """
+    an empty database in memory
+    """
+    await Tortoise.init(config={**TORTOISE_ORM, "connections": {"default": "sqlite://:memory:"}})
+    await Tortoise.generate_schemas()
+    yield
+    await Tortoise.close_connections()
+
+
+@pytest.fixture
+async def client(db: None) -> AsyncGenerator[httpx.AsyncClient, None]:
+    """
+    a client of the app
+    """
+    from sharelink.core import response_cache
+    from sharelink.main import app
+
+    # the pages cached by the previous tests
+    response_cache._cache = None
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://test", headers={"Authorization": "Bearer test"}
+    ) as client:
+        yield client
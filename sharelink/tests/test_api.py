@@ -0,0 +1,188 @@
+# coding: utf-8
+"""
+2024 - ShareLink - 셰어 링크
+"""
+
+from typing import List
+
+import httpx
+import pytest
+
+from sharelink.core import bulk
+from sharelink.core.changes import CREATED
+from sharelink.core.counters import ALL, PRIVATE, PUBLIC, recount
+from sharelink.core.hashed_urls import small_hash_sync
+from sharelink.core.http_cache import get_version
+from sharelink.forms import LinksForm
+from sharelink.models import Counters, Days, Links, Tags
+from sharelink.router.links import add_link
+
+pytestmark = pytest.mark.anyio
+
+
+async def counters() -> dict:
+    return dict(await Counters.all().values_list("name", "count"))
+
+
+async def count() -> None:
+    """
+    the counters are known, and kept up to date by the API
+    """
+    await recount(ALL, Links.all())
+    await recount(PRIVATE, Links.filter(private=True))
+    await recount(PUBLIC, Links.filter(private=False))
+
+
+async def test_create(client: httpx.AsyncClient) -> None:
+    link = await add_link(LinksForm(url="https://foxmask.org"))
+    await count()
+    links = [
+        {"url": "https://a.org", "tags": "python, blog"},
+        {"url": "https://foxmask.org"},
+        {"text": "a note", "private": True},
+        {"url": "https://a.org", "title": "again"},
+    ]
+    response = await client.post("/api/v1/links", json={"links": links})
+    assert response.status_code == 200
+    results = response.json()["links"]
+    assert [result["status"] for result in results] == [
+        "created",
+        "existing",
+        "created",
+        "existing",
+    ]
+    # the existing links and the duplicates of the batch
+    assert results[1] == {"status": "existing", "id": link.id, "url_hashed": link.url_hashed}
+    assert results[3]["id"] == results[0]["id"]
+
+    created = await Links.get(id=results[0]["id"])
+    assert created.url_hashed == results[0]["url_hashed"]
+    assert created.title == "https://a.org/"
+    assert created.feed_rss
+    assert await Links.all().count() == 3
+    assert await counters() == {ALL: 3, PUBLIC: 2, PRIVATE: 1}
+    assert await Days.all().values_list("count", flat=True) == [3]
+    tags = dict(await Tags.all().values_list("name", "count"))
+    assert tags == {"0Tag": 2, "python": 1, "blog": 1}
+
+    # the page of the created note
+    response = await client.get(f"/links/{results[2]['url_hashed']}")
+    assert "a note" in response.text
+
+    # a batch of existing links writes nothing
+    version = await get_version()
+    response = await client.post("/api/v1/links", json={"links": links[:2]})
+    assert [result["status"] for result in response.json()["links"]] == ["existing"] * 2
+    assert await get_version() == version
+
+
+async def test_validation(client: httpx.AsyncClient) -> None:
+    links = [{"url": "https://a.org"}, {"title": "neither an URL nor a text"}]
+    response = await client.post("/api/v1/links", json={"links": links})
+    assert response.status_code == 422
+    assert response.json()["detail"][0]["loc"][:3] == ["body", "links", 1]
+    # nothing written
+    assert await Links.all().count() == 0
+
+    response = await client.post("/api/v1/links", json={"links": []})
+    assert response.status_code == 422
+
+    # longer than their columns
+    for link in (
+        {"url": "https://a.org", "title": "t" * 256},
+        {"url": f"https://a.org/{'a' * 250}"},
+        {"url": "https://a.org", "tags": f"python,{'t' * 101}"},
+    ):
+        response = await client.post("/api/v1/links", json={"links": [link]})
+        assert response.status_code == 422
+    assert await Links.all().count() == 0
+
+
+async def test_update(client: httpx.AsyncClient) -> None:
+    link = await add_link(LinksForm(url="https://foxmask.org", tags="python"))
+    other = await add_link(LinksForm(url="https://a.org"))
+    await count()
+    links = [
+        {
+            "url_hashed": link.url_hashed,
+            "url": "https://foxmask.org",
+            "tags": "blog",
+            "private": True,
+        },
+        {"url_hashed": "unknown", "text": "a note"},
+    ]
+    response = await client.patch("/api/v1/links", json={"links": links})
+    assert response.json()["links"] == [
+        {"status": "updated", "id": link.id, "url_hashed": link.url_hashed},
+        {"status": "not_found", "url_hashed": "unknown"},
+    ]
+    updated = await Links.get(id=link.id)
+    assert updated.private
+    assert updated.tags == "blog"
+    assert await counters() == {ALL: 2, PUBLIC: 1, PRIVATE: 1}
+    tags = dict(await Tags.all().values_list("name", "count"))
+    assert tags == {"python": 0, "blog": 1, "0Tag": 1}
+
+    # the URL of another link
+    links = [{"url_hashed": link.url_hashed, "url": "https://a.org/"}]
+    response = await client.patch("/api/v1/links", json={"links": links})
+    assert response.status_code == 409
+    assert (await Links.get(id=other.id)).url == "https://a.org/"
+    assert (await Links.get(id=link.id)).url == "https://foxmask.org/"
+
+
+async def test_delete(client: httpx.AsyncClient) -> None:
+    link = await add_link(LinksForm(url="https://foxmask.org", tags="python"))
+    await add_link(LinksForm(text="a note", private=True))
+    await count()
+    response = await client.request(
+        "DELETE", "/api/v1/links", json={"url_hashed": [link.url_hashed, "unknown"]}
+    )
+    assert response.json()["links"] == [
+        {"status": "deleted", "id": link.id, "url_hashed": link.url_hashed},
+        {"status": "not_found", "url_hashed": "unknown"},
+    ]
+    assert await Links.all().count() == 1
+    assert await counters() == {ALL: 1, PUBLIC: 0, PRIVATE: 1}
+    assert await Tags.filter(name="python").values_list("count", flat=True) == [0]
+
+
+async def test_token(client: httpx.AsyncClient, monkeypatch: pytest.MonkeyPatch) -> None:
+    body = {"links": [{"url": "https://foxmask.org"}]}
+    for token in ("", "Bearer secret"):
+        response = await client.post("/api/v1/links", json=body, headers={"Authorization": token})
+        assert response.status_code == 401
+    # no anonymous writes
+    monkeypatch.setattr("sharelink.config.settings.API_TOKEN", "")
+    response = await client.post("/api/v1/links", json=body)
+    assert response.status_code == 403
+    assert (await client.get("/export")).status_code == 403
+    assert await Links.all().count() == 0
+
+
+async def test_hashes_of_other_processes(db: None, monkeypatch: pytest.MonkeyPatch) -> None:
+    # stored by another process, unknown by the allocator
+    text = "20240101_000000"
+    await Links.create(url="https://a.org", url_hashed=small_hash_sync(text))
+    bulk.allocator.load([])
+    hashes = bulk.allocator.allocate_many([text] * 2)
+    assert hashes == [small_hash_sync(text), small_hash_sync(f"{text}_1")]
+    # the first one gets the next suffix
+    assert await bulk.free_hashes([text] * 2, hashes) == [
+        small_hash_sync(f"{text}_2"),
+        small_hash_sync(f"{text}_1"),
+    ]
+
+    async def racing(texts: List[str], hashes: List[str]) -> List[str]:
+        # the other process stores a link once the hashes are checked
+        if not await Links.filter(url="https://b.org").exists():
+            await Links.create(url="https://b.org", url_hashed=hashes[0])
+        return await free_hashes(texts, hashes)
+
+    free_hashes = bulk.free_hashes
+    monkeypatch.setattr(bulk, "free_hashes", racing)
+    (result,) = await bulk.add_links([LinksForm(url="https://c.org")])
+    assert result.status == CREATED
+    assert result.url_hashed != await Links.get(url="https://b.org").values_list(
+        "url_hashed", flat=True
+    )
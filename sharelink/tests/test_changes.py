@@ -0,0 +1,74 @@
+# coding: utf-8
+"""
+2024 - ShareLink - 셰어 링크
+"""
+
+import httpx
+import pytest
+
+from sharelink.core.changes import CREATED, DELETED, UPDATED, get_changes, last_seq
+from sharelink.core.http_cache import get_version
+from sharelink.core.shaarli import import_links
+from sharelink.forms import LinksForm
+from sharelink.router.links import add_link, update_link
+
+pytestmark = pytest.mark.anyio
+
+
+async def operations(since: int = 0) -> list:
+    changes, _ = await get_changes(since, 100)
+    return [(change.operation, change.url_hashed) for change in changes]
+
+
+async def test_changes(client: httpx.AsyncClient) -> None:
+    link = await add_link(LinksForm(url="https://foxmask.org"))
+    # the version is bumped once by the write of its changes
+    version, _ = await get_version()
+    assert version == 1
+    await update_link(link.url_hashed, LinksForm(url="https://foxmask.org", title="Fox"))
+    await client.get(f"/delete/{link.id}")
+    assert await operations() == [
+        (CREATED, link.url_hashed),
+        (UPDATED, link.url_hashed),
+        (DELETED, link.url_hashed),
+    ]
+
+    seq = await last_seq()
+    response = await client.post("/api/v1/links", json={"links": [{"text": "a note"}]})
+    note = response.json()["links"][0]["url_hashed"]
+    await client.patch("/api/v1/links", json={"links": [{"url_hashed": note, "text": "a text"}]})
+    await client.request("DELETE", "/api/v1/links", json={"url_hashed": [note]})
+    assert await operations(seq) == [(CREATED, note), (UPDATED, note), (DELETED, note)]
+
+    seq = await last_seq()
+    parsed = {"url": "https://a.org", "title": "A", "text": "", "tags": "", "private": False}
+    await import_links(
+        [{**parsed, "image": None, "video": None, "date_created": link.date_created}]
+    )
+    assert [operation for operation, _ in await operations(seq)] == [CREATED]
+
+
+async def test_endpoint(client: httpx.AsyncClient) -> None:
+    first = await add_link(LinksForm(url="https://foxmask.org"))
+    second = await add_link(LinksForm(url="https://a.org", title="A"))
+    await client.get(f"/delete/{first.id}")
+
+    response = await client.get("/api/v1/changes", params={"limit": 2})
+    page = response.json()
+    assert [change["operation"] for change in page["changes"]] == [CREATED, CREATED]
+    # the links still existing
+    assert "link" not in page["changes"][0]
+    assert page["changes"][1]["link"]["title"] == "A"
+
+    response = await client.get("/api/v1/changes", params={"since": page["cursor"]})
+    page = response.json()
+    assert page["changes"] == [
+        {"seq": 3, "operation": DELETED, "link_id": first.id, "url_hashed": first.url_hashed}
+    ]
+    response = await client.get("/api/v1/changes", params={"since": page["cursor"]})
+    assert response.json() == {"changes": [], "cursor": 3}
+
+    # where a mirror made from the export starts from
+    response = await client.get("/export")
+    assert response.headers["X-Changes-Seq"] == "3"
+    assert second.url in response.text
@@ -14,10 +14,35 @@ def test_settings() -> None:
     assert isinstance(settings.SHARELINK_URL, str)
     assert isinstance(settings.SHARELINK_TZ, str)
     assert isinstance(settings.DATABASE_URL, str)
+    assert isinstance(settings.DB_POOL_MIN_SIZE, int)
+    assert isinstance(settings.DB_POOL_MAX_SIZE, int)
+    assert isinstance(settings.DB_SQLITE_JOURNAL_MODE, str)
+    assert isinstance(settings.DB_SQLITE_SYNCHRONOUS, str)
+    assert isinstance(settings.DB_SQLITE_BUSY_TIMEOUT, int)
     assert isinstance(settings.LANGUAGE_CODE, str)
     assert isinstance(settings.SECRET_KEY, str)
     assert isinstance(settings.LINKS_PER_PAGE, int)
     assert isinstance(settings.DAILY_PER_PAGE, int)
+    assert isinstance(settings.FEED_SIZE, int)
+    assert isinstance(settings.COUNTS_ESTIMATED, bool)
+    assert isinstance(settings.COUNTS_ESTIMATE_LIMIT, int)
+    assert isinstance(settings.SEARCH_RANKED_LIMIT, int)
+    assert isinstance(settings.CACHE_MAX_AGE, int)
+    assert isinstance(settings.RESPONSE_CACHE_SIZE, int)
+    assert isinstance(settings.RESPONSE_CACHE_TTL, int)
+    assert isinstance(settings.RESPONSE_CACHE_URL, str)
+    assert isinstance(settings.API_BATCH_SIZE, int)
+    assert isinstance(settings.API_TOKEN, str)
+    assert isinstance(settings.METADATA_FETCH, bool)
+    assert isinstance(settings.METADATA_TIMEOUT, float)
+    assert isinstance(settings.METADATA_CONNECTIONS, int)
+    assert isinstance(settings.METADATA_PER_HOST, int)
+    assert isinstance(settings.METADATA_CACHE_SIZE, int)
+    assert isinstance(settings.METADATA_CACHE_TTL, int)
+    assert isinstance(settings.JOBS_WORKERS, int)
+    assert isinstance(settings.JOBS_POLL_INTERVAL, float)
+    assert isinstance(settings.JOBS_BACKOFF, float)
+    assert isinstance(settings.JOBS_LEASE, int)
 
     assert isinstance(settings.SECRET_KEY, str)
     assert isinstance(settings.COOKIE_SAMESITE, str)
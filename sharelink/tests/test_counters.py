@@ -0,0 +1,91 @@
+# coding: utf-8
+"""
+2024 - ShareLink - 셰어 링크
+"""
+
+import asyncio
+from datetime import datetime, timezone
+
+import httpx
+import pytest
+from tortoise.queryset import QuerySet
+
+from sharelink.core import counters
+from sharelink.core.counters import (
+    ALL,
+    PRIVATE,
+    PUBLIC,
+    count_links,
+    link_counters,
+    links_counters,
+    reset_counters,
+)
+from sharelink.forms import LinksForm
+from sharelink.models import Counters, Links
+from sharelink.router.links import add_link, get_links, update_link
+from sharelink.router.links_priv_pub import get_links_private, get_links_public
+
+pytestmark = pytest.mark.anyio
+
+
+async def known() -> dict:
+    return dict(await Counters.all().values_list("name", "count"))
+
+
+def test_link_counters() -> None:
+    assert link_counters(True) == [ALL, PRIVATE]
+    date_created = datetime(2024, 4, 30, 23, 30, tzinfo=timezone.utc)
+    assert links_counters([(True, date_created), (False, date_created)], -1) == {
+        ALL: -2,
+        PRIVATE: -1,
+        PUBLIC: -1,
+    }
+
+
+async def test_counters(db: None) -> None:
+    link = await add_link(LinksForm(url="https://foxmask.org"))
+    # not known yet: counted on the first read
+    assert await known() == {}
+    assert (await get_links())[1] == 1
+    assert (await get_links_private())[1] == 0
+    assert (await get_links_public())[1] == 1
+
+    # then kept up to date
+    await add_link(LinksForm(text="a note", private=True))
+    await update_link(link.url_hashed, LinksForm(url="https://foxmask.org", private=True))
+    assert await known() == {ALL: 2, PRIVATE: 2, PUBLIC: 0}
+
+    await reset_counters()
+    assert await known() == {}
+    assert (await get_links_private())[1] == 2
+
+
+async def test_estimated(db: None, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr("sharelink.config.settings.COUNTS_ESTIMATED", True)
+    monkeypatch.setattr("sharelink.config.settings.COUNTS_ESTIMATE_LIMIT", 2)
+    for i in range(3):
+        await Links.create(url=f"https://{i}.org", url_hashed=str(i))
+
+    recounts = []
+    count = counters.recount
+
+    async def recount(name: str, query: QuerySet[Links]) -> int:
+        recounts.append(name)
+        return await count(name, query)
+
+    monkeypatch.setattr(counters, "recount", recount)
+    # the pages read at once count the links once
+    assert await asyncio.gather(*[count_links(ALL, Links.all()) for _ in range(3)]) == [2] * 3
+    await asyncio.gather(*counters._recounts.values())
+    assert recounts == [ALL]
+    assert await count_links(ALL, Links.all()) == 3
+
+
+async def test_pages(client: httpx.AsyncClient) -> None:
+    link = await add_link(LinksForm(url="https://foxmask.org"))
+    response = await client.get("/")
+    assert response.headers["X-Total-Count"] == "1"
+    await client.get(f"/delete/{link.id}")
+    response = await client.get("/")
+    assert response.headers["X-Total-Count"] == "0"
+    assert (await Counters.get(name=ALL)).count == 0
@@ -0,0 +1,145 @@
+# coding: utf-8
+"""
+2024 - ShareLink - 셰어 링크
+"""
+
+import xml.etree.ElementTree as ET
+from collections import Counter
+from datetime import date, datetime, timedelta, timezone
+
+import httpx
+import pytest
+from tortoise.transactions import in_transaction
+
+from sharelink.core.days import (
+    calendar_months,
+    count_days,
+    day_bounds,
+    link_day,
+    links_days,
+    next_day,
+    previous_day,
+    update_days,
+    year_counts,
+)
+from sharelink.forms import LinksForm
+from sharelink.models import Days, Links
+from sharelink.router.links import add_link, update_link
+from sharelink.router.links_daily import get_links_daily
+
+pytestmark = pytest.mark.anyio
+
+
+async def days() -> dict:
+    return {day: (count, public) for day, count, public in await Days.all().values_list()}
+
+
+def test_link_day() -> None:
+    # the day of the link in the timezone of the app (Europe/Paris)
+    date_created = datetime(2024, 4, 30, 23, 30, tzinfo=timezone.utc)
+    assert link_day(date_created) == date(2024, 5, 1)
+    assert links_days([(True, date_created), (False, date_created)]) == {
+        (date(2024, 5, 1), False): 1,
+        (date(2024, 5, 1), True): 1,
+    }
+
+
+async def test_days(db: None) -> None:
+    link = await add_link(LinksForm(url="https://foxmask.org"))
+    await add_link(LinksForm(text="a note", private=True))
+    today = link_day(link.date_created)
+    assert await days() == {today: (2, 1)}
+
+    await update_link(link.url_hashed, LinksForm(url="https://foxmask.org", private=True))
+    assert await days() == {today: (2, 0)}
+
+    await Links.filter(id=link.id).delete()
+    await count_days()
+    assert await days() == {today: (1, 0)}
+
+
+async def test_update_days(db: None) -> None:
+    day = date(2024, 5, 1)
+    # created meanwhile by another write, in the same transaction
+    async with in_transaction() as connection:
+        await Days.create(day=day, count=1, public_count=0, using_db=connection)
+        await update_days(Counter({(day, True): 2, (date(2024, 5, 2), False): 1}), connection)
+    assert await days() == {day: (3, 2), date(2024, 5, 2): (1, 0)}
+
+
+async def test_previous_next(db: None) -> None:
+    now = datetime.now(tz=timezone.utc)
+    for delta in (-10, -3, 0, 2):
+        await Links.create(
+            url=f"https://{delta}.org",
+            url_hashed=str(delta),
+            date_created=now + timedelta(days=delta),
+        )
+    assert await count_days() == 4
+
+    today = link_day(now)
+    assert await previous_day(today) == link_day(now - timedelta(days=3))
+    assert await next_day(today) == link_day(now + timedelta(days=2))
+    assert await previous_day(link_day(now - timedelta(days=10))) is None
+    assert await next_day(link_day(now + timedelta(days=2))) is None
+
+    daily = await get_links_daily(yesterday=link_day(now - timedelta(days=3)))
+    assert [link.url for link in daily["links"]] == ["https://-3.org"]
+    assert daily["previous_date"] == link_day(now - timedelta(days=10))
+    assert daily["next_date"] == today
+
+
+async def test_delete(client: httpx.AsyncClient) -> None:
+    link = await add_link(LinksForm(url="https://foxmask.org"))
+    await client.get(f"/delete/{link.id}")
+    # the day without links leaves the index
+    assert await days() == {}
+
+
+async def test_calendar(client: httpx.AsyncClient) -> None:
+    for day, url in ((date(2022, 3, 1), "https://a.org"), (date(2024, 5, 1), "https://b.org")):
+        await Links.create(url=url, url_hashed=url[8], date_created=day_bounds(day)[0])
+    await count_days()
+    assert await year_counts(2024) == {date(2024, 5, 1): 1}
+
+    months = calendar_months(2024, {date(2024, 5, 1): 1})
+    assert len(months) == 12
+    may, weeks = months[4]
+    assert may == date(2024, 5, 1)
+    days_of_may = {day: count for week in weeks for day, count in week}
+    assert days_of_may[date(2024, 5, 1)] == 1
+    assert days_of_may[date(2024, 5, 2)] == 0
+    # the days of april in the first week
+    assert days_of_may[date(2024, 4, 30)] is None
+
+    response = await client.get("/daily/calendar", params={"year": 2024})
+    assert response.status_code == 200
+    assert "yesterday=2024-05-01" in response.text
+    # the previous year having links
+    assert "year=2022" in response.text
+    assert "year=2025" not in response.text
+
+
+async def test_digest(client: httpx.AsyncClient) -> None:
+    now = datetime.now(tz=timezone.utc)
+    for delta, private in ((-2, False), (-2, True), (-1, True), (0, False)):
+        await Links.create(
+            url=f"https://{delta}-{private}.org",
+            url_hashed=f"{delta}{private}",
+            title=f"{delta} {private}",
+            private=private,
+            date_created=now + timedelta(days=delta),
+        )
+    await count_days()
+
+    response = await client.get("/daily/rss")
+    assert response.headers["Content-Type"].startswith("application/rss+xml")
+    channel = ET.fromstring(response.text).find("channel")
+    assert channel is not None
+    # the days before today having public links
+    items = channel.findall("item")
+    assert len(items) == 1
+    day = link_day(now - timedelta(days=2))
+    assert items[0].findtext("link", "").endswith(f"/daily?yesterday={day.isoformat()}")
+    assert "https://-2-False.org" in items[0].findtext("description", "")
+    assert "True" not in items[0].findtext("description", "")
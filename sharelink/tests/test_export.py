@@ -0,0 +1,68 @@
+# coding: utf-8
+"""
+2024 - ShareLink - 셰어 링크
+"""
+
+import csv
+import io
+import json
+
+import httpx
+import pytest
+
+from sharelink.core.export import CSV, FIELDS, JSONL, NETSCAPE, export_links
+from sharelink.core.shaarli import iter_links
+from sharelink.forms import LinksForm
+from sharelink.router.links import add_link
+
+pytestmark = pytest.mark.anyio
+
+
+async def export(format: str, chunk_size: int = 1) -> str:
+    return "".join([chunk async for chunk in export_links(format, chunk_size=chunk_size)])
+
+
+async def test_netscape(db: None) -> None:
+    link = await add_link(
+        LinksForm(url="https://foxmask.org", title='Fox & "co"', text="<DT> a\ntext", tags="py")
+    )
+    note = await add_link(LinksForm(text="a note", private=True))
+
+    # read back by the import
+    links = list(iter_links(io.StringIO(await export(NETSCAPE))))
+    assert [exported["url"] for exported in links] == [
+        "https://foxmask.org/",
+        f"http://localhost:8000/links/{note.url_hashed}",
+    ]
+    assert links[0]["title"] == 'Fox & "co"'
+    assert links[0]["text"] == "<DT> a\ntext"
+    assert links[0]["tags"] == "py"
+    assert not links[0]["private"]
+    assert links[0]["date_created"] == link.date_created.replace(microsecond=0)
+    assert links[1]["private"]
+
+
+async def test_jsonl_csv(db: None) -> None:
+    await add_link(LinksForm(url="https://foxmask.org", tags="py, blog"))
+    await add_link(LinksForm(text="a note"))
+
+    lines = (await export(JSONL)).splitlines()
+    assert [json.loads(line)["url"] for line in lines] == ["https://foxmask.org/", None]
+    assert list(json.loads(lines[0])) == FIELDS
+
+    rows = list(csv.DictReader(io.StringIO(await export(CSV))))
+    assert [row["tags"] for row in rows] == ["py, blog", ""]
+    assert rows[1]["text"] == "a note"
+
+
+async def test_endpoint(client: httpx.AsyncClient) -> None:
+    await add_link(LinksForm(url="https://foxmask.org"))
+    response = await client.get("/export", params={"format": CSV})
+    assert response.status_code == 200
+    assert response.headers["Content-Type"].startswith("text/csv")
+    assert response.headers["Content-Disposition"].endswith('.csv"')
+    assert "https://foxmask.org/" in response.text
+
+    response = await client.get("/export")
+    assert response.text.startswith("<!DOCTYPE NETSCAPE-Bookmark-file-1>")
+    assert (await client.get("/export", params={"format": "xml"})).status_code == 422
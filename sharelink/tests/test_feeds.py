@@ -0,0 +1,82 @@
+# coding: utf-8
+"""
+2024 - ShareLink - 셰어 링크
+"""
+
+import xml.etree.ElementTree as ET
+
+import httpx
+import pytest
+
+from sharelink.core.feeds import ATOM, RSS, build_feed, feed_version
+from sharelink.forms import LinksForm
+from sharelink.models import Links
+from sharelink.router.links import add_link, update_link
+
+pytestmark = pytest.mark.anyio
+
+ATOM_NS = {"atom": "http://www.w3.org/2005/Atom"}
+
+
+async def test_rss(db: None) -> None:
+    link = await add_link(LinksForm(url="https://foxmask.org", title="Fox & co", text="*fox*"))
+    await add_link(LinksForm(text="a secret note", private=True))
+    # rendered when saved
+    assert (await Links.get(id=link.id)).feed_version == feed_version()
+
+    channel = ET.fromstring(await build_feed(RSS, "/feeds")).find("channel")
+    assert channel is not None
+    items = channel.findall("item")
+    assert len(items) == 1
+    assert items[0].findtext("title") == "Fox & co"
+    assert items[0].findtext("link") == "https://foxmask.org/"
+    assert items[0].findtext("description") == "<p><em>fox</em></p>"
+    assert items[0].findtext("guid", "").endswith(f"/links/{link.url_hashed}")
+
+
+async def test_atom(db: None) -> None:
+    link = await add_link(LinksForm(text="a note", tags="python, blog"))
+    await add_link(LinksForm(url="https://foxmask.org", tags="blog"))
+
+    feed = ET.fromstring(await build_feed(ATOM, "/feeds/atom"))
+    entries = feed.findall("atom:entry", ATOM_NS)
+    assert len(entries) == 2
+    assert entries[1].findtext("atom:id", namespaces=ATOM_NS).endswith(link.url_hashed)
+    terms = [c.get("term") for c in entries[1].findall("atom:category", ATOM_NS)]
+    assert terms == ["python", "blog"]
+
+    feed = ET.fromstring(await build_feed(ATOM, "/feeds/tag/python/atom", tag="python"))
+    assert len(feed.findall("atom:entry", ATOM_NS)) == 1
+
+    # the link changes, and its items
+    await update_link(link.url_hashed, LinksForm(text="a note", tags="blog"))
+    feed = ET.fromstring(await build_feed(ATOM, "/feeds/tag/python/atom", tag="python"))
+    assert feed.findall("atom:entry", ATOM_NS) == []
+
+
+async def test_rendered_when_read(db: None) -> None:
+    # imported, or rendered by an older version
+    await Links.create(url="https://a.org", url_hashed="a", title="A")
+    await Links.create(url="https://b.org", url_hashed="b", title="B", feed_version="0")
+    channel = ET.fromstring(await build_feed(RSS, "/feeds")).find("channel")
+    assert channel is not None
+    assert [item.findtext("title") for item in channel.findall("item")] == ["B", "A"]
+    assert set(await Links.all().values_list("feed_version", flat=True)) == {feed_version()}
+
+
+async def test_endpoints(client: httpx.AsyncClient) -> None:
+    await add_link(LinksForm(url="https://foxmask.org", tags="python"))
+    for url, media_type in (
+        ("/feeds", "application/rss+xml"),
+        ("/feeds/atom", "application/atom+xml"),
+        ("/feeds/tag/python", "application/rss+xml"),
+        ("/feeds/tag/python/atom", "application/atom+xml"),
+    ):
+        response = await client.get(url)
+        assert response.status_code == 200
+        assert response.headers["Content-Type"].startswith(media_type)
+        assert response.headers["Cache-Control"].startswith("public")
+        assert "foxmask.org" in response.text
+        response = await client.get(url, headers={"If-None-Match": response.headers["ETag"]})
+        assert response.status_code == 304
+    assert (await client.get("/feeds")).headers["X-Cache"] == "HIT"
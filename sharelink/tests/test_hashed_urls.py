@@ -0,0 +1,67 @@
+# coding: utf-8
+"""
+2024 - ShareLink - 셰어 링크
+"""
+
+import asyncio
+from datetime import datetime
+
+from hypothesis import given, strategies as st
+
+from sharelink.core.hashed_urls import (
+    HashAllocator,
+    crc,
+    crc_bitwise,
+    crc_that,
+    encode_hash,
+    small_hash,
+    small_hash_sync,
+    small_hashes,
+)
+
+
+@given(st.text())
+def test_crc_same_as_bitwise(text: str) -> None:
+    assert crc(text) == crc_bitwise(text)
+
+
+@given(st.datetimes())
+def test_small_hash_of_dates(date_created: datetime) -> None:
+    to_hash = date_created.strftime("%Y%m%d_%H%M%S")
+    assert small_hash_sync(to_hash) == encode_hash(crc_bitwise(to_hash))
+
+
+def test_small_hash() -> None:
+    assert asyncio.run(small_hash("20111006_131924")) == "yZH23w"
+    assert asyncio.run(crc_that("20111006_131924")) == crc_bitwise("20111006_131924")
+
+
+def test_small_hashes() -> None:
+    texts = ["20111006_131924", "20241231_235959", ""]
+    assert small_hashes(texts) == [small_hash_sync(text) for text in texts]
+    assert small_hashes([]) == []
+
+
+def test_allocator_same_second() -> None:
+    allocator = HashAllocator()
+    first = allocator.allocate("20111006_131924")
+    second = allocator.allocate("20111006_131924")
+    assert first == "yZH23w"
+    assert second == small_hash_sync("20111006_131924_1")
+    assert first in allocator and second in allocator
+
+
+def test_allocator_preloaded() -> None:
+    allocator = HashAllocator()
+    allocator.load(["yZH23w", small_hash_sync("20111006_131924_1")])
+    assert allocator.loaded
+    assert allocator.allocate("20111006_131924") == small_hash_sync("20111006_131924_2")
+
+
+def test_allocator_many_and_release() -> None:
+    allocator = HashAllocator()
+    hashes = allocator.allocate_many(["20111006_131924"] * 100)
+    assert len(set(hashes)) == 100
+    assert len(allocator) == 100
+    allocator.release("yZH23w")
+    assert allocator.allocate("20111006_131924") == "yZH23w"
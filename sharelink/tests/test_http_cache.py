@@ -0,0 +1,112 @@
+# coding: utf-8
+"""
+2024 - ShareLink - 셰어 링크
+"""
+
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+import httpx
+import pytest
+
+from sharelink.core.http_cache import LINKS, get_version, page_scope, touch
+from sharelink.forms import LinksForm
+from sharelink.models import Versions
+from sharelink.router.links import add_link, update_link
+
+pytestmark = pytest.mark.anyio
+
+
+def test_page_scope() -> None:
+    assert page_scope("/") == "private"
+    assert page_scope("/public") == "public"
+    # the tags of the private links
+    assert page_scope("/tags") == "private"
+    assert page_scope("/links/abc") == "private"
+    assert page_scope("/newlinks/") is None
+    assert page_scope("/edit/abc") is None
+
+
+async def test_version(db: None) -> None:
+    version, _ = await get_version()
+    assert version == 0
+    await touch()
+    link = await add_link(LinksForm(url="https://foxmask.org"))
+    await update_link(link.url_hashed, LinksForm(url="https://foxmask.org", title="Fox"))
+    assert (await get_version())[0] == 3
+
+
+async def test_not_modified(client: httpx.AsyncClient) -> None:
+    link = await add_link(LinksForm(url="https://foxmask.org"))
+    response = await client.get("/")
+    assert response.status_code == 200
+    assert response.headers["Cache-Control"] == "private, no-cache"
+    etag = response.headers["ETag"]
+
+    response = await client.get("/", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+    assert not response.content
+    # the hosts not allowed are not answered
+    response = await client.get("/", headers={"If-None-Match": etag, "Host": "evil.org"})
+    assert response.status_code == 400
+    # another page, or the same one with other parameters
+    assert (
+        await client.get("/", params={"limit": 2}, headers={"If-None-Match": etag})
+    ).status_code == 200
+    response = await client.get("/public", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["Cache-Control"].startswith("public, max-age=")
+
+    # a write changes the ETag of all the pages
+    await update_link(link.url_hashed, LinksForm(url="https://foxmask.org", title="Fox"))
+    response = await client.get("/", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert "Fox" in response.text
+
+    # the deletion too
+    etag = response.headers["ETag"]
+    await client.get(f"/delete/{link.id}")
+    assert (await client.get("/", headers={"If-None-Match": etag})).status_code == 200
+
+
+async def test_if_modified_since(client: httpx.AsyncClient) -> None:
+    await add_link(LinksForm(url="https://foxmask.org"))
+    # the page read during the second of the last write has no date
+    now = datetime.now(tz=timezone.utc)
+    await Versions.filter(name=LINKS).update(date_modified=now + timedelta(seconds=5))
+    assert "Last-Modified" not in (await client.get("/tags")).headers
+
+    await Versions.filter(name=LINKS).update(date_modified=now - timedelta(seconds=5))
+    response = await client.get("/tags")
+    last_modified = response.headers["Last-Modified"]
+    response = await client.get("/tags", headers={"If-Modified-Since": last_modified})
+    assert response.status_code == 304
+    # the date of a write is the next second
+    await touch()
+    response = await client.get("/tags", headers={"If-Modified-Since": last_modified})
+    assert response.status_code == 200
+
+    before = format_datetime(datetime.now(tz=timezone.utc) - timedelta(days=2), usegmt=True)
+    response = await client.get("/tags", headers={"If-Modified-Since": before})
+    assert response.status_code == 200
+
+
+async def test_accept(client: httpx.AsyncClient) -> None:
+    response = await client.get("/tags")
+    etag = response.headers["ETag"]
+    assert response.headers["Vary"] == "Accept"
+    # the same page, as JSON
+    headers = {"If-None-Match": etag, "Accept": "application/json"}
+    response = await client.get("/tags", headers=headers)
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+
+async def test_not_cached(client: httpx.AsyncClient) -> None:
+    response = await client.get("/newlinks/")
+    assert "ETag" not in response.headers
+    response = await client.get("/links/nope")
+    assert response.status_code == 404
+    assert "ETag" not in response.headers
@@ -0,0 +1,134 @@
+# coding: utf-8
+"""
+2024 - ShareLink - 셰어 링크
+"""
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from sharelink.core.jobs import FAILED, PENDING, RUNNING, JobQueue, enqueue, register
+from sharelink.models import Jobs
+
+pytestmark = pytest.mark.anyio
+
+done: list = []
+running = {"now": 0, "max": 0}
+
+
+@register("test-echo")
+async def echo(value: str) -> None:
+    done.append(value)
+
+
+@register("test-fail", attempts=2)
+async def fail(value: str) -> None:
+    raise ValueError(value)
+
+
+@register("test-slow", concurrency=2)
+async def slow(value: int) -> None:
+    running["now"] += 1
+    running["max"] = max(running["max"], running["now"])
+    await asyncio.sleep(0.05)
+    running["now"] -= 1
+    done.append(value)
+
+
+@pytest.fixture(autouse=True)
+def reset() -> None:
+    done.clear()
+    running.update(now=0, max=0)
+
+
+def make_queue(workers: int = 1) -> JobQueue:
+    return JobQueue(workers=workers, poll_interval=0.05, lease=60, backoff=10)
+
+
+async def test_run(db: None) -> None:
+    await enqueue("test-echo", value="a")
+    await enqueue("test-echo", value="b")
+    assert await make_queue().run_pending() == 2
+    assert done == ["a", "b"]
+    # done, forgotten
+    assert await Jobs.all().count() == 0
+
+
+async def test_retry(db: None) -> None:
+    job = await enqueue("test-fail", value="oops")
+    queue = make_queue()
+    assert await queue.run_pending() == 1
+    job = await Jobs.get(id=job.id)
+    assert (job.status, job.attempts) == (PENDING, 1)
+    assert job.error == "ValueError('oops')"
+    # run again later
+    assert job.run_at > datetime.now(tz=timezone.utc) + timedelta(seconds=5)
+    assert await queue.run_pending() == 0
+
+    await Jobs.filter(id=job.id).update(run_at=datetime.now(tz=timezone.utc))
+    assert await queue.run_pending() == 1
+    job = await Jobs.get(id=job.id)
+    assert (job.status, job.attempts) == (FAILED, 2)
+    await Jobs.filter(id=job.id).update(run_at=datetime.now(tz=timezone.utc))
+    assert await queue.run_pending() == 0
+
+
+async def test_lease(db: None) -> None:
+    # taken by a worker stopped meanwhile
+    past = datetime.now(tz=timezone.utc) - timedelta(seconds=1)
+    await Jobs.create(
+        kind="test-echo", payload={"value": "a"}, status=RUNNING, attempts=1, run_at=past
+    )
+    await Jobs.create(
+        kind="test-echo",
+        payload={"value": "b"},
+        status=RUNNING,
+        attempts=1,
+        run_at=past + timedelta(hours=1),
+    )
+    assert await make_queue().run_pending() == 1
+    assert done == ["a"]
+
+
+async def test_workers(db: None) -> None:
+    queue = make_queue(workers=4)
+    queue.start()
+    try:
+        for value in range(6):
+            await enqueue("test-slow", value=value)
+        async with asyncio.timeout(5):
+            while len(done) < 6:
+                await asyncio.sleep(0.01)
+    finally:
+        await queue.stop()
+    assert sorted(done) == list(range(6))
+    # the concurrency of the kind, whatever the number of workers
+    assert running["max"] == 2
+    assert await Jobs.all().count() == 0
+
+
+async def test_worker_errors(db: None, monkeypatch: pytest.MonkeyPatch) -> None:
+    queue = make_queue()
+    claim = queue.claim
+    errors = []
+
+    async def busy() -> Jobs | None:
+        # the database busy for a while
+        if len(errors) < 2:
+            errors.append(1)
+            raise OSError("database is locked")
+        return await claim()
+
+    monkeypatch.setattr(queue, "claim", busy)
+    await enqueue("test-echo", value="a")
+    queue.start()
+    try:
+        async with asyncio.timeout(5):
+            while not done:
+                await asyncio.sleep(0.01)
+    finally:
+        await queue.stop()
+    # the worker went on
+    assert done == ["a"]
+    assert len(errors) == 2
@@ -0,0 +1,83 @@
+# coding: utf-8
+"""
+2024 - ShareLink - 셰어 링크
+"""
+
+from datetime import datetime, timedelta, timezone
+
+import httpx
+import pytest
+from fastapi import HTTPException
+
+from sharelink.core.days import count_days
+from sharelink.forms import LinksForm
+from sharelink.models import Links, Tags
+from sharelink.router.links import add_link, get_links, update_link
+from sharelink.router.links_daily import get_links_daily
+from sharelink.router.links_priv_pub import get_links_private, get_links_public
+from sharelink.router.tags import get_links_by_tag
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_add_update_link(db: None) -> None:
+    link = await add_link(LinksForm(url="https://foxmask.org", tags="python,blog"))
+    other = await add_link(LinksForm(text="a note", private=True))
+    assert link.url_hashed != other.url_hashed
+    assert other.url is None
+
+    links, count = await get_links()
+    assert count == 2
+    assert {link.id for link in links} == {link.id, other.id}
+
+    link = await update_link(link.url_hashed, LinksForm(url="https://foxmask.org", title="Fox"))
+    assert (await Links.get(id=link.id)).title == "Fox"
+    # the link of an URL already saved
+    assert (await add_link(LinksForm(url="https://foxmask.org"))).id == link.id
+    with pytest.raises(HTTPException):
+        await update_link("missing", LinksForm(url="https://a.org"))
+
+
+async def test_private_public_tags(db: None) -> None:
+    await add_link(LinksForm(url="https://foxmask.org", tags="python,blog"))
+    await add_link(LinksForm(text="a note", private=True))
+
+    links, count = await get_links_private()
+    assert count == 1 and links[0].text_excerpt == "a note"
+    links, count = await get_links_public()
+    assert count == 1 and links[0].url == "https://foxmask.org/"
+    links, count = await get_links_by_tag(tag="python")
+    assert count == 1 and links[0].url == "https://foxmask.org/"
+    links, count = await get_links_by_tag(tag="0Tag")
+    assert count == 1 and links[0].text_excerpt == "a note"
+
+
+async def test_daily(db: None) -> None:
+    now = datetime.now(tz=timezone.utc)
+    for days, url in ((-3, "https://a.org"), (0, "https://b.org"), (2, "https://c.org")):
+        await Links.create(url=url, url_hashed=url[8], date_created=now + timedelta(days=days))
+    # created without the app, as by an older version
+    await count_days()
+    daily = await get_links_daily()
+    assert [link.url for link in daily["links"]] == ["https://b.org"]
+    assert daily["previous_date"] < daily["current_date"] < daily["next_date"]
+
+
+async def test_pages(client: httpx.AsyncClient) -> None:
+    link = await add_link(LinksForm(url="https://foxmask.org", tags="python"))
+    for url in ("/", "/private", "/public", "/tags", "/links_by_tag/python", "/daily"):
+        response = await client.get(url)
+        assert response.status_code == 200, url
+    response = await client.get("/")
+    assert response.headers["X-Total-Count"] == "1"
+    assert "https://foxmask.org/" in response.text
+    response = await client.get("/status/db")
+    assert response.json()["dialect"] == "sqlite"
+    response = await client.get("/status/db", headers={"Authorization": ""})
+    assert response.status_code == 401
+    response = await client.get(f"/links/{link.url_hashed}")
+    assert response.status_code == 200
+    response = await client.get(f"/delete/{link.id}")
+    assert response.status_code == 303
+    assert await Links.all().count() == 0
+    assert (await Tags.get(name="python")).count == 0
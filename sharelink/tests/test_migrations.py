@@ -0,0 +1,120 @@
+# coding: utf-8
+"""
+2024 - ShareLink - 셰어 링크
+"""
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from tortoise import connections
+from tortoise.expressions import Q, Subquery
+from tortoise.queryset import QuerySet
+
+from sharelink.core.migrations import LOCK, MIGRATIONS, migrate, utc_dates
+from sharelink.core.tags import get_tags_count
+from sharelink.models import Links, LinksTags, Migrations
+
+pytestmark = pytest.mark.anyio
+
+
+async def plan(query: QuerySet) -> str:
+    """
+    the EXPLAIN QUERY PLAN of a query, on one line
+    """
+    # QuerySet.explain() loses the parameters of the subqueries
+    query._choose_db_if_not_chosen()
+    query._make_query()
+    sql, params = query.query.get_parameterized_sql()
+    _, rows = await connections.get("default").execute_query(f"EXPLAIN QUERY PLAN {sql}", params)
+    return " / ".join(row["detail"] for row in rows)
+
+
+async def indexes() -> set[str]:
+    _, rows = await connections.get("default").execute_query("PRAGMA index_list('links')")
+    return {row["name"] for row in rows if row["name"].startswith("idx_")}
+
+
+async def test_migrate(db: None) -> None:
+    created = await indexes()
+    assert len(created) == 2
+    # a database created before the indexes
+    for name in created:
+        await connections.get("default").execute_script(f'DROP INDEX "{name}"')
+    assert await indexes() == set()
+
+    assert await migrate() == [name for name, _ in MIGRATIONS]
+    assert await Migrations.filter(name="0001_links_indexes").exists()
+    assert await indexes() == created
+    # nothing to do the next time
+    assert await migrate() == []
+
+
+async def test_migrate_workers(db: None) -> None:
+    # the workers started at once on a new database
+    results = await asyncio.gather(migrate(), migrate(), migrate())
+    assert sorted(results) == [[], [], [name for name, _ in MIGRATIONS]]
+    assert not await Migrations.filter(name=LOCK).exists()
+
+    # the lock of a worker stopped while migrating
+    await Migrations.filter(name=MIGRATIONS[-1][0]).delete()
+    await Migrations.create(name=LOCK, date_applied=datetime(2024, 1, 1, tzinfo=timezone.utc))
+    assert await migrate() == [MIGRATIONS[-1][0]]
+
+
+async def test_migrate_tags_count(db: None) -> None:
+    await Links.create(url="https://python.org", url_hashed="a", tags="python")
+    await Links.create(url="https://foxmask.org", url_hashed="b")
+    # a database created before Tags.count
+    await connections.get("default").execute_script("ALTER TABLE tags DROP COLUMN count")
+    await Migrations.create(name="0001_links_indexes")
+    await Migrations.create(name="0002_links_tags")
+
+    assert await migrate() == [name for name, _ in MIGRATIONS[2:]]
+    assert await get_tags_count() == {"0Tag": 1, "python": 1}
+
+
+async def test_utc_dates(db: None) -> None:
+    connection = connections.get("default")
+    link = await Links.create(url="https://python.org", url_hashed="a")
+    # a date stored in the timezone of the app
+    await connection.execute_query(
+        "UPDATE links SET date_created = ? WHERE id = ?", ["2024-05-01 02:00:00+02:00", link.id]
+    )
+    await utc_dates(connection)
+    _, rows = await connection.execute_query("SELECT date_created FROM links")
+    assert rows[0]["date_created"] == "2024-05-01 00:00:00+00:00"
+
+
+async def test_indexes_used(db: None) -> None:
+    home = await plan(Links.all().order_by("-date_created").offset(10).limit(5))
+    assert "USING INDEX idx_links_date_cr" in home
+    assert "TEMP B-TREE" not in home
+
+    for private in (True, False):
+        query = Links.filter(private=private).order_by("-date_created").limit(5)
+        detail = await plan(query)
+        assert "USING INDEX idx_links_private" in detail
+        assert "TEMP B-TREE" not in detail
+
+    links_ids = LinksTags.filter(tag_id__in=[1]).values("link_id")
+    tag = await plan(Links.filter(id__in=Subquery(links_ids)).order_by("-date_created").limit(5))
+    assert "SEARCH links_tags USING COVERING INDEX idx_links_tags_tag_id" in tag
+    assert "SCAN" not in tag
+
+    # the next page of a list given by a cursor
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    after = await plan(
+        Links.filter(private=True, date_created__lte=start)
+        .filter(Q(date_created__lt=start) | Q(id__lt=10))
+        .order_by("-date_created", "-id")
+        .limit(5)
+    )
+    assert "SEARCH links USING INDEX idx_links_private" in after
+    assert "TEMP B-TREE" not in after
+
+    end = start + timedelta(days=1)
+    daily = await plan(
+        Links.filter(date_created__gte=start, date_created__lt=end).order_by("-date_created")
+    )
+    assert "SEARCH links USING INDEX idx_links_date_cr" in daily
@@ -0,0 +1,86 @@
+# coding: utf-8
+"""
+2024 - ShareLink - 셰어 링크
+"""
+
+from datetime import datetime, timedelta, timezone
+
+import httpx
+import pytest
+
+from sharelink.core.pagination import decode_cursor, encode_cursor, paginate
+from sharelink.models import Links
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def links(db: None) -> list[Links]:
+    """
+    7 links, the newest first, two of them created at the same time
+    """
+    now = datetime(2024, 5, 1, tzinfo=timezone.utc)
+    dates = [now - timedelta(hours=hours) for hours in (0, 1, 2, 2, 3, 4, 5)]
+    for i, date_created in enumerate(reversed(dates)):
+        await Links.create(
+            url=f"https://{i}.org",
+            url_hashed=str(i),
+            text="",
+            private=i % 2,
+            date_created=date_created,
+        )
+    return await Links.all().order_by("-date_created", "-id")
+
+
+async def test_cursor(links: list[Links]) -> None:
+    date_created, link_id = decode_cursor(encode_cursor(links[0]))
+    assert date_created == links[0].date_created and link_id == links[0].id
+    with pytest.raises(ValueError):
+        decode_cursor("nope")
+
+
+async def test_paginate(links: list[Links]) -> None:
+    ids = [link.id for link in links]
+    first = await paginate(Links.all(), limit=3)
+    assert [link.id for link in first] == ids[:3]
+    assert first.next_cursor and first.prev_cursor is None
+
+    # the links created at the same time are not skipped nor repeated
+    second = await paginate(Links.all(), limit=3, after=first.next_cursor)
+    assert [link.id for link in second] == ids[3:6]
+    last = await paginate(Links.all(), limit=3, after=second.next_cursor)
+    assert [link.id for link in last] == ids[6:]
+    assert last.next_cursor is None
+
+    # back to the previous pages
+    previous = await paginate(Links.all(), limit=3, before=last.prev_cursor)
+    assert [link.id for link in previous] == ids[3:6]
+    assert previous.next_cursor == second.next_cursor
+    previous = await paginate(Links.all(), limit=3, before=previous.prev_cursor)
+    assert [link.id for link in previous] == ids[:3]
+    assert previous.prev_cursor is None
+
+    # the same page by offset
+    page = await paginate(Links.all(), offset=3, limit=3)
+    assert [link.id for link in page] == ids[3:6]
+    assert page.prev_cursor == second.prev_cursor
+
+
+async def test_pages(links: list[Links], client: httpx.AsyncClient) -> None:
+    response = await client.get("/", params={"limit": 4})
+    assert response.headers["X-Total-Count"] == "7"
+    assert "X-Prev-Cursor" not in response.headers
+    response = await client.get(
+        "/", params={"limit": 4, "after": response.headers["X-Next-Cursor"]}
+    )
+    assert response.status_code == 200
+    assert "X-Next-Cursor" not in response.headers
+    assert f"before={response.headers['X-Prev-Cursor']}" in response.text
+
+    response = await client.get("/private", params={"limit": 2})
+    response = await client.get("/private", params={"after": response.headers["X-Next-Cursor"]})
+    assert response.status_code == 200
+    assert "https://1.org" in response.text
+
+    response = await client.get("/public", params={"after": "nope"})
+    assert response.status_code == 422
@@ -0,0 +1,120 @@
+# coding: utf-8
+"""
+2024 - ShareLink - 셰어 링크
+"""
+
+import httpx
+import markdown
+import pytest
+
+from sharelink.core.render import (
+    EXTENSIONS,
+    RENDERER_VERSION,
+    TEXT_LENGTH,
+    convert,
+    excerpt,
+    get_renderer,
+    link_html,
+    render_all,
+    render_links,
+    render_markdown,
+    render_rows,
+)
+from sharelink.core.rows import LinkRow, fetch_rows
+from sharelink.forms import LinksForm
+from sharelink.models import Links
+from sharelink.router.links import add_link, get_links, update_link
+
+pytestmark = pytest.mark.anyio
+
+
+def test_render_markdown() -> None:
+    assert render_markdown("*fox*") == "<p><em>fox</em></p>"
+    assert "codehilite" in render_markdown("```python\nimport this\n```")
+    hits = render_markdown.cache_info().hits
+    render_markdown("*fox*")
+    assert render_markdown.cache_info().hits == hits + 1
+
+
+def test_convert() -> None:
+    renderer = get_renderer()
+    for text in ("a note[^1]\n\n[^1]: a footnote", "another one[^1]\n\n[^1]: the same"):
+        assert convert(text) == markdown.markdown(text, extensions=EXTENSIONS)
+    # the renderer is reused
+    assert get_renderer() is renderer
+
+
+def test_excerpt() -> None:
+    assert excerpt(None) == ""
+    assert excerpt("word " * 200).endswith("...")
+    assert len(excerpt("word " * 200)) <= TEXT_LENGTH
+
+
+async def test_rendered_when_saved(db: None) -> None:
+    link = await add_link(LinksForm(text="a *note*"))
+    link = await Links.get(id=link.id)
+    assert link.text_html == "<p>a <em>note</em></p>"
+    assert link.text_html_version == RENDERER_VERSION
+
+    await update_link(link.url_hashed, LinksForm(text="an **updated** note"))
+    link = await Links.get(id=link.id)
+    assert link.text_html == "<p>an <strong>updated</strong> note</p>"
+
+
+async def test_rendered_when_displayed(db: None) -> None:
+    # imported, or rendered by an older version
+    await Links.create(url="https://a.org", url_hashed="a", text="*a*")
+    await Links.create(
+        url="https://b.org", url_hashed="b", text="*b*", text_html="old", text_html_version="0"
+    )
+    link = await Links.get(url_hashed="b")
+    assert link_html(link) == "<p><em>b</em></p>"
+
+    await get_links()
+    assert set(await Links.all().values_list("text_html_version", flat=True)) == {RENDERER_VERSION}
+    link = await Links.get(url_hashed="b")
+    assert link.text_html == "<p><em>b</em></p>"
+    # nothing to do the next time
+    await render_links([link])
+
+
+async def test_rows(db: None) -> None:
+    link = await add_link(LinksForm(text="a *note* " * 100))
+    assert link.text_excerpt == excerpt(link.text)
+    # the lists do not read the whole text
+    links, _ = await get_links()
+    assert isinstance(links[0], LinkRow)
+    assert not hasattr(links[0], "text")
+    assert link_html(links[0]) == link.text_html
+
+    # imported, or rendered before text_excerpt: the text is read once
+    await Links.create(url="https://a.org", url_hashed="a", text="*a*")
+    await Links.filter(id=link.id).update(text_html_version="0")
+    rows = await render_rows(await fetch_rows(Links.all().order_by("id")))
+    assert [row.text_html for row in rows] == [link.text_html, "<p><em>a</em></p>"]
+    assert await Links.get(url_hashed="a").values_list("text_excerpt", flat=True) == "*a*"
+    assert set(await Links.all().values_list("text_html_version", flat=True)) == {RENDERER_VERSION}
+
+
+async def test_render_all(db: None) -> None:
+    for i in range(5):
+        await Links.create(url=f"https://{i}.org", url_hashed=str(i), text=f"*{i}*")
+    await Links.filter(url_hashed="0").update(
+        text_html="<p><em>0</em></p>", text_html_version=RENDERER_VERSION
+    )
+    progress = []
+    assert await render_all(workers=1, batch_size=2, progress=progress.append) == 4
+    assert progress == [2, 4]
+    assert (
+        await Links.get(url_hashed="4").values_list("text_html", flat=True) == "<p><em>4</em></p>"
+    )
+    assert await Links.get(url_hashed="4").values_list("text_excerpt", flat=True) == "*4*"
+    assert await render_all(workers=1) == 0
+    assert await render_all(workers=2, batch_size=1, everything=True) == 5
+
+
+async def test_pages(client: httpx.AsyncClient) -> None:
+    link = await add_link(LinksForm(text="a *note*"))
+    for url in ("/", f"/links/{link.url_hashed}"):
+        response = await client.get(url)
+        assert "<p>a <em>note</em></p>" in response.text
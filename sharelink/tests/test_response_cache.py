@@ -0,0 +1,132 @@
+# coding: utf-8
+"""
+2024 - ShareLink - 셰어 링크
+"""
+
+from datetime import datetime, timezone
+
+import httpx
+import pytest
+
+from sharelink.core import response_cache
+from sharelink.core.response_cache import (
+    CachedResponse,
+    MemoryStore,
+    ResponseCache,
+    link_keys,
+)
+from sharelink.forms import LinksForm
+from sharelink.router.links import add_link, update_link
+
+pytestmark = pytest.mark.anyio
+
+
+def test_link_keys() -> None:
+    date_created = datetime(2024, 4, 30, 23, 30, tzinfo=timezone.utc)
+    assert link_keys(True, date_created, "python, blog", "abc") == {
+        "all",
+        "private",
+        "tags",
+        "day:2024-05-01",
+        "link:abc",
+        "tag:python",
+        "tag:blog",
+    }
+    assert "tag:0Tag" in link_keys(False, date_created, "", "abc")
+
+
+async def test_memory_store(monkeypatch: pytest.MonkeyPatch) -> None:
+    store = MemoryStore(size=2)
+    await store.set("a", b"1")
+    await store.set("b", b"2")
+    await store.mget(["a"])
+    await store.set("c", b"3")
+    # b was the least recently used
+    assert await store.mget(["a", "b", "c"]) == [b"1", None, b"3"]
+
+    await store.set("d", b"4", ex=10)
+    monkeypatch.setattr("time.monotonic", lambda: float("inf"))
+    assert await store.mget(["d"]) == [None]
+    assert await store.incr("n") == 1
+    assert await store.mget(["n"]) == [b"1"]
+
+
+async def test_memory_store_counters() -> None:
+    store = MemoryStore(size=1, counters=2)
+    assert [await store.incr(key) for key in ("a", "a", "b")] == [1, 2, 1]
+    # a and b are forgotten
+    assert await store.incr("c") == 3
+    assert await store.mget(["a", "b", "c"]) == [None, None, b"3"]
+    assert await store.incr("a") == 3
+    assert len(store._counters) == 2
+
+
+async def test_invalidate() -> None:
+    cache = ResponseCache(MemoryStore(size=10), ttl=60)
+    page = CachedResponse(200, [("content-type", "text/html")], b"<p>fox</p>")
+
+    cached, generations = await cache.get("/", ["all"])
+    assert cached is None
+    await cache.set("/", page, generations)
+    await cache.set("/tags", page, (await cache.get("/tags", ["tags"]))[1])
+    assert (await cache.get("/", ["all"]))[0] == page
+
+    await cache.invalidate(["all"])
+    assert (await cache.get("/", ["all"]))[0] is None
+    assert (await cache.get("/tags", ["tags"]))[0] == page
+    await cache.clear()
+    assert (await cache.get("/tags", ["tags"]))[0] is None
+
+    # rendered while a link was written: not kept
+    _, generations = await cache.get("/", ["all"])
+    await cache.invalidate(["all"])
+    await cache.set("/", page, generations)
+    assert (await cache.get("/", ["all"]))[0] is None
+
+    # the generations forgotten by the store
+    cache = ResponseCache(MemoryStore(size=10, counters=2), ttl=60)
+    await cache.set("/", page, (await cache.get("/", ["all"]))[1])
+    for key in ("a", "b", "c"):
+        await cache.invalidate([key])
+    assert (await cache.get("/", ["all"]))[0] is None
+
+
+async def test_pages(client: httpx.AsyncClient) -> None:
+    link = await add_link(LinksForm(url="https://foxmask.org", tags="python"))
+    private = await add_link(LinksForm(text="a note", private=True))
+
+    assert (await client.get("/public")).headers["X-Cache"] == "MISS"
+    response = await client.get("/public")
+    assert response.headers["X-Cache"] == "HIT"
+    assert "foxmask.org" in response.text
+    assert response.headers["X-Total-Count"] == "1"
+    for url in ("/", "/tags", "/links_by_tag/python", f"/links/{link.url_hashed}"):
+        await client.get(url)
+        assert (await client.get(url)).headers["X-Cache"] == "HIT"
+
+    # a private link does not change the public pages
+    await update_link(private.url_hashed, LinksForm(text="another note", private=True))
+    assert (await client.get("/public")).headers["X-Cache"] == "HIT"
+    assert (await client.get("/links_by_tag/python")).headers["X-Cache"] == "HIT"
+    response = await client.get("/")
+    assert response.headers["X-Cache"] == "MISS"
+    assert "another note" in response.text
+
+    await update_link(link.url_hashed, LinksForm(url="https://foxmask.org", title="Fox"))
+    for url in ("/public", "/tags", "/links_by_tag/python", f"/links/{link.url_hashed}"):
+        assert (await client.get(url)).headers["X-Cache"] == "MISS"
+
+    # the forms are not cached
+    assert "X-Cache" not in (await client.get("/newlinks/")).headers
+
+    # the pages give absolute URLs, kept by scheme and host
+    assert (await client.get("https://test/public")).headers["X-Cache"] == "MISS"
+    # the hosts not allowed are not served the cached pages
+    response = await client.get("/public", headers={"Host": "evil.org"})
+    assert response.status_code == 400
+
+
+async def test_disabled(client: httpx.AsyncClient, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr("sharelink.config.settings.RESPONSE_CACHE_SIZE", 0)
+    monkeypatch.setattr(response_cache, "_cache", None)
+    assert "X-Cache" not in (await client.get("/")).headers
@@ -0,0 +1,131 @@
+# coding: utf-8
+"""
+2024 - ShareLink - 셰어 링크
+"""
+
+import httpx
+import pytest
+from tortoise import connections
+
+from sharelink.core import search
+from sharelink.core.bulk import delete_links
+from sharelink.core.changes import CREATED, record_changes
+from sharelink.core.search import (
+    SearchIndex,
+    create_search_index,
+    match_query,
+    search_links,
+    words,
+)
+from sharelink.forms import LinksForm
+from sharelink.models import Links
+from sharelink.router.links import add_link, update_link
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture(params=["fts5", "memory"])
+async def index(request: pytest.FixtureRequest, db: None, monkeypatch: pytest.MonkeyPatch) -> str:
+    """
+    the links indexed by the FTS5 table, or in memory as with the other databases
+    """
+    if request.param == "fts5":
+        await create_search_index(connections.get("default"))
+    else:
+        monkeypatch.setattr(search, "is_sqlite", lambda connection: False)
+        monkeypatch.setattr(search, "fallback_index", SearchIndex())
+    return request.param
+
+
+def test_words() -> None:
+    assert words("Le Café, c'est https://café.fr/") == [
+        "le",
+        "cafe",
+        "c",
+        "est",
+        "https",
+        "cafe",
+        "fr",
+    ]
+    assert match_query('python "or" NOT') == '"python" "or" "not"'
+    assert match_query("...") == ""
+
+
+async def test_search(index: str) -> None:
+    note = await add_link(LinksForm(text="about Python and its *packages*", tags="blog"))
+    link = await add_link(LinksForm(url="https://python.org", title="Python", tags="python"))
+    await add_link(LinksForm(url="https://foxmask.org", title="Fox", text="no snake here"))
+    # before or after the first search
+    await Links.create(url="https://pypi.org", url_hashed="pypi", title="PyPI", text="Python")
+
+    links, count = await search_links("python")
+    # the title and the tags weigh more than the text
+    assert count == 3 and links[0].id == link.id
+    links, count = await search_links("PYTHON packages")
+    assert count == 1 and links[0].id == note.id
+    assert (await search_links("blog"))[0][0].id == note.id
+    _, count = await search_links("foxmask.org")
+    assert count == 1
+
+    await update_link(note.url_hashed, LinksForm(text="about snakes"))
+    assert (await search_links("packages"))[1] == 0
+    _, count = await search_links("snake")
+    assert count == 1
+
+    response_links, _ = await search_links("fox")
+    await delete_links([response_links[0].url_hashed])
+    assert (await search_links("fox"))[1] == 0
+
+    # written by another worker, or by the CLI
+    other = await Links.create(url="https://a.org", url_hashed="a", title="Python snake")
+    await record_changes(CREATED, [(other.id, other.url_hashed)])
+    links, count = await search_links("snake")
+    assert count == 1 and links[0].id == other.id
+
+
+@pytest.mark.parametrize("ranked", [100, 3])
+async def test_pages(index: str, ranked: int, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr("sharelink.config.settings.SEARCH_RANKED_LIMIT", ranked)
+    for i in range(5):
+        await add_link(LinksForm(url=f"https://{i}.org", title=f"Python {i}"))
+    seen = []
+    after = None
+    while True:
+        links, count = await search_links("python", limit=2, after=after)
+        assert count == 5
+        seen += [link.id for link in links]
+        after = links.next_cursor
+        if not after:
+            break
+    ids = await Links.all().order_by("-id").values_list("id", flat=True)
+    if ranked < 5:
+        # too many results, the newest first
+        assert seen == ids
+    else:
+        assert sorted(seen) == sorted(ids)
+
+
+async def test_endpoint(client: httpx.AsyncClient) -> None:
+    await create_search_index(connections.get("default"))
+    for i in range(3):
+        await add_link(LinksForm(url=f"https://{i}.org", title=f"Python {i}", text="*fox*"))
+
+    response = await client.get("/search", params={"q": "python", "limit": 2})
+    assert response.status_code == 200
+    assert response.headers["X-Total-Count"] == "3"
+    assert "<em>fox</em>" in response.text
+    after = response.headers["X-Next-Cursor"]
+    assert f"after={after}" in response.text
+
+    response = await client.get("/search", params={"q": "python", "after": after, "format": "json"})
+    data = response.json()
+    assert data["count"] == 3 and len(data["links"]) == 1
+    assert data["next_cursor"] is None
+    assert data["links"][0]["title"].startswith("Python")
+
+    response = await client.get(
+        "/search", params={"q": "python"}, headers={"Accept": "application/json"}
+    )
+    assert len(response.json()["links"]) == 3
+    response = await client.get("/search", params={"q": "python", "after": "nope"})
+    assert response.status_code == 422
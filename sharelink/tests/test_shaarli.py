@@ -0,0 +1,157 @@
+# coding: utf-8
+"""
+2024 - ShareLink - 셰어 링크
+"""
+
+import queue
+from pathlib import Path
+from typing import Iterator
+
+import pytest
+
+from sharelink.core.hashed_urls import HashAllocator, small_hash_sync
+from sharelink.core.shaarli import (
+    import_links,
+    import_shaarli,
+    import_shaarli_files,
+    iter_links,
+    parse_file,
+)
+from sharelink.core.tags import get_tags_count
+from sharelink.models import Links
+
+pytestmark = pytest.mark.anyio
+
+BOOKMARKS = """<!DOCTYPE NETSCAPE-Bookmark-file-1>
+<META HTTP-EQUIV="Content-Type" CONTENT="text/html; charset=UTF-8">
+<TITLE>Bookmarks</TITLE>
+<H1>Bookmarks</H1>
+<DL><p>
+<DT><A HREF="https://foxmask.org/" ADD_DATE="1318166364" PRIVATE="0" TAGS="py,blog">Fox &amp; co</A>
+<DD>the blog
+on two lines
+<DT><A HREF="https://example.com/" ADD_DATE="1318166364000" PRIVATE="1" TAGS="">Example</A>
+<DT><A HREF="https://foxmask.org/" ADD_DATE="1318166365">Duplicate</A>
+<DT><A HREF="" ADD_DATE="1318166366">No URL</A><DT><A HREF="https://python.org/">Python</A>
+<DD>last one
+</DL><p>
+"""
+
+
+@pytest.fixture
+def bookmarks(tmp_path: Path) -> str:
+    the_file = tmp_path / "bookmarks.html"
+    the_file.write_text(BOOKMARKS, encoding="utf-8")
+    return str(the_file)
+
+
+def test_iter_links() -> None:
+    links = list(iter_links(BOOKMARKS.splitlines(keepends=True)))
+    assert [link["url"] for link in links] == [
+        "https://foxmask.org/",
+        "https://example.com/",
+        "https://foxmask.org/",
+        "https://python.org/",
+    ]
+    first, second, _, last = links
+    assert first["title"] == "Fox & co"
+    assert first["text"] == "the blog\non two lines"
+    assert first["tags"] == "py,blog"
+    assert not first["private"]
+    assert second["private"]
+    # same second, ADD_DATE in milliseconds
+    assert second["date_created"] == first["date_created"]
+    assert last["text"] == "last one"
+
+
+async def test_import_shaarli(db: None, bookmarks: str) -> None:
+    progress = []
+    added = await import_shaarli(
+        bookmarks, batch_size=2, progress=lambda read, added: progress.append((read, added))
+    )
+    assert added == 3
+    assert progress[-1] == (4, 3)
+    assert await Links.all().count() == 3
+    hashes = await Links.all().values_list("url_hashed", flat=True)
+    assert len(set(hashes)) == 3
+    link = await Links.get(url="https://example.com/")
+    assert link.private and link.title == "Example"
+    assert await get_tags_count() == {"0Tag": 2, "blog": 1, "py": 1}
+
+    # nothing new the second time
+    assert await import_shaarli(bookmarks) == 0
+    assert await Links.all().count() == 3
+
+
+async def test_import_failed(db: None, allocator: HashAllocator) -> None:
+    def broken() -> Iterator[dict]:
+        yield from iter_links(BOOKMARKS.splitlines(keepends=True))
+        raise OSError("file lost")
+
+    with pytest.raises(OSError):
+        await import_links(broken(), batch_size=2)
+    # nothing imported, the small hashes are free again
+    assert await Links.all().count() == 0
+    assert len(allocator) == 0
+
+
+async def test_import_too_long(db: None) -> None:
+    long_url = f"https://foxmask.org/{'a' * 300}"
+    bookmarks = [
+        "<!DOCTYPE NETSCAPE-Bookmark-file-1>\n",
+        f'<DT><A HREF="{long_url}" ADD_DATE="1318166364">Long URL</A>\n',
+        f'<DT><A HREF="https://a.org/" ADD_DATE="1318166364">{"t" * 300}</A>\n',
+        f'<DT><A HREF="https://b.org/" ADD_DATE="1318166364" TAGS="{"t" * 101}">B</A>\n',
+    ]
+    skipped: list[dict] = []
+    assert await import_links(iter_links(bookmarks), skipped=skipped.append) == 1
+    # the other links are imported, the title cut
+    assert [link["url"] for link in skipped] == [long_url, "https://b.org/"]
+    assert len((await Links.get(url="https://a.org/")).title or "") == 255
+
+
+async def test_import_not_netscape(db: None, tmp_path: Path) -> None:
+    the_file = tmp_path / "bookmarks.json"
+    the_file.write_text("[]", encoding="utf-8")
+    assert await import_shaarli(str(the_file)) == 0
+
+
+def test_parse_file(bookmarks: str) -> None:
+    batches: queue.Queue = queue.Queue()
+    parse_file(bookmarks, batches, batch_size=3)
+    assert [len(batch) for batch in batches.queue if batch] == [3, 1]
+    assert batches.queue[-1] is None
+    links = batches.queue[0]
+    assert links[0]["url_hashed"] == small_hash_sync(
+        links[0]["date_created"].strftime("%Y%m%d_%H%M%S")
+    )
+
+
+async def test_import_shaarli_files(db: None, bookmarks: str, tmp_path: Path) -> None:
+    other = tmp_path / "other.html"
+    other.write_text(
+        """<!DOCTYPE NETSCAPE-Bookmark-file-1>
+<DL><p>
+<DT><A HREF="https://python.org/" ADD_DATE="1318166364">Python again</A>
+<DT><A HREF="https://fastapi.tiangolo.com/" ADD_DATE="1318166364">FastAPI</A>
+</DL><p>
+""",
+        encoding="utf-8",
+    )
+    added = await import_shaarli_files([bookmarks, str(other)], workers=2)
+    assert added == 4
+    assert await Links.all().count() == 4
+    # the URL of both files imported once, from the first one read
+    assert (await Links.get(url="https://python.org/")).title in ("Python", "Python again")
+    hashes = await Links.all().values_list("url_hashed", flat=True)
+    assert len(set(hashes)) == 4
+
+
+async def test_import_shaarli_files_failed(db: None, bookmarks: str) -> None:
+    def failed(read: int, added: int) -> None:
+        raise RuntimeError("stopped")
+
+    # the workers stop with the writer
+    with pytest.raises(RuntimeError):
+        await import_shaarli_files([bookmarks] * 3, workers=2, batch_size=1, progress=failed)
+    assert await Links.all().count() == 0
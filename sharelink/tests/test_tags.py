@@ -0,0 +1,77 @@
+# coding: utf-8
+"""
+2024 - ShareLink - 셰어 링크
+"""
+
+import httpx
+import pytest
+
+from sharelink.core.tags import backfill_tags, count_tags, get_tags_count, split_tags
+from sharelink.forms import LinksForm
+from sharelink.models import Links, LinksTags, Tags
+from sharelink.router.links import add_link, update_link
+from sharelink.router.tags import get_links_by_tag
+
+pytestmark = pytest.mark.anyio
+
+
+def test_split_tags() -> None:
+    assert split_tags(None) == []
+    assert split_tags("") == []
+    assert split_tags(" python, blog,,python ") == ["python", "blog"]
+
+
+async def test_links_tags(db: None) -> None:
+    link = await add_link(LinksForm(url="https://python.org", tags="python,blog"))
+    await add_link(LinksForm(url="https://pypi.org", tags="py"))
+    assert await LinksTags.filter(link_id=link.id).count() == 2
+
+    # py does not match python
+    links, count = await get_links_by_tag(tag="py")
+    assert count == 1 and links[0].url == "https://pypi.org/"
+
+    await update_link(link.url_hashed, LinksForm(url="https://python.org", tags="blog"))
+    _, count = await get_links_by_tag(tag="python")
+    assert count == 0
+    links, count = await get_links_by_tag(tag="blog")
+    assert count == 1 and links[0].id == link.id
+
+    await link.delete()
+    assert await LinksTags.all().count() == 1
+
+
+async def test_tags_links(client: httpx.AsyncClient) -> None:
+    link = await add_link(LinksForm(url="https://python.org", tags="python, blog"))
+    # the page links to the tags as they are stored
+    response = await client.get(f"/links/{link.url_hashed}")
+    assert "/links_by_tag/blog" in response.text
+    assert "/links_by_tag/%20blog" not in response.text
+    # and the links made by the names given
+    response = await client.get("/links_by_tag/%20blog")
+    assert response.headers["X-Total-Count"] == "1"
+
+
+async def test_backfill_tags(db: None) -> None:
+    await Links.create(url="https://python.org", url_hashed="a", tags="python,blog")
+    await Links.create(url="https://pypi.org", url_hashed="b", tags="python")
+    await Links.create(url="https://foxmask.org", url_hashed="c")
+    assert await backfill_tags(batch_size=2) == 3
+    assert await get_tags_count() == {"0Tag": 1, "blog": 1, "python": 2}
+    _, count = await get_links_by_tag(tag="python")
+    assert count == 2
+
+
+async def test_tags_count(db: None) -> None:
+    link = await add_link(LinksForm(url="https://python.org", tags="python,blog"))
+    await add_link(LinksForm(url="https://pypi.org", tags="python"))
+    note = await add_link(LinksForm(text="a note"))
+    assert await get_tags_count() == {"0Tag": 1, "blog": 1, "python": 2}
+
+    await update_link(link.url_hashed, LinksForm(url="https://python.org", tags="blog,web"))
+    await update_link(note.url_hashed, LinksForm(text="a note", tags="blog"))
+    # the unused tags are not in the cloud
+    assert await get_tags_count() == {"blog": 2, "python": 1, "web": 1}
+
+    await Tags.all().update(count=0)
+    await count_tags()
+    assert await get_tags_count() == {"blog": 2, "python": 1, "web": 1}